@@ -3,6 +3,9 @@ from dash import dcc
 from dash import html
 import dash_bootstrap_components as dbc
 import logging
+import os
+
+from apps import config
 
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.ZEPHYR])
 app.config['suppress_callback_exceptions'] = True
@@ -10,5 +13,10 @@ app.css.config.serve_locally = True
 app.scripts.config.serve_locally = True
 app.title = 'SpendSense - The Expense Tracker that just makes sense!'
 
+# Signs the session cookie that identifies the logged-in user to plain Flask routes
+# such as /export. Set SECRET_KEY (environment or .env) when running more than one
+# server; the workers forked from one gunicorn master share the key it generated.
+app.server.secret_key = config.get('SECRET_KEY') or os.urandom(32)
+
 log = logging.getLogger('werkzeug')
 log.setLevel(logging.ERROR)
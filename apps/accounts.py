@@ -6,190 +6,152 @@ import dash
 from dash.dependencies import Input, Output, State
 from dash.exceptions import PreventUpdate
 
-import pandas as pd
 from datetime import date
+from decimal import Decimal
 
 
 from app import app
-from apps import commonmodules as cm
+from apps import balances
 from apps import dbconnect as db
+from apps import lazy
+from apps import queries
+from apps import rollup
+from apps import session
 
 from urllib.parse import urlparse, parse_qs
 
-# To solve psycopg having trouble adapting numpy.int64
-import numpy as np
-from psycopg2.extensions import register_adapter, AsIs
-register_adapter(np.int64, AsIs)
-
-# Helper function to find acc_id
-def find_acc_id(acc_name, acc_type, acc_bal):
-    sql = """
-        SELECT acc_id FROM accounts
-        WHERE acc_name = %s AND acc_type = %s AND acc_bal = %s 
-            AND acc_delete_ind = False
-        ORDER BY acc_last_updated DESC
-    """
-    values = [acc_name, acc_type, acc_bal]
-    col = ['acc_id']
-
-    df = db.querydatafromdatabase(sql, values, col)
-
-    return df['acc_id'][0]
-
-# Helper function to find trans_id
-def find_trans_id(acc_id, trans_type, trans_date, trans_amt, trans_notes):
-    print("finding trans_id")
-    if not trans_notes: #trans_notes is empty
-        sql = """
-            SELECT trans_id FROM transactions
-            WHERE acc_id = %s AND trans_type = %s AND trans_date = %s AND trans_amt = %s AND trans_notes IS NULL
-                AND trans_delete_ind = False
-            ORDER BY trans_last_updated DESC
-        """
-        values = [acc_id, trans_type, trans_date, trans_amt]
-    else:
-        sql = """
-            SELECT trans_id FROM transactions
-            WHERE acc_id = %s AND trans_type = %s AND trans_date = %s AND trans_amt = %s AND trans_notes = %s
-                AND trans_delete_ind = False
-            ORDER BY trans_last_updated DESC
-        """
-        values = [acc_id, trans_type, trans_date, trans_amt, trans_notes]
-    col = ['trans_id']
-
-    df = db.querydatafromdatabase(sql, values, col)
-
-    return df['trans_id'][0]
-
-
-
-layout = html.Div(
-    [
-        html.Div(
-            [
-                dcc.Location(id='accounts-url', refresh=True),
-                dcc.Store(id='accounts_toedit', storage_type='memory', data=0),
-                dcc.Store(id='account-updated', storage_type='memory', data=0),
-                dcc.Store(id='old_acc_bal', storage_type='memory', data=None)
-
-            ],
-        ),
-
-        dbc.Card(
-            [
-                dbc.CardHeader(
-                    html.H3('My Accounts')
-                ),
-                dbc.CardBody(
-                    [
-                        html.Div( # Add Account Btn
-                            [
-                                dbc.Button("Add Account", href='accounts?mode=add', id='add_acc_btn')
-                            ]
-                        ),
-                        html.Div(
-                            id = "acc_list",
-                            style = {'margin-top': '1em'}
-                        )
-                    ]
-                )
-            ]
-        ),
-
-        dbc.Modal( # Add/Edit Account Modal
-            [
-                dbc.ModalHeader(dbc.ModalTitle(id="acc_modal_title"), close_button=False),
-                dbc.ModalBody(
-                    [
-                        dbc.Row(
-                            [
-                                dbc.Label("Account Name"),
-                                dbc.Input(id="acc_name_input", type="text", placeholder="Enter account name", maxlength=30),
-                                dbc.FormFeedback("Invalid input.", type = "invalid"),
-                            ],
-                            className="mb-3",
-                        ),
-                        dbc.Row(
-                            [
-                                dbc.Label("Account Type"),
-                                dcc.RadioItems(["Cash","Savings","Checking"], "Cash", 
-                                               inline=True, id="acc_type_radio",
-                                               style={"display": "flex", "flex-direction": "row"},
-                                               labelStyle={"margin-right": "20px"},
-                                               inputStyle={"margin-right": "5px"})
-                            ],
-                            className="mb-3",
-                        ),
-                        dbc.Row(
-                            [
-                                dbc.Label("Current Balance"),
-                                dbc.Input(
-                                    id="acc_bal_input",
-                                    type="number", min = 0,
-                                    placeholder="Enter current balance",
-                                    step=0.01,
-                                ),
-                                dbc.FormFeedback("Invalid amount.", type = "invalid"),
-                            ],
-                            className="mb-3",
-                        ),
-                    ]
-                ),
-                dbc.ModalFooter(
-                    [
-                        dbc.Button("Submit", id='acc_modal_submit', color='primary', className='me-1', n_clicks=0),
-                        dbc.Button("Close", id='acc_modal_close', href='accounts', color='secondary', className='me-1', n_clicks=0)
-                    ]
-                )
-            ],
-            id='acc_modal',
-            keyboard=False,
-            backdrop='static' 
-        ),
-
-        dbc.Modal(  #Notification Modal
-                            [
-                                dbc.ModalHeader(dbc.ModalTitle(id="acc_modal_notifs_header"), close_button=False),
-                                dbc.ModalBody(id="acc_modal_notifs_content"),
-                                dbc.ModalFooter(
-                                    [
-                                        dbc.Button(
-                                            "Close",
-                                            id="acc_modal_notifs_close", href='accounts', className="me-2", n_clicks=0
-                                        )
-                                    ]
-                                ),
-                            ],
-                            id="acc_modal_notifs",
-                            is_open=False,
-                            keyboard=False,
-                            backdrop='static'
-                        ),
-
-        dbc.Modal(  #Delete Modal
-                            [
-                                dbc.ModalHeader(dbc.ModalTitle("Are you sure?"), close_button=False),
-                                dbc.ModalBody("Please confirm account deletion. This action cannot be undone."),
-                                dbc.ModalFooter(
-                                    [
-                                        dbc.Button(
-                                            "Delete",
-                                            id="acc_delete_modal_delete", color="danger", className="me-2", n_clicks=0
-                                        ),
-                                        dbc.Button(
-                                            "Close",
-                                            id="acc_delete_modal_close", href='accounts', className="me-2", n_clicks=0
-                                        )
-                                    ]
-                                ),
-                            ],
-                            id="acc_delete_modal",
-                            is_open=False,
-                            keyboard=False,
-                            backdrop='static'
-                        ),
-    ]
-)
+# pandas is imported on first use (see apps/lazy.py)
+pd = lazy.module('pandas')
+
+
+# Page layout, built on each navigation to the page
+def layout():
+    return html.Div(
+        [
+            html.Div(
+                [
+                    dcc.Location(id='accounts-url', refresh=True),
+                    dcc.Store(id='accounts_toedit', storage_type='memory', data=0),
+                    dcc.Store(id='account-updated', storage_type='memory', data=0),
+
+                ],
+            ),
+
+            dbc.Card(
+                [
+                    dbc.CardHeader(
+                        html.H3('My Accounts')
+                    ),
+                    dbc.CardBody(
+                        [
+                            html.Div( # Add Account Btn
+                                [
+                                    dbc.Button("Add Account", href='accounts?mode=add', id='add_acc_btn')
+                                ]
+                            ),
+                            html.Div(
+                                id = "acc_list",
+                                style = {'margin-top': '1em'}
+                            )
+                        ]
+                    )
+                ]
+            ),
+
+            dbc.Modal( # Add/Edit Account Modal
+                [
+                    dbc.ModalHeader(dbc.ModalTitle(id="acc_modal_title"), close_button=False),
+                    dbc.ModalBody(
+                        [
+                            dbc.Row(
+                                [
+                                    dbc.Label("Account Name"),
+                                    dbc.Input(id="acc_name_input", type="text", placeholder="Enter account name", maxlength=30),
+                                    dbc.FormFeedback("Invalid input.", type = "invalid"),
+                                ],
+                                className="mb-3",
+                            ),
+                            dbc.Row(
+                                [
+                                    dbc.Label("Account Type"),
+                                    dcc.RadioItems(["Cash","Savings","Checking"], "Cash", 
+                                                   inline=True, id="acc_type_radio",
+                                                   style={"display": "flex", "flex-direction": "row"},
+                                                   labelStyle={"margin-right": "20px"},
+                                                   inputStyle={"margin-right": "5px"})
+                                ],
+                                className="mb-3",
+                            ),
+                            dbc.Row(
+                                [
+                                    dbc.Label("Current Balance"),
+                                    dbc.Input(
+                                        id="acc_bal_input",
+                                        type="number", min = 0,
+                                        placeholder="Enter current balance",
+                                        step=0.01,
+                                    ),
+                                    dbc.FormFeedback("Invalid amount.", type = "invalid"),
+                                ],
+                                className="mb-3",
+                            ),
+                        ]
+                    ),
+                    dbc.ModalFooter(
+                        [
+                            dbc.Button("Submit", id='acc_modal_submit', color='primary', className='me-1', n_clicks=0),
+                            dbc.Button("Close", id='acc_modal_close', href='accounts', color='secondary', className='me-1', n_clicks=0)
+                        ]
+                    )
+                ],
+                id='acc_modal',
+                keyboard=False,
+                backdrop='static' 
+            ),
+
+            dbc.Modal(  #Notification Modal
+                                [
+                                    dbc.ModalHeader(dbc.ModalTitle(id="acc_modal_notifs_header"), close_button=False),
+                                    dbc.ModalBody(id="acc_modal_notifs_content"),
+                                    dbc.ModalFooter(
+                                        [
+                                            dbc.Button(
+                                                "Close",
+                                                id="acc_modal_notifs_close", href='accounts', className="me-2", n_clicks=0
+                                            )
+                                        ]
+                                    ),
+                                ],
+                                id="acc_modal_notifs",
+                                is_open=False,
+                                keyboard=False,
+                                backdrop='static'
+                            ),
+
+            dbc.Modal(  #Delete Modal
+                                [
+                                    dbc.ModalHeader(dbc.ModalTitle("Are you sure?"), close_button=False),
+                                    dbc.ModalBody("Please confirm account deletion. This action cannot be undone."),
+                                    dbc.ModalFooter(
+                                        [
+                                            dbc.Button(
+                                                "Delete",
+                                                id="acc_delete_modal_delete", color="danger", className="me-2", n_clicks=0
+                                            ),
+                                            dbc.Button(
+                                                "Close",
+                                                id="acc_delete_modal_close", href='accounts', className="me-2", n_clicks=0
+                                            )
+                                        ]
+                                    ),
+                                ],
+                                id="acc_delete_modal",
+                                is_open=False,
+                                keyboard=False,
+                                backdrop='static'
+                            ),
+        ]
+    )
 
 # app callback when search changes
 @app.callback(
@@ -246,7 +208,6 @@ def acc_edit_delete_indicator(search, delete_close_btn, notif_close_btn, acc_clo
         Output("acc_name_input", 'value'),
         Output("acc_type_radio", 'value'),
         Output("acc_bal_input", 'value'),
-        Output('old_acc_bal', 'data')
     ],
     [
         Input("accounts_toedit", 'modified_timestamp'),
@@ -272,25 +233,13 @@ def load_accounts(timestamp, close_btn, close_notifs_btn, to_edit, search):
             parsed = urlparse(search)
             acc_id = parse_qs(parsed.query)['id'][0]
 
-            sql = """
-                SELECT acc_name, acc_type, acc_bal
-                FROM accounts
-                WHERE acc_id = %s
-            """
-            values = [acc_id]
-            col = ['acc_name', 'acc_type', 'acc_bal']
-
-            df = db.querydatafromdatabase(sql, values, col)
-
-            acc_name = df['acc_name'][0]
-            acc_type = df['acc_type'][0]
-            acc_bal = df['acc_bal'][0]
+            account = queries.account(acc_id)
 
-            return [acc_name, acc_type, acc_bal, acc_bal]
+            return [account.acc_name, account.acc_type, account.acc_bal]
         
         elif (eventid == "acc_modal_close" and close_btn) or (eventid == "acc_modal_notifs_close" and close_notifs_btn):
             # restore account input values to default
-            return [None, "Cash", None, None]
+            return [None, "Cash", None]
         
         else:
             raise PreventUpdate
@@ -328,11 +277,10 @@ def load_accounts(timestamp, close_btn, close_notifs_btn, to_edit, search):
         State("currentuserid",'data'),
         State('accounts-url', 'search'),
         State("accounts_toedit", 'data'),
-        State("old_acc_bal", 'data')
     ]
 )
 def update_acc(addacc_btn, formclose_btn,submit_btn,notif_close_btn, delete_btn, to_edit_time,
-               acc_name,acc_type,acc_bal,user_id, search, to_edit, old_acc_bal):
+               acc_name,acc_type,acc_bal,user_id, search, to_edit):
 
     ctx = dash.callback_context
 
@@ -362,14 +310,18 @@ def update_acc(addacc_btn, formclose_btn,submit_btn,notif_close_btn, delete_btn,
             parsed = urlparse(search)
             acc_id = parse_qs(parsed.query)['id'][0]
 
-            sql = '''
-                UPDATE accounts
-                SET acc_delete_ind = %s, acc_last_updated = now()
-                WHERE acc_id = %s
-            '''
+            with db.dbtransaction() as cursor:
+                db.bumpuserversion(cursor, user_id, acc_ids=[acc_id])
 
-            values = [True,acc_id]
-            db.modifydatabase(sql,values)
+                sql = '''
+                    UPDATE accounts
+                    SET acc_delete_ind = %s, acc_last_updated = now()
+                    WHERE acc_id = %s
+                '''
+
+                values = [True,acc_id]
+                cursor.execute(sql,values)
+            session.refresh(user_id)
 
             modal_open = True
             modal_header = "Deleted Successfully!"
@@ -400,25 +352,29 @@ def update_acc(addacc_btn, formclose_btn,submit_btn,notif_close_btn, delete_btn,
 
                 # add acc to accounts table 
                 if create_mode == 'add':
-                    sql1 = '''
-                                INSERT INTO accounts (acc_name, acc_type, acc_bal)
-                                VALUES (%s, %s, %s)
-                            '''
-                        
-                    values1 = [acc_name, acc_type, acc_bal]
-                    db.modifydatabase(sql1, values1)
-
-
-                    # add acc to useraccounts table
-                    acc_id = find_acc_id(acc_name, acc_type, acc_bal)
-
-                    sql2 = '''
-                                INSERT INTO useraccounts (user_id, acc_id)
-                                VALUES (%s, %s)
-                            '''
-                        
-                    values2 = [user_id, acc_id]
-                    db.modifydatabase(sql2, values2)
+                    with db.dbtransaction() as cursor:
+                        db.bumpuserversion(cursor, user_id)
+                        sql1 = '''
+                                    INSERT INTO accounts (acc_name, acc_type, acc_bal)
+                                    VALUES (%s, %s, %s)
+                                    RETURNING acc_id
+                                '''
+                            
+                        values1 = [acc_name, acc_type, acc_bal]
+                        acc_id = db.executereturning(cursor, sql1, values1)[0]
+                        balances.open_account(cursor, acc_id, acc_bal)
+
+
+                        # add acc to useraccounts table
+
+                        sql2 = '''
+                                    INSERT INTO useraccounts (user_id, acc_id)
+                                    VALUES (%s, %s)
+                                '''
+                            
+                        values2 = [user_id, acc_id]
+                        cursor.execute(sql2, values2)
+                    session.refresh(user_id)
 
 
                     modal_open = True
@@ -429,51 +385,58 @@ def update_acc(addacc_btn, formclose_btn,submit_btn,notif_close_btn, delete_btn,
                     parsed = urlparse(search)
                     acc_id = parse_qs(parsed.query)['id'][0]
 
-                    sql3 = """
-                        UPDATE accounts
-                        SET
-                            acc_name = %s,
-                            acc_type = %s,
-                            acc_bal = %s,
-                            acc_last_updated = now()
-                        WHERE
-                            acc_id = %s
-                    """
-
-                    values3 = [acc_name, acc_type, acc_bal, acc_id]
-                    db.modifydatabase(sql3, values3)
-
-
-                    if acc_bal != old_acc_bal: #Check if acc_bal has been edited
-                        print("adding a transaction")
-                    # Add new transaction to preserve relationship with account balance
-                        if old_acc_bal > acc_bal: #make an expense transaction
-                            trans_type = "Expense"
-                            trans_amt = old_acc_bal - acc_bal
-                        elif old_acc_bal < acc_bal: #make an income transaction
-                            trans_type = "Income"
-                            trans_amt = acc_bal - old_acc_bal
-
-                        print("about to insert into transactions table")    
-                        sqlcode3 = """
-                            INSERT INTO transactions (acc_id, trans_type, trans_date, trans_amt, trans_notes)
-                            VALUES (%s, %s, %s, %s, %s)
+                    with db.dbtransaction() as cursor:
+                        db.bumpuserversion(cursor, user_id, acc_ids=[acc_id])
+                        # the balance to adjust from is read under the row lock, not taken
+                        # from the form, so writes from another tab in between are kept
+                        old_acc_bal = balances.lock_accounts(cursor, [acc_id])[int(acc_id)]
+                        # numeric, as stored: the adjustment must be exact
+                        new_acc_bal = Decimal(str(acc_bal))
+
+                        sql3 = """
+                            UPDATE accounts
+                            SET
+                                acc_name = %s,
+                                acc_type = %s,
+                                acc_last_updated = now()
+                            WHERE
+                                acc_id = %s
                         """
-                        valuescode3 = [acc_id,trans_type,date.today(),trans_amt,"Update account balance"]
-                        db.modifydatabase(sqlcode3,valuescode3)
-
-                        print("about to find trans_id")
-
-                        #Update usertransactions table
-                        trans_id = find_trans_id(acc_id, trans_type, date.today(),trans_amt,"Update account balance")
 
-                        sqlcode2 = '''
-                                INSERT INTO usertransactions (user_id, trans_id)
-                                VALUES (%s, %s)
-                            '''
-                        
-                        valuescode2 = [user_id, trans_id]
-                        db.modifydatabase(sqlcode2, valuescode2)
+                        values3 = [acc_name, acc_type, acc_id]
+                        cursor.execute(sql3, values3)
+
+
+                        if new_acc_bal != old_acc_bal: #Check if acc_bal has been edited
+                        # Add new transaction to preserve relationship with account balance
+                            if old_acc_bal > new_acc_bal: #make an expense transaction
+                                trans_type = "Expense"
+                                trans_amt = old_acc_bal - new_acc_bal
+                            elif old_acc_bal < new_acc_bal: #make an income transaction
+                                trans_type = "Income"
+                                trans_amt = new_acc_bal - old_acc_bal
+
+                            sqlcode3 = """
+                                INSERT INTO transactions (acc_id, trans_type, trans_date, trans_amt, trans_notes)
+                                VALUES (%s, %s, %s, %s, %s)
+                                RETURNING trans_id
+                            """
+                            valuescode3 = [acc_id,trans_type,date.today(),trans_amt,"Update account balance"]
+                            trans_id = db.executereturning(cursor, sqlcode3, valuescode3)[0]
+
+                            #Update usertransactions table
+
+                            sqlcode2 = '''
+                                    INSERT INTO usertransactions (user_id, trans_id)
+                                    VALUES (%s, %s)
+                                '''
+                            
+                            valuescode2 = [user_id, trans_id]
+                            cursor.execute(sqlcode2, valuescode2)
+                            # moves acc_bal to the new balance
+                            rollup.apply_trans(cursor, user_id, acc_id, date.today(), trans_type, trans_amt)
+                            balances.apply_trans(cursor, acc_id, date.today(), trans_type, trans_amt)
+                    session.refresh(user_id)
 
 
                     modal_open = True
@@ -520,18 +483,9 @@ def display_accs(pathname, updated, user_id):
     if pathname == '/accounts':
         #print("Display accounts triggered.")
 
-        sql = ''' 
-                SELECT A.acc_id, acc_name, acc_type, acc_bal 
-                FROM useraccounts UA LEFT JOIN accounts A
-                    ON UA.acc_id = A.acc_id
-                WHERE user_id = %s AND acc_delete_ind = False
-                ORDER BY acc_name
-            '''
-        
-        values = [user_id]
+        # from the session context (apps/session.py), not a query of its own
         cols = ['ID', 'Account Name','Type','Balance']
-
-        df = db.querydatafromdatabase(sql, values, cols)
+        df = pd.DataFrame(session.context(user_id).accounts, columns=cols)
 
         if not df.empty:
             # Adding Edit button:
@@ -0,0 +1,178 @@
+# Month-end account balance snapshots
+#
+# balancesnapshots holds, for every account and every month with transactions, the
+# balance at the end of that month, plus the opening balance (before any transaction)
+# under month '-infinity'. Write paths keep it current with open_account() and
+# apply_trans() inside their unit of work; rebuild() recomputes it from the current
+# balances (accounts.acc_bal) and the ledger.
+#
+# apply_trans() also moves the current balance, accounts.acc_bal. Every ledger write
+# locks the rows of the accounts it touches first (lock_accounts()), so concurrent
+# writers to one account take turns and each adds its delta to the committed balance.
+#
+# The balance on any date is then one snapshot (the last month-end before that date's
+# month) plus the transactions of that month up to the date; see balances_as_of().
+#
+# Usage: python -m apps.balances rebuild [--acc-id ACC_ID]
+
+import argparse
+
+from apps import dbconnect as db
+
+SIGNED_AMT = "CASE WHEN trans_type = 'Income' THEN trans_amt ELSE -trans_amt END"
+
+
+# Records the opening balance of a new account.
+# Must run on the dbtransaction() cursor that creates the account.
+def open_account(cursor, acc_id, balance):
+    cursor.execute(
+        "INSERT INTO balancesnapshots (acc_id, month, balance) VALUES (%s, '-infinity', %s)",
+        [acc_id, balance])
+
+
+# Locks the rows of the accounts until the end of the transaction and returns their
+# current balances as {acc_id: acc_bal}. Taken in acc_id order, so two writers locking
+# the same accounts cannot deadlock.
+def lock_accounts(cursor, acc_ids):
+    cursor.execute(
+        "SELECT acc_id, acc_bal FROM accounts WHERE acc_id = ANY(%s::int[]) ORDER BY acc_id FOR UPDATE",
+        [sorted({int(acc_id) for acc_id in acc_ids})])
+    return dict(cursor.fetchall())
+
+
+# Adds (sign=1) or removes (sign=-1) one transaction from the current balance and from
+# the month-end balances of its month and every later month. Must run on the
+# dbtransaction() cursor of the ledger change, after lock_accounts().
+def apply_trans(cursor, acc_id, trans_date, trans_type, trans_amt, sign=1):
+    # a month without a snapshot yet starts from the one before it
+    cursor.execute('''
+        INSERT INTO balancesnapshots (acc_id, month, balance)
+        SELECT S.acc_id, date_trunc('month', %s::date)::date, S.balance
+        FROM balancesnapshots S
+        WHERE S.acc_id = %s AND S.month < date_trunc('month', %s::date)
+        ORDER BY S.month DESC
+        LIMIT 1
+        ON CONFLICT (acc_id, month) DO NOTHING
+    ''', [trans_date, acc_id, trans_date])
+    signed = trans_amt if trans_type == 'Income' else -trans_amt
+    cursor.execute('''
+        UPDATE balancesnapshots
+        SET balance = balance + %s * %s::decimal
+        WHERE acc_id = %s AND month >= date_trunc('month', %s::date)
+    ''', [sign, signed, acc_id, trans_date])
+    cursor.execute('''
+        UPDATE accounts
+        SET acc_bal = acc_bal + %s * %s::decimal, acc_last_updated = now()
+        WHERE acc_id = %s
+    ''', [sign, signed, acc_id])
+
+
+# SQL expression for the balance of account `acc` at the end of day `day` (both SQL
+# expressions): the last month-end snapshot before that day's month, plus the month so far
+def as_of_sql(acc, day):
+    return f'''(
+            (SELECT S.balance FROM balancesnapshots S
+             WHERE S.acc_id = {acc} AND S.month < date_trunc('month', {day})
+             ORDER BY S.month DESC
+             LIMIT 1)
+            + COALESCE((SELECT SUM({SIGNED_AMT}) FROM transactions T
+                        WHERE T.acc_id = {acc} AND T.trans_delete_ind = False
+                            AND T.trans_date >= date_trunc('month', {day}) AND T.trans_date < {day} + 1), 0)
+        )'''
+
+
+# Balances of the accounts at the end of the day as_of, as {acc_id: balance}
+def balances_as_of(acc_ids, as_of):
+    sql = f'''
+        SELECT A.acc_id, {as_of_sql('A.acc_id', 'D.day')}
+        FROM unnest(%s::int[]) A(acc_id), (SELECT %s::date) D(day)
+    '''
+    df = db.querydatafromdatabase(sql, [list(acc_ids), as_of], ['acc_id', 'balance'])
+    return dict(zip(df['acc_id'], df['balance']))
+
+
+# Helper function to read the balance history of a user's accounts over [start_date, end_date]:
+# the balances at both ends of the period and at every month-end in between, whatever the
+# number of transactions, as (sql, values) with columns acc_id, acc_name, day, balance
+# (account names are not unique: tell the accounts apart by acc_id)
+def history_sql(user_id, start_date, end_date, acc_id_list):
+    sql = f'''
+        WITH accs AS (
+            SELECT A.acc_id, A.acc_name
+            FROM useraccounts UA JOIN accounts A
+                ON UA.acc_id = A.acc_id
+            WHERE UA.user_id = %s AND A.acc_delete_ind = False AND A.acc_id = ANY(%s::int[])
+        )
+        SELECT A.acc_id, A.acc_name, D.day, {as_of_sql('A.acc_id', 'D.day')}
+        FROM accs A CROSS JOIN (SELECT DISTINCT unnest(ARRAY[%s::date, %s::date])) D(day)
+        UNION ALL
+        -- month-ends strictly inside the period; its ends come from the rows above
+        SELECT A.acc_id, A.acc_name, (S.month + interval '1 month - 1 day')::date, S.balance
+        FROM accs A JOIN balancesnapshots S
+            ON S.acc_id = A.acc_id
+        WHERE S.month >= date_trunc('month', %s::date) AND S.month < date_trunc('month', %s::date)
+            AND S.month + interval '1 month - 1 day' > %s::date
+        ORDER BY 2, 1, 3
+    '''
+    return sql, [user_id, list(acc_id_list), start_date, end_date, start_date, end_date, start_date]
+
+
+# Recomputes the snapshots of one account (or of all of them) in one pass. The opening
+# balance is what is left of the current balance after taking out every live transaction.
+def rebuild(acc_id=None):
+    with db.dbtransaction() as cursor:
+        return rebuild_snapshots(cursor, acc_id)
+
+
+# Same as rebuild(), on the cursor of a dbtransaction(). The accounts are locked first, like
+# on the write paths, so no apply_trans() can change them until the transaction ends.
+def rebuild_snapshots(cursor, acc_id=None):
+    if acc_id is None:
+        acc_filter, trans_filter, values = "", "", []
+    else:
+        acc_filter, trans_filter, values = "WHERE A.acc_id = %s", "AND T.acc_id = %s", [acc_id]
+
+    # results cached from the old snapshots must not be served again
+    cursor.execute(f'''
+        UPDATE users SET data_version = data_version + 1
+        WHERE user_id IN (SELECT UA.user_id FROM useraccounts UA JOIN accounts A ON A.acc_id = UA.acc_id {acc_filter})
+    ''', values)
+    if acc_id is None:
+        cursor.execute("SELECT acc_id FROM accounts ORDER BY acc_id FOR UPDATE")
+    else:
+        lock_accounts(cursor, [acc_id])
+    cursor.execute("DELETE FROM balancesnapshots" + (" WHERE acc_id = %s" if acc_id is not None else ""), values)
+    cursor.execute(f'''
+        WITH monthly AS (
+            SELECT T.acc_id, date_trunc('month', T.trans_date)::date AS month, SUM({SIGNED_AMT}) AS net
+            FROM transactions T
+            WHERE T.trans_delete_ind = False {trans_filter}
+            GROUP BY 1, 2
+        ),
+        opening AS (
+            SELECT A.acc_id, A.acc_bal - COALESCE((SELECT SUM(net) FROM monthly M WHERE M.acc_id = A.acc_id), 0) AS balance
+            FROM accounts A {acc_filter}
+        )
+        INSERT INTO balancesnapshots (acc_id, month, balance)
+        SELECT acc_id, '-infinity', balance FROM opening
+        UNION ALL
+        SELECT M.acc_id, M.month, O.balance + SUM(M.net) OVER (PARTITION BY M.acc_id ORDER BY M.month)
+        FROM monthly M JOIN opening O ON O.acc_id = M.acc_id
+    ''', values * 2)
+    return cursor.rowcount
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the month-end balance snapshots.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    rebuild_parser = subparsers.add_parser('rebuild', help="recompute snapshots from the ledger")
+    rebuild_parser.add_argument('--acc-id', type=int, help="only rebuild this account's snapshots")
+    args = parser.parse_args()
+
+    if args.command == 'rebuild':
+        rows = rebuild(args.acc_id)
+        print(f"Rebuilt {rows} balance snapshots.")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 # Everything common on all webpages
 
 from dash import html
+from dash import dash_table
 import dash_bootstrap_components as dbc
 
 navlink_style = {
@@ -30,4 +31,34 @@ navbar = dbc.Navbar(
     ],
     #dark=True,
     color='#3459e6',
-)
\ No newline at end of file
+)
+
+# Height of the scrolling area of virtualized grids
+GRID_HEIGHT = '60vh'
+
+# Table for lists that grow with the user's history. The rows travel as one list of
+# records instead of a component per cell, and with virtualization only the rows
+# scrolled into view become DOM nodes. Columns in `hidden` stay in the row data
+# (e.g. IDs for row actions) but are not displayed.
+def make_grid(df, grid_id, row_selectable=False, hidden=(), virtualized=True):
+    columns = [{'name': col, 'id': col} for col in df.columns if col not in hidden]
+    if virtualized:
+        style_table = {'height': GRID_HEIGHT, 'overflowY': 'auto'}
+    else:
+        style_table = {'overflowX': 'auto'}
+
+    return dash_table.DataTable(
+        id=grid_id,
+        columns=columns,
+        data=df.to_dict('records'),
+        row_selectable='single' if row_selectable else False,
+        selected_rows=[],
+        page_action='none',
+        virtualization=virtualized,
+        fixed_rows={'headers': True} if virtualized else None,
+        style_table=style_table,
+        style_cell={'textAlign': 'left', 'padding': '0.3em', 'minWidth': '6em',
+                    'whiteSpace': 'normal', 'fontFamily': 'inherit'},
+        style_header={'fontWeight': 'bold'},
+        style_data_conditional=[{'if': {'row_index': 'odd'}, 'backgroundColor': 'rgba(0, 0, 0, 0.05)'}],
+    )
@@ -0,0 +1,51 @@
+# Settings from the environment or a .env file
+#
+# get() returns the environment variable of that name if it is set, else the value in
+# the .env file (KEY=VALUE lines; blank lines and # comments ignored, values may be
+# quoted), else the default. The file is .env at the top of the repository, or the path
+# in SPENDSENSE_ENV_FILE. Keep passwords and SECRET_KEY there or in the environment,
+# never in the code.
+
+import os
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENV_FILE = os.environ.get('SPENDSENSE_ENV_FILE', os.path.join(ROOT_DIR, '.env'))
+
+
+def read_env_file(path):
+    values = {}
+    if not os.path.exists(path):
+        return values
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#') or '=' not in line:
+                continue
+            name, _, value = line.partition('=')
+            name = name.strip()
+            if name.startswith('export '):
+                name = name[len('export '):].strip()
+            value = value.strip()
+            if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+                value = value[1:-1]
+            values[name] = value
+    return values
+
+
+_file_values = read_env_file(ENV_FILE)
+
+
+def get(name, default=None):
+    return os.environ.get(name, _file_values.get(name, default))
+
+
+def getint(name, default):
+    return int(get(name, default))
+
+
+# Database connection (apps/dbconnect.py)
+DB_NAME = get('DB_NAME', '271projdb')
+DB_USER = get('DB_USER', 'postgres')
+DB_PASSWORD = get('DB_PASSWORD')
+DB_HOST = get('DB_HOST', 'localhost')
+DB_PORT = get('DB_PORT', '5432')
@@ -1,31 +1,457 @@
 # Functions to connect to Postgres DBs
 
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
 import psycopg2
-import pandas as pd
+import psycopg2.extensions
+import psycopg2.pool
+
+from apps import config
+from apps import lazy
+
+
+def _adapt_numpy(pandas):
+    # To solve psycopg having trouble adapting numpy.int64 (pandas has imported numpy)
+    import numpy as np
+    psycopg2.extensions.register_adapter(np.int64, psycopg2.extensions.AsIs)
+
+
+# pandas is imported by the first query that returns a DataFrame (see apps/lazy.py)
+pd = lazy.module('pandas', on_load=_adapt_numpy)
+
+# Connection pool settings (environment or .env, see apps/config.py); the defaults suit
+# the threaded development server, gunicorn.conf.py sizes them for its sync workers
+POOL_MINCONN = config.getint('POOL_MINCONN', 2)                    # connections opened by warmpool() and kept open when idle
+POOL_MAXCONN = config.getint('POOL_MAXCONN', 10)                   # hard cap on open connections per worker process
+POOL_IDLE_TIMEOUT = config.getint('POOL_IDLE_TIMEOUT', 300)        # seconds an idle connection above POOL_MINCONN is kept
+POOL_CHECKOUT_TIMEOUT = config.getint('POOL_CHECKOUT_TIMEOUT', 10) # seconds to wait for a free connection before giving up
+POOL_PING_AFTER = config.getint('POOL_PING_AFTER', 30)             # idle seconds after which a connection is pinged on checkout
+
+# Query result cache settings (see querydatafromdatabase)
+CACHE_MAXROWS = 500000      # rows of cached results kept per worker process
+CACHE_TTL = 300             # seconds a cached result may be served
+
+# Rows fetched per round trip (and per chunk) by queryrowchunks/querydatachunks
+QUERY_ITERSIZE = 10000
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    # psycopg2 connection that remembers when it was last handed back to the pool
+    # and which statements it has prepared (see executeprepared)
+    last_used = 0.0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
 
 def getdblocation():
+    # credentials come from the environment or .env (apps/config.py)
     db = psycopg2.connect(
-        host='localhost',
-        database='271projdb',
-        user='postgres',
-        port='5432',
-        password='iLovePostgr3s'
+        host=config.DB_HOST,
+        database=config.DB_NAME,
+        user=config.DB_USER,
+        port=config.DB_PORT,
+        password=config.DB_PASSWORD,
+        connection_factory=PooledConnection,
     )
+    # Single statements commit on their own; dbtransaction() switches this off
+    db.autocommit = True
     return db
 
+
+class ConnectionPool:
+    # Thread-safe pool of connections owned by a single process.
+    # Idle connections are kept on a LIFO stack so the most recently used
+    # (and therefore most likely healthy) connection is handed out first.
+
+    def __init__(self, minconn, maxconn, idle_timeout, checkout_timeout, ping_after):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.ping_after = ping_after
+        self.pid = os.getpid()
+
+        self._idle = []
+        self._inuse = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'checkouts': 0,
+            'created': 0,
+            'reused': 0,
+            'discarded': 0,
+            'waits': 0,
+            'timeouts': 0,
+        }
+
+    def warm(self):
+        # Open connections up front so the first requests skip the handshake
+        while True:
+            with self._cond:
+                if len(self._idle) + self._inuse >= self.minconn:
+                    return
+                self._inuse += 1
+            conn = self._connect()
+            self.putconn(conn)
+
+    def getconn(self):
+        deadline = time.monotonic() + self.checkout_timeout
+        while True:
+            with self._cond:
+                expired = self._expire_idle()
+                conn = None
+                if self._idle:
+                    conn = self._idle.pop()
+                    self._inuse += 1
+                elif self._inuse < self.maxconn:
+                    self._inuse += 1
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise psycopg2.pool.PoolError("connection pool exhausted")
+                    self._stats['waits'] += 1
+                    self._cond.wait(remaining)
+                    continue
+                self._stats['checkouts'] += 1
+
+            for old in expired:
+                self._close(old)
+
+            if conn is None:
+                return self._connect()
+            if self._healthy(conn):
+                with self._cond:
+                    self._stats['reused'] += 1
+                return conn
+
+            # Stale connection: drop it and try again
+            self._release_slot()
+            self._close(conn)
+
+    def putconn(self, conn, discard=False):
+        if not discard and not conn.closed:
+            try:
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    if conn.autocommit:
+                        # a transaction begun with an explicit BEGIN (querysnapshot):
+                        # rollback() does nothing under autocommit
+                        conn.cursor().execute("ROLLBACK")
+                    else:
+                        conn.rollback()
+                conn.autocommit = True
+            except psycopg2.Error:
+                discard = True
+
+        if discard or conn.closed:
+            self._release_slot()
+            self._close(conn)
+            return
+
+        conn.last_used = time.monotonic()
+        with self._cond:
+            self._inuse -= 1
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update(
+                pid=self.pid,
+                idle=len(self._idle),
+                in_use=self._inuse,
+                size=len(self._idle) + self._inuse,
+                minconn=self.minconn,
+                maxconn=self.maxconn,
+            )
+        return stats
+
+    def closeall(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._close(conn)
+
+    def _connect(self):
+        try:
+            conn = getdblocation()
+        except Exception:
+            self._release_slot()
+            raise
+        with self._cond:
+            self._stats['created'] += 1
+        return conn
+
+    def _healthy(self, conn):
+        if conn.closed:
+            return False
+        if time.monotonic() - conn.last_used < self.ping_after:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _expire_idle(self):
+        # Called with the lock held. Oldest idle connections sit at the bottom of the stack.
+        expired = []
+        cutoff = time.monotonic() - self.idle_timeout
+        while (self._idle and len(self._idle) + self._inuse > self.minconn
+               and self._idle[0].last_used < cutoff):
+            expired.append(self._idle.pop(0))
+        return expired
+
+    def _release_slot(self):
+        with self._cond:
+            self._inuse -= 1
+            self._cond.notify()
+
+    def _close(self, conn):
+        with self._cond:
+            self._stats['discarded'] += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+
+class QueryCache:
+    # LRU cache of query results scoped to one user. Keys carry the user's
+    # users.data_version, which every write path bumps inside its own transaction
+    # (bumpuserversion), so once a write commits no worker process serves results
+    # read before it: they are simply never looked up again and age out of the LRU.
+
+    def __init__(self, maxrows, ttl):
+        self.maxrows = maxrows
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._rows = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'evicted': 0,
+        }
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return value
+                self._drop(key)
+                self._stats['expired'] += 1
+            self._stats['misses'] += 1
+            return None
+
+    def put(self, key, rows):
+        # Results are weighed by their number of rows; one larger than the whole
+        # cache is not kept
+        if len(rows) >= self.maxrows:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, rows)
+            self._rows += len(rows) + 1
+            while self._rows > self.maxrows:
+                self._drop(next(iter(self._entries)))
+                self._stats['evicted'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(entries=len(self._entries), rows=self._rows, maxrows=self.maxrows, ttl=self.ttl)
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._rows = 0
+
+    def _drop(self, key):
+        # Called with the lock held
+        expires, rows = self._entries.pop(key)
+        self._rows -= len(rows) + 1
+
+
+_cache = QueryCache(CACHE_MAXROWS, CACHE_TTL)
+
+_pool = None
+_pool_lock = threading.Lock()
+# Pools inherited from a parent process. Their sockets belong to the parent, so they are
+# kept referenced (never closed or garbage collected) to avoid terminating its sessions.
+_inherited_pools = []
+
+
+def getpool():
+    global _pool
+    pool = _pool
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            if _pool is not None:
+                _inherited_pools.append(_pool)
+            _pool = ConnectionPool(POOL_MINCONN, POOL_MAXCONN, POOL_IDLE_TIMEOUT,
+                                   POOL_CHECKOUT_TIMEOUT, POOL_PING_AFTER)
+        return _pool
+
+
+def warmpool():
+    getpool().warm()
+
+
+def poolstats():
+    return getpool().stats()
+
+
+def cachestats():
+    return _cache.stats()
+
+
+def clearcache():
+    _cache.clear()
+
+
+@contextmanager
+def dbconnection():
+    pool = getpool()
+    db = pool.getconn()
+    try:
+        yield db
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        pool.putconn(db, discard=True)
+        raise
+    except BaseException:
+        pool.putconn(db)
+        raise
+    else:
+        pool.putconn(db)
+
+
 def modifydatabase(sql, values):
-    db = getdblocation()
+    with dbconnection() as db:
+        cursor = db.cursor()
+        cursor.execute(sql, values)
+
+def modifydatabasereturning(sql, values):
+    # For INSERT/UPDATE ... RETURNING: commits and returns the first returned row,
+    # e.g. the generated key of a new record
+    with dbconnection() as db:
+        cursor = db.cursor()
+        cursor.execute(sql, values)
+        return cursor.fetchone()
+
+def executereturning(cursor, sql, values):
+    # Same as modifydatabasereturning, on a cursor from dbtransaction()
+    cursor.execute(sql, values)
+    return cursor.fetchone()
+
+def querydatafromdatabase(sql, values, dfcolumns, user_id=None):
+    # Pass the user_id of a query that only reads that user's data to serve it from
+    # the result cache. Each call returns its own copy of the rows.
+    with dbconnection() as db:
+        cur = db.cursor()
+        if user_id is None:
+            cur.execute(sql, values)
+            return pd.DataFrame(cur.fetchall(), columns=dfcolumns)
+
+        cur.execute("SELECT data_version FROM users WHERE user_id = %s", [user_id])
+        version = cur.fetchone()
+        key = (user_id, version, sql, repr(values), tuple(dfcolumns))
+        rows = _cache.get(key)
+        if rows is None:
+            cur.execute(sql, values)
+            rows = pd.DataFrame(cur.fetchall(), columns=dfcolumns)
+            _cache.put(key, rows)
+    return rows.copy()
+
+def querysnapshot(sql, values):
+    # Runs one query in a read-only REPEATABLE READ transaction and returns its first
+    # row. BEGIN goes out in the same round trip as the query.
+    with dbconnection() as db:
+        cursor = db.cursor()
+        cursor.execute("BEGIN ISOLATION LEVEL REPEATABLE READ READ ONLY; " + sql, values)
+        row = cursor.fetchone()
+        cursor.execute("COMMIT")
+        return row
+
+def queryrowchunks(sql, values, itersize=QUERY_ITERSIZE):
+    # Generator over the rows of a query in lists of at most itersize rows, read through
+    # a named (server-side) cursor: Postgres keeps the result and only one chunk is in
+    # the worker's memory at a time. The connection stays checked out until the
+    # generator is exhausted or closed.
+    with dbconnection() as db:
+        # named cursors live inside a transaction; putconn() ends it
+        db.autocommit = False
+        # callers read the whole result: plan for all rows, not the first 10% that
+        # Postgres assumes for cursors (which picks slow nested loops on big ledgers)
+        db.cursor().execute("SET LOCAL cursor_tuple_fraction = 1.0")
+        cur = db.cursor(name='querychunks')
+        cur.itersize = itersize
+        cur.execute(sql, values)
+        while True:
+            rows = cur.fetchmany(itersize)
+            if not rows:
+                break
+            yield rows
+        cur.close()
+
+def querydatachunks(sql, values, dfcolumns, itersize=QUERY_ITERSIZE):
+    # Same as queryrowchunks, yielding each chunk as a DataFrame
+    for rows in queryrowchunks(sql, values, itersize):
+        yield pd.DataFrame(rows, columns=dfcolumns)
 
-    cursor = db.cursor()
-    cursor.execute(sql,values)
+def executeprepared(cursor, name, sql, values):
+    # Runs sql (with %s placeholders) as the server-side prepared statement `name`,
+    # preparing it the first time it runs on the cursor's connection. Later calls skip
+    # parsing and planning. Prepared statements outlive transactions, not connections.
+    db = cursor.connection
+    if name not in db.prepared:
+        cursor.execute(f"PREPARE {name} AS " + sql % tuple(f'${i}' for i in range(1, len(values) + 1)))
+        db.prepared.add(name)
+    params = f" ({', '.join(['%s'] * len(values))})" if values else ""
+    cursor.execute(f"EXECUTE {name}{params}", values)
 
-    db.commit()
-    db.close()
+def bumpuserversion(cursor, user_id, acc_ids=(), trans_ids=()):
+    # Invalidates the cached query results of the user and of every owner of the accounts
+    # acc_ids and of the accounts of the transactions trans_ids (accounts can be shared
+    # through useraccounts). Call it first on the cursor of the dbtransaction() that
+    # changes the data, so both commit together; the users rows are locked in user_id order.
+    cursor.execute("""
+        UPDATE users SET data_version = data_version + 1
+        WHERE user_id IN (
+            SELECT user_id FROM users
+            WHERE user_id = %s
+                OR user_id IN (SELECT UA.user_id FROM useraccounts UA
+                               WHERE UA.acc_id = ANY(%s::int[])
+                                   OR UA.acc_id IN (SELECT T.acc_id FROM transactions T WHERE T.trans_id = ANY(%s::int[])))
+            ORDER BY user_id
+            FOR UPDATE
+        )
+    """, [user_id, [int(acc_id) for acc_id in acc_ids], [int(trans_id) for trans_id in trans_ids]])
 
-def querydatafromdatabase(sql, values, dfcolumns):
-    db = getdblocation()
-    cur = db.cursor()
-    cur.execute(sql, values)
-    rows = pd.DataFrame(cur.fetchall(), columns=dfcolumns)
-    db.close()
-    return rows
\ No newline at end of file
+@contextmanager
+def dbtransaction():
+    # Unit of work: every statement run on the yielded cursor shares one connection
+    # and one transaction, committed once when the block exits and rolled back if it raises
+    with dbconnection() as db:
+        db.autocommit = False
+        cursor = db.cursor()
+        yield cursor
+        db.commit()
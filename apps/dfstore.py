@@ -0,0 +1,83 @@
+# Compact columnar encoding for DataFrames kept in dcc.Store components
+#
+# A records payload ({"data-frame": df.to_dict("records")}) repeats every column name on
+# every row and sends amounts as strings. encode_df() instead sends one array per column:
+#   - 'dict' columns (account names, types) as a small dictionary plus integer codes
+#   - 'date' columns as days since 1970-01-01
+#   - 'number' columns as floats, 'int' columns as integers, anything else as-is
+# encode_chunks() builds the same payload from an iterator of DataFrame chunks.
+#
+# Every payload carries a key derived from its content, so the browser (assets/home.js)
+# decodes each payload once however many clientside callbacks read the store. No server
+# callback reads the stores back.
+
+import hashlib
+
+from apps import lazy
+
+np = lazy.module('numpy')
+pd = lazy.module('pandas')
+
+FORMAT = 'columnar-v1'
+
+
+def encode_df(df, dict_cols=(), date_cols=(), number_cols=(), int_cols=()):
+    return encode_chunks([df], dict_cols, date_cols, number_cols, int_cols)
+
+
+# Same as encode_df for a frame that arrives in chunks (e.g. dbconnect.querydatachunks):
+# only one chunk is held as a DataFrame while the columns accumulate as numpy arrays.
+# Returns None when there are no chunks at all.
+def encode_chunks(chunks, dict_cols=(), date_cols=(), number_cols=(), int_cols=()):
+    names = None
+    for df in chunks:
+        if names is None:
+            names = list(df.columns)
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(repr(names).encode('utf-8'))
+            parts = {name: [] for name in names}
+            dictionaries = {name: {} for name in names if name in dict_cols}
+            length = 0
+
+        # row hashes, so the key does not depend on where the chunks were cut
+        digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+        length += len(df)
+
+        for name in names:
+            series = df[name]
+            if name in dict_cols:
+                # codes into the dictionary of all chunks so far, in order of first appearance
+                codes, uniques = pd.factorize(series, use_na_sentinel=False)
+                dictionary = dictionaries[name]
+                remap = np.array([dictionary.setdefault(value, len(dictionary)) for value in uniques], dtype='int64')
+                parts[name].append(remap[codes])
+            elif name in date_cols:
+                parts[name].append(pd.to_datetime(series).values.astype('datetime64[D]').astype('int64'))
+            elif name in number_cols:
+                parts[name].append(series.astype('float64').to_numpy())
+            elif name in int_cols:
+                parts[name].append(series.astype('int64').to_numpy())
+            else:
+                parts[name].append(series.astype(object).where(series.notna(), None).to_numpy())
+
+    if names is None:
+        return None
+
+    columns = {}
+    for name in names:
+        values = np.concatenate(parts.pop(name)).tolist()
+        if name in dict_cols:
+            columns[name] = {'kind': 'dict', 'dict': list(dictionaries[name]), 'codes': values}
+        elif name in date_cols:
+            columns[name] = {'kind': 'date', 'values': values}
+        elif name in number_cols:
+            columns[name] = {'kind': 'number', 'values': values}
+        elif name in int_cols:
+            columns[name] = {'kind': 'int', 'values': values}
+        else:
+            columns[name] = {'kind': 'plain', 'values': values}
+
+    key = digest.hexdigest()
+    store = {'format': FORMAT, 'key': key, 'length': length, 'columns': columns}
+    return store
+
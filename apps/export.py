@@ -0,0 +1,155 @@
+# Download of the logged-in user's transactions as CSV or Parquet
+#
+#   GET /export/transactions.csv
+#   GET /export/transactions.parquet
+#
+# Optional query parameters match the home page filters: start_date and end_date
+# (YYYY-MM-DD) and acc_id (repeatable; all accounts when absent, none when the only
+# acc_id is empty, as the home page sends with no account selected). The user comes from
+# the Flask session set at login (see apps/login.py).
+#
+# Rows are read through a server-side cursor (dbconnect.queryrowchunks) EXPORT_CHUNK_ROWS
+# at a time and written to the response chunk by chunk, so a worker holds one chunk at a
+# time whatever the size of the ledger, and the download starts before the query has finished.
+# Parquet export needs the optional pyarrow package.
+
+import csv
+import datetime as dt
+import importlib.util
+import io
+
+import flask
+
+from app import app
+from apps import dbconnect as db
+from apps import lazy
+from apps.home import ledger_conditions
+
+# Parquet export is optional; pyarrow is imported by the first Parquet export (see apps/lazy.py)
+if importlib.util.find_spec('pyarrow') is not None:
+    pa = lazy.module('pyarrow')
+    pq = lazy.module('pyarrow.parquet')
+else:
+    pa = pq = None
+
+EXPORT_CHUNK_ROWS = 10000
+
+# Called before each chunk. gunicorn.conf.py sets it to the worker's heartbeat: a sync
+# worker is otherwise killed once one request has run for TIMEOUT seconds, which a large
+# download can.
+heartbeat = None
+EXPORT_COLUMNS = ['trans_id', 'account', 'trans_type', 'trans_date', 'trans_amt', 'trans_notes']
+
+
+# The user's transactions in date order, as a generator of lists of row tuples
+def ledger_chunks(user_id, start_date, end_date, acc_id_list):
+    where, values = ledger_conditions(user_id, start_date, end_date, acc_id_list)
+    sql = f'''
+            SELECT T.trans_id, A.acc_name, T.trans_type, date(T.trans_date), T.trans_amt, T.trans_notes
+            FROM usertransactions UT JOIN transactions T
+                ON UT.trans_id = T.trans_id
+                JOIN accounts A ON T.acc_id = A.acc_id
+            WHERE {where}
+            ORDER BY T.trans_date, T.trans_id
+        '''
+
+    return with_heartbeat(db.queryrowchunks(sql, values, EXPORT_CHUNK_ROWS))
+
+
+def with_heartbeat(chunks):
+    for rows in chunks:
+        if heartbeat is not None:
+            heartbeat()
+        yield rows
+
+
+def csv_stream(chunks):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(EXPORT_COLUMNS)
+    # the header goes out before the query runs
+    yield out.getvalue()
+    for rows in chunks:
+        out.seek(0)
+        out.truncate()
+        writer.writerows(rows)
+        yield out.getvalue()
+
+
+class _Drain(io.RawIOBase):
+    # Write-only stream that hands what pyarrow writes on to the response.
+    # tell() counts every byte ever written, as the Parquet footer offsets require.
+
+    def __init__(self):
+        self._parts = []
+        self._written = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._written += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._written
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def parquet_stream(chunks):
+    schema = pa.schema([
+        ('trans_id', pa.int64()),
+        ('account', pa.string()),
+        ('trans_type', pa.string()),
+        ('trans_date', pa.date32()),
+        ('trans_amt', pa.float64()),
+        ('trans_notes', pa.string()),
+    ])
+    sink = _Drain()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema)
+    yield sink.drain()
+    for rows in chunks:
+        columns = list(zip(*rows))
+        columns[4] = [float(amt) for amt in columns[4]]
+        # one row group per chunk
+        writer.write_table(pa.Table.from_arrays([pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+                                                schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+@app.server.route('/export/transactions.<fmt>')
+def export_transactions(fmt):
+    user_id = flask.session.get('user_id')
+    if user_id is None:
+        flask.abort(401)
+    if fmt not in ('csv', 'parquet'):
+        flask.abort(404)
+    if fmt == 'parquet' and pa is None:
+        return flask.Response("Parquet export needs the pyarrow package.", status=501, mimetype='text/plain')
+
+    args = flask.request.args
+    try:
+        start_date = dt.date.fromisoformat(args['start_date']) if args.get('start_date') else None
+        end_date = dt.date.fromisoformat(args['end_date']) if args.get('end_date') else None
+        acc_id_list = [int(acc_id) for acc_id in args.getlist('acc_id') if acc_id] if 'acc_id' in args else None
+    except ValueError:
+        flask.abort(400)
+
+    chunks = ledger_chunks(user_id, start_date, end_date, acc_id_list)
+    if fmt == 'csv':
+        body, mimetype = csv_stream(chunks), 'text/csv'
+    else:
+        body, mimetype = parquet_stream(chunks), 'application/vnd.apache.parquet'
+
+    return flask.Response(
+        body,
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=transactions.{fmt}'},
+    )
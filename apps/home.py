@@ -2,497 +2,613 @@
 from dash import dcc
 from dash import html
 import dash_bootstrap_components as dbc
-import dash
-from dash.dependencies import Input, Output, State
+from dash.dependencies import Input, Output, State, ClientsideFunction
 from dash.exceptions import PreventUpdate
 
 import plotly.graph_objs as go
 
-
-import pandas as pd
-pd.options.mode.chained_assignment = None  # default='warn'
 from datetime import date
 import datetime as dt
 
 from app import app
+from apps import balances
 from apps import commonmodules as cm
 from apps import dbconnect as db
-
-from urllib.parse import urlparse, parse_qs
-
-# To solve psycopg having trouble adapting numpy.int64
-import numpy as np
-from psycopg2.extensions import register_adapter, AsIs
-register_adapter(np.int64, AsIs)
-
-# Helper function to filter df based on selected period and accounts
-def filter_df(trans_dict, start_date, end_date, acc_id_list):
-    start_date = dt.datetime.strptime(start_date, "%Y-%m-%d").date(),
-    end_date = dt.datetime.strptime(end_date, "%Y-%m-%d").date(),
-
-    trans_df = pd.DataFrame(trans_dict["data-frame"])
-    trans_df = trans_df[trans_df['AccountID'].isin(acc_id_list)] #filter accounts
-
-    dates = trans_df['Date'].tolist()
-    dates_list = [dt.datetime.strptime(date, "%Y-%m-%d").date() for date in dates]
-
-    trans_df['Date'] = dates_list
-
-    filtered_date_df = trans_df[(trans_df['Date'] >= start_date[0]) & (trans_df['Date'] <= end_date[0])]
-    return filtered_date_df
-
-
-layout = html.Div(
-    [
-        html.Div(
-            [
-                dcc.Location(id='home-url', refresh=True),
-                dcc.Store(id='acc_df'), # to convert to dataframe: acc_df = pd.DataFrame(acc_df["data-frame"])
-                dcc.Store(id='trans_df'), # to convert to dataframe: trans_df = pd.DataFrame(trans_df["data-frame"])
-            ],
-        ),
-
-        html.Div(
-            [
-                dbc.Row(
-                    [
-                        dbc.Col(
-                            [
-                                html.H2(id="welcome-msg"),
-                            ],
-                            width={"size": 3, "order": 1}, 
-                        ),
+from apps import dfstore
+from apps import jobs
+from apps import lazy
+from apps import session
+
+
+def _pandas_options(pandas):
+    pandas.options.mode.chained_assignment = None  # default='warn'
+
+
+# pandas is imported on first use (see apps/lazy.py)
+pd = lazy.module('pandas', on_load=_pandas_options)
+
+# Columns of the trans_df / acc_df stores by encoding (see apps/dfstore.py)
+TRANS_STORE_COLS = dict(dict_cols=('AccountID', 'Account', 'Type', 'Notes'), date_cols=('Date',),
+                        number_cols=('Amount',), int_cols=('TransID',))
+ACC_STORE_COLS = dict(dict_cols=('Type',), number_cols=('Current Balance',), int_cols=('ID',))
+
+# Ledgers up to this many transactions are sent to the browser in full, and
+# filtering by period and account, the totals cards, the top 5 expenses and the
+# transactions table are computed there (assets/home.js) without a server round trip.
+# Larger ledgers are filtered in SQL; the browser then only asks for a new range.
+CLIENTSIDE_LEDGER_LIMIT = 50000
+
+# Columns of the tables filled in by assets/home.js
+HOME_TRANS_COLS = ['Account', 'Type', 'Date', 'Amount', 'Notes']
+HOME_TOP5_COLS = ['Account', 'Date', 'Amount', 'Notes']
+HOME_ACC_COLS = ['Account Name', 'Type', 'Current Balance']
+
+# Helper function to build the WHERE clause shared by the ledger queries:
+# a user's non-deleted transactions, optionally limited to a period and accounts
+def ledger_conditions(user_id, start_date, end_date, acc_id_list):
+    conditions = ["UT.user_id = %s", "T.trans_delete_ind = False"]
+    values = [user_id]
+
+    if acc_id_list is not None:
+        conditions.append("T.acc_id = ANY(%s::int[])")
+        values.append(list(acc_id_list))
+    if start_date:
+        conditions.append("T.trans_date >= %s::date")
+        values.append(start_date)
+    if end_date:
+        conditions.append("T.trans_date < %s::date + 1")
+        values.append(end_date)
+
+    return ' AND '.join(conditions), values
+
+# Helper function to find the whole calendar months inside [start_date, end_date],
+# as [first, last) month starts. None means the range is open on that side.
+def month_span(start_date, end_date):
+    first = last = None
+    if start_date:
+        start = dt.date.fromisoformat(str(start_date)[:10])
+        first = start if start.day == 1 else (start.replace(day=28) + dt.timedelta(days=4)).replace(day=1)
+    if end_date:
+        last = (dt.date.fromisoformat(str(end_date)[:10]) + dt.timedelta(days=1)).replace(day=1)
+    return first, last
+
+# Helper function to aggregate the ledger in SQL: total income, total expenses and
+# the first and last transaction dates for the selected period and accounts.
+# Whole months are read from monthlyrollups (see apps/rollup.py); raw transactions
+# are only scanned for the partial months at either end of the period and, for the
+# first/last dates, inside the first and last month that has rollups.
+def summary_sql(user_id, start_date=None, end_date=None, acc_id_list=None):
+    where, values = ledger_conditions(user_id, start_date, end_date, acc_id_list)
+
+    first, last = month_span(start_date, end_date)
+    rollup_conditions = ["R.user_id = %s", "R.trans_count > 0"]
+    rollup_values = [user_id]
+    if acc_id_list is not None:
+        rollup_conditions.append("R.acc_id = ANY(%s::int[])")
+        rollup_values.append(list(acc_id_list))
+
+    if first and last and first >= last: # no whole month in the period
+        rollup_conditions.append("false")
+        partial, partial_values = "true", []
+    else:
+        month_conditions, partial_values = [], []
+        if first:
+            rollup_conditions.append("R.month >= %s")
+            month_conditions.append("T.trans_date >= %s::date")
+            rollup_values.append(first)
+            partial_values.append(first)
+        if last:
+            rollup_conditions.append("R.month < %s")
+            month_conditions.append("T.trans_date < %s::date")
+            rollup_values.append(last)
+            partial_values.append(last)
+        partial = f"NOT ({' AND '.join(month_conditions)})" if month_conditions else "false"
+
+    sql = f'''
+            WITH rolled AS (
+                SELECT R.month, R.trans_type, R.total_amt
+                FROM monthlyrollups R
+                WHERE {' AND '.join(rollup_conditions)}
+            ),
+            raw AS (
+                SELECT T.trans_type, T.trans_amt, date(T.trans_date) AS trans_day
+                FROM usertransactions UT JOIN transactions T
+                    ON UT.trans_id = T.trans_id
+                WHERE {where} AND {partial}
+            ),
+            edges AS (
+                SELECT trans_day FROM raw
+                UNION ALL
+                SELECT date(T.trans_date)
+                FROM usertransactions UT JOIN transactions T
+                        ON UT.trans_id = T.trans_id,
+                    (SELECT MIN(month) AS lo, MAX(month) AS hi FROM rolled) M
+                WHERE {where} AND (
+                    (T.trans_date >= M.lo AND T.trans_date < M.lo + interval '1 month')
+                    OR (T.trans_date >= M.hi AND T.trans_date < M.hi + interval '1 month'))
+            )
+            SELECT
+                (SELECT COALESCE(SUM(total_amt) FILTER (WHERE trans_type = 'Income'), 0) FROM rolled)
+                    + (SELECT COALESCE(SUM(trans_amt) FILTER (WHERE trans_type = 'Income'), 0) FROM raw),
+                (SELECT COALESCE(SUM(total_amt) FILTER (WHERE trans_type = 'Expense'), 0) FROM rolled)
+                    + (SELECT COALESCE(SUM(trans_amt) FILTER (WHERE trans_type = 'Expense'), 0) FROM raw),
+                (SELECT MIN(trans_day) FROM edges),
+                (SELECT MAX(trans_day) FROM edges)
+        '''
+    return sql, rollup_values + values + partial_values + values
+
+def query_summary(user_id, start_date=None, end_date=None, acc_id_list=None):
+    sql, values = summary_sql(user_id, start_date, end_date, acc_id_list)
+    cols = ['total_income', 'total_expenses', 'min_date', 'max_date']
+
+    df = db.querydatafromdatabase(sql, values, cols, user_id=user_id)
+
+    return df.iloc[0]
+
+# Helper function to read the ledger facts the page needs on load in one query and one
+# read-only transaction: the number of live transactions (from the rollups) and the
+# date of the first transaction. The username and accounts come from the session
+# context (apps/session.py).
+def query_snapshot(user_id):
+    summary, summary_values = summary_sql(user_id)
+    sql = f'''
+            SELECT
+                (SELECT COALESCE(SUM(trans_count), 0) FROM monthlyrollups WHERE user_id = %s),
+                S.min_date
+            FROM ({summary}) S(total_income, total_expenses, min_date, max_date)
+        '''
+    return db.querysnapshot(sql, [user_id] + summary_values)
+
+# Page layout, built on each navigation to the page
+def layout():
+    return html.Div(
+        [
+            html.Div(
+                [
+                    dcc.Location(id='home-url', refresh=True),
+                    dcc.Store(id='acc_df'), # columnar payload of apps/dfstore.py, decoded in assets/home.js
+                    dcc.Store(id='trans_df'), # columnar payload of apps/dfstore.py, decoded in assets/home.js
+                    dcc.Store(id='home-ledger_mode'), # 'full': whole ledger in trans_df, 'range': SQL-filtered
+                    dcc.Store(id='home-server_filters'), # period and accounts to query, set only in 'range' mode
+                    dcc.Store(id='home-summary'), # SQL totals for the cards in 'range' mode
+                ],
+            ),
+
+            html.Div(
+                [
+                    dbc.Row(
+                        [
+                            dbc.Col(
+                                [
+                                    html.H2(id="welcome-msg"),
+                                ],
+                                width={"size": 3, "order": 1}, 
+                            ),
                         
-                        dbc.Col(
-                            [
-                                dbc.Label("Period:",
-                                          style={"display": "flex", "align-items": "center", "justify-content": "flex-end"}
-                                          ),
-                            ],
-                            width={"size": 1, "order": 2},
-                            style={"text-align": "right"}
-                        ),
-                        dbc.Col(
-                            [
-                                dcc.DatePickerRange(
-                                    id='dates_covered',
-                                    max_date_allowed=date.today(),
-                                    end_date = date.today(),
-                                    #style={"display": "flex", "align-items": "center"},
-                                ),
-                            ],
-                            width={"size": 3, "order": 3},
-                            style={"margin-left": "10px"} 
-                        ),
-                        dbc.Col(
-                            [
-                                dbc.Label("Accounts:",
-                                          style={"display": "flex", "align-items": "center"}
-                                          ),
-                            ],
-                            width={"size": 1, "order": 4},
-                            style={"text-align": "right"}
-                        ),
-                        dbc.Col(
-                            [
-                                dcc.Dropdown(
-                                    id='home-acc_dropdown',
-                                    multi=True,
-                                    #style={"display": "flex", "align-items": "center"}
-                                )
-                            ],
-                            width={"size": 3, "order": 5},
-                            style={"margin-left": "10px"} 
-                        ),
-                    ],
-                    style={"margin-bottom": "20px"}
-                )
-            ]
-        ),
-
-        html.Div(
-            [
-                dbc.Row(
-                    [
-                        dbc.Col(
-                            [
-                                dbc.Card(
-                                    [
-                                        dbc.CardHeader(html.H4("Total Income"), className="text-center"),
-                                        dbc.CardBody(
-                                            html.H3(id="total_income"),
-                                            className="text-center"
-                                        )
-                                    ],
-                                    color = "success", outline = True
-                                )
-                            ]
-                        ),
-                        dbc.Col(
-                            [
-                                dbc.Card(
-                                    [
-                                        dbc.CardHeader(html.H4("Total Expenses"), className="text-center"),
-                                        dbc.CardBody(
-                                            html.H3(id="total_expenses"),
-                                            className="text-center"
-                                        )
-                                    ],
-                                    color = "danger", outline = True
-                                )
-                            ]
-                        ),
-                        dbc.Col(
-                            [
-                                dbc.Card(
-                                    [
-                                        dbc.CardHeader(html.H4("Net Amount"), className="text-center"),
-                                        dbc.CardBody(
-                                            html.H3(id="net_gainloss"),
-                                            className="text-center"
-                                        )
-
-                                    ],
-                                    id = 'net_card', outline = True
-                                )
-                            ]
-                        ),
-                    ],
-                    style={"margin-bottom": "20px"}
-                )
-            ],
-        ),
-
-        dbc.Row(
-            [
-                dbc.Col(
-                    [
-                        dbc.Card(
-                            [
-                                dbc.CardHeader(
-                                    html.H3('My Accounts')
-                                ),
-                                dbc.CardBody(
-                                    [
-                                        html.Div(
-                                            id = "home-acc_list",
-                                            style = {'margin-top': '1em'}
-                                        )
-                                    ]
-                                )
-                            ]
-                        ),
-                    ],
-                    width={"size": 4, "order": 1},
-                ),
-                dbc.Col(
-                    [
-                        dbc.Card(
-                            [
-                                dbc.CardHeader(html.H3('Top 5 Expenses')),
-                                dbc.CardBody(
-                                    [
-                                        html.Div(
-                                            id = "top5_exp",
-                                            style = {'margin-top': '1em'},
-                                        )
-                                    ]
-                                )
-                            ]
-                        )
-                    ],
-                    width={"size": 8, "order": 2},
-                )
-            ],
-            style={"margin-bottom": "20px"}
-        ),
-
-        dbc.Row(
-            [
-                dbc.Col(
-                    [
-                        dbc.Card(
-                            [
-                                dbc.CardHeader(
-                                    html.H3('My Transactions')
-                                ),
-                                dbc.CardBody(
-                                    [
-                                        html.Div(
-                                            id = "home-trans_list",
-                                            style = {'margin-top': '1em'}
-                                        )
-                                    ]
-                                )
-                            ]
-                        ),
-                    ],
-                    width={"size": 12, "order": 1},
-                ),
-
-            ]
-        )
+                            dbc.Col(
+                                [
+                                    dbc.Label("Period:",
+                                              style={"display": "flex", "align-items": "center", "justify-content": "flex-end"}
+                                              ),
+                                ],
+                                width={"size": 1, "order": 2},
+                                style={"text-align": "right"}
+                            ),
+                            dbc.Col(
+                                [
+                                    dcc.DatePickerRange(
+                                        id='dates_covered',
+                                        max_date_allowed=date.today(),
+                                        end_date = date.today(),
+                                        #style={"display": "flex", "align-items": "center"},
+                                    ),
+                                ],
+                                width={"size": 3, "order": 3},
+                                style={"margin-left": "10px"} 
+                            ),
+                            dbc.Col(
+                                [
+                                    dbc.Label("Accounts:",
+                                              style={"display": "flex", "align-items": "center"}
+                                              ),
+                                ],
+                                width={"size": 1, "order": 4},
+                                style={"text-align": "right"}
+                            ),
+                            dbc.Col(
+                                [
+                                    dcc.Dropdown(
+                                        id='home-acc_dropdown',
+                                        multi=True,
+                                        #style={"display": "flex", "align-items": "center"}
+                                    )
+                                ],
+                                width={"size": 3, "order": 5},
+                                style={"margin-left": "10px"} 
+                            ),
+                            dbc.Col(
+                                [
+                                    # hrefs follow the filters (see export_links in assets/home.js)
+                                    dbc.DropdownMenu(
+                                        [
+                                            dbc.DropdownMenuItem("CSV", id='home-export_csv', external_link=True),
+                                            dbc.DropdownMenuItem("Parquet", id='home-export_parquet', external_link=True),
+                                        ],
+                                        label="Export",
+                                        color="secondary",
+                                    ),
+                                ],
+                                width={"size": 1, "order": 6},
+                            ),
+                        ],
+                        style={"margin-bottom": "20px"}
+                    )
+                ]
+            ),
+
+            html.Div(
+                [
+                    dbc.Row(
+                        [
+                            dbc.Col(
+                                [
+                                    dbc.Card(
+                                        [
+                                            dbc.CardHeader(html.H4("Total Income"), className="text-center"),
+                                            dbc.CardBody(
+                                                html.H3(id="total_income"),
+                                                className="text-center"
+                                            )
+                                        ],
+                                        color = "success", outline = True
+                                    )
+                                ]
+                            ),
+                            dbc.Col(
+                                [
+                                    dbc.Card(
+                                        [
+                                            dbc.CardHeader(html.H4("Total Expenses"), className="text-center"),
+                                            dbc.CardBody(
+                                                html.H3(id="total_expenses"),
+                                                className="text-center"
+                                            )
+                                        ],
+                                        color = "danger", outline = True
+                                    )
+                                ]
+                            ),
+                            dbc.Col(
+                                [
+                                    dbc.Card(
+                                        [
+                                            dbc.CardHeader(html.H4("Net Amount"), className="text-center"),
+                                            dbc.CardBody(
+                                                html.H3(id="net_gainloss"),
+                                                className="text-center"
+                                            )
+
+                                        ],
+                                        id = 'net_card', outline = True
+                                    )
+                                ]
+                            ),
+                        ],
+                        style={"margin-bottom": "20px"}
+                    )
+                ],
+            ),
+
+            dbc.Row(
+                [
+                    dbc.Col(
+                        [
+                            dbc.Card(
+                                [
+                                    dbc.CardHeader(
+                                        html.H3('My Accounts')
+                                    ),
+                                    dbc.CardBody(
+                                        [
+                                            html.Div(
+                                                [
+                                                    cm.make_grid(pd.DataFrame(columns=HOME_ACC_COLS), 'home-acc_grid', virtualized=False),
+                                                    html.Div(id='home-acc_empty'),
+                                                ],
+                                                id = "home-acc_list",
+                                                style = {'margin-top': '1em'}
+                                            )
+                                        ]
+                                    )
+                                ]
+                            ),
+                        ],
+                        width={"size": 4, "order": 1},
+                    ),
+                    dbc.Col(
+                        [
+                            dbc.Card(
+                                [
+                                    dbc.CardHeader(html.H3('Top 5 Expenses')),
+                                    dbc.CardBody(
+                                        [
+                                            html.Div(
+                                                cm.make_grid(pd.DataFrame(columns=HOME_TOP5_COLS), 'home-top5_grid', virtualized=False),
+                                                id = "top5_exp",
+                                                style = {'margin-top': '1em'},
+                                            )
+                                        ]
+                                    )
+                                ]
+                            )
+                        ],
+                        width={"size": 8, "order": 2},
+                    )
+                ],
+                style={"margin-bottom": "20px"}
+            ),
+
+            dbc.Row(
+                [
+                    dbc.Col(
+                        [
+                            dbc.Card(
+                                [
+                                    dbc.CardHeader(
+                                        html.H3('Balance Over Time')
+                                    ),
+                                    dbc.CardBody(
+                                        [
+                                            dcc.Graph(id='home-balance_chart', config={'displayModeBar': False}),
+                                        ]
+                                    )
+                                ]
+                            ),
+                        ],
+                        width={"size": 12, "order": 1},
+                    ),
+                ],
+                style={"margin-bottom": "20px"}
+            ),
+
+            dbc.Row(
+                [
+                    dbc.Col(
+                        [
+                            dbc.Card(
+                                [
+                                    dbc.CardHeader(
+                                        html.H3('My Transactions')
+                                    ),
+                                    dbc.CardBody(
+                                        [
+                                            html.Div(
+                                                [
+                                                    cm.make_grid(pd.DataFrame(columns=HOME_TRANS_COLS), 'home-trans_grid'),
+                                                    html.Div(id='home-trans_empty'),
+                                                    html.Small(id='home-trans_progress', className='text-muted'),
+                                                ],
+                                                id = "home-trans_list",
+                                                style = {'margin-top': '1em'}
+                                            )
+                                        ]
+                                    )
+                                ]
+                            ),
+                        ],
+                        width={"size": 12, "order": 1},
+                    ),
+
+                ]
+            )
 
         
-    ]
-)
+        ]
+    )
 
-#callback for welcoming the user
+#callback to fill in the page from the session context (apps/session.py) and one snapshot
+#of the user's ledger (query_snapshot): the welcome message, the accounts table and
+#dropdown, the start of the period and where the ledger is filtered: in the browser when
+#the whole ledger is small enough to send once per visit, in SQL otherwise
 @app.callback(
+    [
         Output("welcome-msg",'children'),
-        Input("home-url",'pathname'),
-        State('currentuserid','data')
+        Output('home-ledger_mode','data'),
+        Output('acc_df','data'),
+        Output('home-acc_empty', 'children'),
+        Output("home-acc_dropdown", 'options'),
+        Output("home-acc_dropdown", 'value'),
+        Output("dates_covered",'start_date'),
+    ],
+    Input("home-url",'pathname'),
+    State('currentuserid','data')
 )
-def welcome(pathname,user_id):
+def load_home(pathname, user_id):
     if pathname == '/home' or (pathname == '/' and user_id > 0):
-        None
-        sql = """
-            SELECT username FROM users WHERE user_id = %s
-        """
-        values = [user_id]
-        cols = ['username']
+        context = session.context(user_id)
+        accounts = context.accounts
+        trans_count, min_date = query_snapshot(user_id)
+
+        ledger_mode = 'full' if trans_count <= CLIENTSIDE_LEDGER_LIMIT else 'range'
+
+        if accounts:
+            df = pd.DataFrame(accounts, columns=['ID', 'Account Name','Type','Current Balance'])
+            acc_dict, acc_empty = dfstore.encode_df(df, **ACC_STORE_COLS), None
+        else:
+            acc_dict, acc_empty = None, 'No accounts yet. Click "Accounts" to add your first one.'
 
-        df = db.querydatafromdatabase(sql,values,cols)
-        username = df['username'][0]
+        account_options = context.account_options()
 
-        return f'Welcome, {username}!'
+        return [f'Welcome, {context.username}!', ledger_mode, acc_dict, acc_empty,
+                account_options, [option['value'] for option in account_options],
+                min_date if min_date else date.today()]
 
     else:
         raise PreventUpdate
 
 
-#callback: use pathname change as trigger
-    #If pathname == '/home' or (pathname == '/' and user_id > 0):
-        #load accounts and transactions data
-
-@app.callback(
+#callback to load the transactions into the trans_df store:
+    #'full' mode: the whole ledger, once per visit
+    #'range' mode: the selected period and accounts, whenever assets/home.js asks for a new range
+    #runs as a background job (apps/jobs.py), cancelled when the user leaves the page or picks another range
+@jobs.callback(
     [Output('trans_df','data')],
     [
-        Input('home-url','pathname'),
-        Input("dates_covered",'start_date'),
-        Input("dates_covered", 'end_date'),
-        Input("home-acc_dropdown", 'value'),
+        Input('home-ledger_mode','data'),
+        Input('home-server_filters','data'),
     ],
-    State('currentuserid','data')
+    State('currentuserid','data'),
+    progress=[Output('home-trans_progress', 'children')],
+    progress_default=[None],
+    cancel=[Input('index-url', 'pathname')],
 )
-def create_trans_dict(pathname, start_date, end_date, acc_id_list, user_id):
-    if pathname == '/home' or (pathname == '/' and user_id > 0):
-        #print("Display transactions triggered.")
-
-        sql = ''' 
-                SELECT T.trans_id, A.acc_id, A.acc_name, trans_type, date(trans_date), trans_amt, trans_notes
-                FROM usertransactions UT LEFT JOIN transactions T
-                    ON UT.trans_id = T.trans_id
-                    LEFT JOIN accounts A ON T.acc_id = A.acc_id
-                WHERE user_id = %s AND trans_delete_ind = False
-                ORDER BY trans_date DESC, trans_last_updated DESC
-            '''
-        
-        values = [user_id]
-        cols = ['TransID', 'AccountID', 'Account','Type','Date','Amount','Notes']
-
-        df = db.querydatafromdatabase(sql, values, cols)
-
-        if not df.empty:
-            df_dict = {"data-frame": df.to_dict("records")}
-            
-            return [df_dict]
-        else:
-            return [None]
-
+def create_trans_dict(ledger_mode, server_filters, user_id):
+    if ledger_mode == 'full':
+        # home-server_filters never changes in this mode
+        where, values = ledger_conditions(user_id, None, None, None)
+    elif ledger_mode == 'range' and server_filters:
+        # only the rows shown for the selected period and accounts leave the database
+        where, values = ledger_conditions(user_id, server_filters['start_date'],
+                                          server_filters['end_date'], server_filters['acc_id_list'])
     else:
         raise PreventUpdate
-    
-    
-@app.callback(
-    [Output('home-acc_list', 'children'), Output('acc_df','data')],
-    [
-        Input('home-url','pathname'),
-        Input("home-acc_dropdown", 'value'),
-        Input("dates_covered", 'end_date'),
-
-    ],
-    State('currentuserid','data')
-)
-def display_accs(pathname, acc_id_list, end_date, user_id):
-    if pathname == '/home' or (pathname == '/' and user_id > 0):
-        #print("Display accounts triggered.")
-
-        sql = ''' 
-                SELECT A.acc_id, acc_name, acc_type, acc_bal 
-                FROM useraccounts UA LEFT JOIN accounts A
-                    ON UA.acc_id = A.acc_id
-                WHERE user_id = %s AND acc_delete_ind = False
-                ORDER BY acc_name
-            '''
-        
-        values = [user_id]
-        cols = ['ID', 'Account Name','Type','Current Balance']
-
-        df = db.querydatafromdatabase(sql, values, cols)
 
-        if not df.empty: 
-            df_dict = {"data-frame": df.to_dict("records")}
-            df = df[df['ID'].isin(acc_id_list)]
-            df = df[['Account Name','Type','Current Balance']]
-
-            df['Current Balance'] = ["{:,.2f}".format(x) for x in df['Current Balance'].tolist()]
+    sql = f''' 
+            SELECT T.trans_id, A.acc_id, A.acc_name, trans_type, date(trans_date), trans_amt, trans_notes
+            FROM usertransactions UT JOIN transactions T
+                ON UT.trans_id = T.trans_id
+                JOIN accounts A ON T.acc_id = A.acc_id
+            WHERE {where}
+            ORDER BY trans_date DESC, trans_last_updated DESC
+        '''
+    
+    cols = ['TransID', 'AccountID', 'Account','Type','Date','Amount','Notes']
 
-            table = dbc.Table.from_dataframe(df, striped=True, bordered=True, 
-                                            hover=True, size='sm')
-            
-            return [table, df_dict]
-        else:
-            return ['No accounts yet. Click "Accounts" to add your first one.', None]
+    # read and encoded in chunks, so a large ledger is never one DataFrame on the server
+    df_dict = dfstore.encode_chunks(report_rows(db.querydatachunks(sql, values, cols)), **TRANS_STORE_COLS)
 
-    else:
-        raise PreventUpdate
+    return [df_dict]
 
 
+def report_rows(chunks):
+    rows = 0
+    for chunk in chunks:
+        rows += len(chunk)
+        jobs.report(f"Loading transactions... {rows:,} so far")
+        yield chunk
+    
 
-#callback to populate account options
+#callback to draw the balance of each selected account over the period, from the
+#month-end balance snapshots (see apps/balances.py): at most one point per account and
+#month, so a decade of history is ~120 points per account however many transactions it has
 @app.callback(
+    Output('home-balance_chart', 'figure'),
     [
-        Output("home-acc_dropdown", 'options'),
-        Output("home-acc_dropdown", 'value'),
-    ],
-    [
-        Input("home-url", 'pathname')
+        Input("dates_covered", 'start_date'),
+        Input("dates_covered", 'end_date'),
+        Input("home-acc_dropdown", 'value'),
     ],
-    [
-        State("currentuserid",'data')
-    ]
+    State('currentuserid','data'),
 )
-def populate_accounts(pathname, userid):
-    if pathname == '/home' or (pathname == '/' and userid > 0):
-        sql = """
-        SELECT accounts.acc_name as label, accounts.acc_id as value
-        FROM accounts LEFT JOIN useraccounts
-            ON accounts.acc_id = useraccounts.acc_id
-        WHERE user_id = %s AND acc_delete_ind = False
-        ORDER BY accounts.acc_name
-        """
-        values = [userid]
-        cols = ['label', 'value']
-
-        df = db.querydatafromdatabase(sql, values, cols)
-
-        account_options = df.to_dict('records')
-    else:
+def update_balance_chart(start_date, end_date, acc_id_list, user_id):
+    if not (start_date and end_date and user_id and user_id > 0) or acc_id_list is None:
         raise PreventUpdate
 
-    return [account_options, df['value'].tolist()]
+    sql, values = balances.history_sql(user_id, start_date, end_date, acc_id_list)
+    df = db.querydatafromdatabase(sql, values, ['acc_id', 'acc_name', 'day', 'balance'], user_id=user_id)
 
+    # one line per account, by acc_id: two accounts may share a name
+    fig = go.Figure(
+        [go.Scatter(x=acc_df['day'], y=acc_df['balance'].astype(float), name=acc_df['acc_name'].iloc[0], mode='lines')
+         for acc_id, acc_df in df.groupby('acc_id', sort=False)]
+    )
+    fig.update_layout(
+        margin=dict(l=0, r=0, t=10, b=0),
+        height=300,
+        hovermode='x unified',
+        xaxis=dict(range=[start_date[:10], end_date[:10]]),
+        yaxis=dict(tickformat=',.2f'),
+    )
 
+    return fig
 
 
-#callback to set min date for period
+#callback to total income and expenses in SQL for the income, expenses, and
+#gain/loss cards ('range' mode only; in 'full' mode assets/home.js adds them up)
 @app.callback(
-    Output("dates_covered",'start_date'),
-    Input("trans_df",'modified_timestamp'),
-    State("trans_df",'data')
+    Output("home-summary", 'data'),
+    Input("home-server_filters", 'data'),
+    State('currentuserid','data'),
 )
-def set_start_date(time, trans_dict):
-    if trans_dict:
-        trans_df = pd.DataFrame(trans_dict["data-frame"])
-        dates = trans_df['Date'].tolist()
+def update_totalcards(server_filters, user_id):
+    if server_filters:
+        summary = query_summary(user_id, server_filters['start_date'],
+                                server_filters['end_date'], server_filters['acc_id_list'])
 
-        dates_list = [dt.datetime.strptime(date, "%Y-%m-%d").date() for date in dates]
-        dates_list.sort(reverse=False)
+        return {
+            'total_income': float(summary['total_income']),
+            'total_expenses': float(summary['total_expenses']),
+        }
 
-        start_date = dates_list[0]
-        return start_date
     else:
         raise PreventUpdate
 
-#callback to update income, expenses, and gain/loss cards
-@app.callback(
+
+#clientside callback to pass filter changes on to the server ('range' mode only)
+app.clientside_callback(
+    ClientsideFunction(namespace='home', function_name='route_filters'),
+    Output('home-server_filters', 'data'),
+    [
+        Input("dates_covered", 'start_date'),
+        Input("dates_covered", 'end_date'),
+        Input("home-acc_dropdown", 'value'),
+        Input('home-ledger_mode', 'data'),
+    ]
+)
+
+#clientside callback to update the cards, the transactions in the selected period
+#and the top 5 biggest expenses
+app.clientside_callback(
+    ClientsideFunction(namespace='home', function_name='render_dashboard'),
     [
         Output("total_income", 'children'),
         Output("total_expenses", 'children'),
         Output("net_gainloss", 'children'),
         Output("net_card", 'color'),
-        Output('home-trans_list', 'children'),   
+        Output('home-trans_grid', 'data'),
+        Output('home-trans_empty', 'children'),
+        Output('home-top5_grid', 'data'),
     ],
     [
-        Input("dates_covered",'start_date'),
+        Input("trans_df", 'data'),
+        Input("home-summary", 'data'),
+        Input("dates_covered", 'start_date'),
         Input("dates_covered", 'end_date'),
-        Input("home-acc_dropdown", 'value')
+        Input("home-acc_dropdown", 'value'),
     ],
+    State('home-ledger_mode', 'data'),
+)
+
+#clientside callback to show the selected accounts
+app.clientside_callback(
+    ClientsideFunction(namespace='home', function_name='render_accounts'),
+    Output('home-acc_grid', 'data'),
     [
-        State("trans_df",'data'),
+        Input("acc_df", 'data'),
+        Input("home-acc_dropdown", 'value'),
     ]
 )
-def update_totalcards(start_date, end_date, acc_id_list, trans_dict):
-    if trans_dict:
-        filtered_date_df = filter_df(trans_dict, start_date, end_date, acc_id_list)
-
-        filtered_income_df = filtered_date_df[filtered_date_df['Type'] == "Income"]
-        incomes_str_list = filtered_income_df['Amount'].tolist()
-        filtered_income_df['Amount'] = [float(x) for x in incomes_str_list]
-        total_income = sum(filtered_income_df['Amount'].tolist())
-
-        filtered_expenses_df = filtered_date_df[filtered_date_df['Type'] == "Expense"]
-        expenses_str_list = filtered_expenses_df['Amount'].tolist()
-        filtered_expenses_df['Amount'] = [float(x) for x in expenses_str_list]
-        total_expenses = sum(filtered_expenses_df['Amount'].tolist())
-
-        net_gainloss = total_income - total_expenses
-        if net_gainloss < 0:
-            color = 'danger'
-        elif net_gainloss > 0:
-            color = 'success'
-        else:
-            color = 'warning'
-
-        filtered_date_df = filtered_date_df[['Account','Type','Date','Amount','Notes']]
-
-        table = dbc.Table.from_dataframe(filtered_date_df, striped=True, bordered=True, 
-                                            hover=True, size='sm')
-
-
-        return [
-            "{:,.2f}".format(total_income),
-            "{:,.2f}".format(total_expenses),
-            "{:,.2f}".format(net_gainloss),
-            color,
-            table
-        ]     
-
 
-    else:
-        return [None, None, None, None, 'No transactions. Click "Transactions" to add one.']
-
-
-
-#callback to update top 5 biggest expenses
-@app.callback(
+#clientside callback to point the export links at the selected period and accounts
+app.clientside_callback(
+    ClientsideFunction(namespace='home', function_name='export_links'),
     [
-        Output("top5_exp",'children'),
+        Output('home-export_csv', 'href'),
+        Output('home-export_parquet', 'href'),
     ],
     [
-        Input("home-url",'pathname'),
         Input("dates_covered", 'start_date'),
         Input("dates_covered", 'end_date'),
-        Input("home-acc_dropdown", 'value')
-    ],
-    [
-        State('currentuserid','data'),
-        State("trans_df",'data')
+        Input("home-acc_dropdown", 'value'),
     ]
 )
-def top5_expenses(pathname, start_date, end_date, acc_id_list, user_id, trans_dict):
-    if (pathname == '/home' or (pathname == '/' and user_id > 0)) and trans_dict:
-        filtered_date_df = filter_df(trans_dict, start_date, end_date, acc_id_list)
-        filtered_expenses_df = filtered_date_df[filtered_date_df['Type'] == "Expense"]
-        top5_exp_df = filtered_expenses_df.sort_values(by=['Amount'], ascending=False).head(5)
-
-        top5_exp_df = top5_exp_df[['Account', 'Date', 'Amount', 'Notes']]
-        top5_exp_df['Amount'] = ["{:,.2f}".format(x) for x in top5_exp_df['Amount'].tolist()]
-
-        table = dbc.Table.from_dataframe(top5_exp_df, striped=True, bordered=True, 
-                                            hover=True, size='sm')
-        return [table]
-
-    else:
-        raise PreventUpdate
\ No newline at end of file
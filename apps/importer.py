@@ -0,0 +1,287 @@
+# Bulk import of transactions from CSV
+#
+# Reads files in the layout of sql/transactions.csv:
+#   acc_id,trans_type,trans_date,trans_amt,trans_notes
+# with or without a UTF-8 BOM and with CRLF or LF line ends. Columns after the named ones
+# (spreadsheet exports add a few, sql/transactions.csv has two) are ignored.
+# The file is normalized row by row while COPY streams it into a temporary staging table,
+# so it is never held in memory as a whole. Validation, the inserts into transactions and
+# usertransactions, the account balances, the monthly rollups and the month-end balance
+# snapshots are then one set-based pass each, all in a single transaction: a file is
+# imported completely or not at all.
+#
+# Each transaction is linked (usertransactions) to the users who own its account.
+#
+# Usage: python -m apps.importer FILE [--user-id USER_ID]
+#   --user-id  only accept rows for accounts of this user
+
+import argparse
+import csv
+import io
+import re
+import sys
+from array import array
+
+import psycopg2
+import psycopg2.errors
+
+from apps import dbconnect as db
+
+CSV_COLUMNS = ['acc_id', 'trans_type', 'trans_date', 'trans_amt', 'trans_notes']
+ROWS_PER_CHUNK = 5000  # rows normalized per chunk handed to COPY
+
+
+class ImportRejected(ValueError):
+    # The file cannot be imported; the message says why, with its line number if any
+    pass
+
+
+class _ChunkReader:
+    # Read-only file object over an iterator of str chunks, for cursor.copy_expert()
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._buffer = ''
+        # psycopg2 reports errors raised while COPY reads as a cancelled COPY;
+        # the original is kept here
+        self.error = None
+
+    def _next(self):
+        try:
+            return next(self._chunks, None)
+        except (ImportRejected, UnicodeDecodeError) as e:
+            self.error = e
+            raise
+
+    def read(self, size=-1):
+        parts = [self._buffer]
+        length = len(self._buffer)
+        while size < 0 or length < size:
+            chunk = self._next()
+            if chunk is None:
+                break
+            parts.append(chunk)
+            length += len(chunk)
+        data = ''.join(parts)
+        if size < 0:
+            size = len(data)
+        self._buffer = data[size:]
+        return data[:size]
+
+    def readline(self, size=-1):
+        while '\n' not in self._buffer:
+            chunk = self._next()
+            if chunk is None:
+                break
+            self._buffer += chunk
+        end = self._buffer.find('\n') + 1 or len(self._buffer)
+        line, self._buffer = self._buffer[:end], self._buffer[end:]
+        return line
+
+
+# Yields the rows of a CSV text stream as CSV chunks for COPY, each row prefixed
+# with its line number in the file. The line numbers are also appended to `lines`,
+# so COPY errors (which count rows sent) can be reported by file line.
+def normalized_chunks(text, lines, progress=None):
+    reader = csv.reader(text)
+    header = [name.strip().lower() for name in next(reader, [])]
+    while header and not header[-1]:
+        header.pop()
+    if header != CSV_COLUMNS:
+        raise ImportRejected(f"Expected the columns {', '.join(CSV_COLUMNS)}; found {', '.join(header) or 'none'}.")
+
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator='\n')
+    rows = 0
+    for row in reader:
+        row = [value.strip() for value in row[:len(CSV_COLUMNS)]]
+        if not any(row):
+            continue
+        writer.writerow([reader.line_num] + row + [''] * (len(CSV_COLUMNS) - len(row)))
+        lines.append(reader.line_num)
+        rows += 1
+        if rows % ROWS_PER_CHUNK == 0:
+            if progress is not None:
+                progress(f"Read {rows:,} rows")
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+    yield out.getvalue()
+
+
+# Loads a CSV (binary file object) and returns the number of imported transactions.
+# With user_id, every row must belong to one of that user's accounts.
+# progress, if given, is called with a short status message as the import goes.
+def import_csv(fileobj, user_id=None, progress=None):
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+
+    with db.dbtransaction() as cursor:
+        cursor.execute('''
+            CREATE TEMPORARY TABLE import_staging(
+                line int not null,
+                acc_id int,
+                trans_type varchar(8),
+                trans_date timestamp without time zone,
+                trans_amt decimal,
+                trans_notes varchar(256)
+            ) ON COMMIT DROP
+        ''')
+        lines = array('l')
+        reader = _ChunkReader(normalized_chunks(text, lines, progress))
+        try:
+            cursor.copy_expert(
+                "COPY import_staging (line, acc_id, trans_type, trans_date, trans_amt, trans_notes) FROM STDIN WITH (FORMAT csv)",
+                reader)
+        except psycopg2.DataError as e:
+            row = re.search(r'line (\d+)', e.diag.context or '')
+            where = f"Line {lines[int(row.group(1)) - 1]}: " if row else ""
+            raise ImportRejected(f"{where}{e.diag.message_primary}.") from None
+        except psycopg2.errors.QueryCanceled:
+            if isinstance(reader.error, UnicodeDecodeError):
+                raise ImportRejected("The file is not UTF-8 text.") from None
+            if reader.error is not None:
+                raise reader.error from None
+            raise
+        cursor.execute("ANALYZE import_staging")
+
+        cursor.execute('''
+            SELECT line FROM import_staging
+            WHERE acc_id IS NULL OR trans_date IS NULL OR trans_amt IS NULL OR trans_amt <= 0
+                OR trans_type IS NULL OR trans_type NOT IN ('Income', 'Expense')
+            ORDER BY line LIMIT 1
+        ''')
+        bad = cursor.fetchone()
+        if bad:
+            raise ImportRejected(f"Line {bad[0]}: every row needs an account, a date, "
+                                 "Income or Expense and a positive amount.")
+
+        owner_filter, values = ("AND UA.user_id = %s", [user_id]) if user_id is not None else ("", [])
+        cursor.execute(f'''
+            SELECT S.line FROM import_staging S
+            WHERE NOT EXISTS (
+                SELECT 1 FROM useraccounts UA JOIN accounts A ON A.acc_id = UA.acc_id
+                WHERE UA.acc_id = S.acc_id AND A.acc_delete_ind = False {owner_filter}
+            )
+            ORDER BY S.line LIMIT 1
+        ''', values)
+        bad = cursor.fetchone()
+        if bad:
+            raise ImportRejected(f"Line {bad[0]}: unknown account.")
+
+        if progress is not None:
+            progress(f"Saving {len(lines):,} transactions")
+
+        # invalidate the owners' cached results first: like the other write paths, the
+        # users rows are locked before the accounts
+        cursor.execute('''
+            UPDATE users SET data_version = data_version + 1
+            WHERE user_id IN (
+                SELECT UA.user_id FROM useraccounts UA
+                WHERE UA.acc_id IN (SELECT DISTINCT acc_id FROM import_staging)
+            )
+        ''')
+
+        # then lock the accounts like the other write paths (apps/balances.py), in acc_id order
+        cursor.execute('''
+            SELECT acc_id FROM accounts
+            WHERE acc_id IN (SELECT DISTINCT acc_id FROM import_staging)
+            ORDER BY acc_id
+            FOR UPDATE
+        ''')
+
+        cursor.execute('''
+            WITH inserted AS (
+                INSERT INTO transactions (acc_id, trans_type, trans_date, trans_amt, trans_notes)
+                SELECT acc_id, trans_type, trans_date, trans_amt, trans_notes
+                FROM import_staging
+                ORDER BY line
+                RETURNING trans_id, acc_id
+            )
+            INSERT INTO usertransactions (user_id, trans_id)
+            SELECT UA.user_id, I.trans_id
+            FROM inserted I JOIN useraccounts UA ON UA.acc_id = I.acc_id
+        ''')
+
+        cursor.execute('''
+            UPDATE accounts A
+            SET acc_bal = A.acc_bal + S.delta, acc_last_updated = now()
+            FROM (
+                SELECT acc_id, SUM(CASE WHEN trans_type = 'Income' THEN trans_amt ELSE -trans_amt END) AS delta
+                FROM import_staging
+                GROUP BY acc_id
+            ) S
+            WHERE A.acc_id = S.acc_id
+        ''')
+
+        cursor.execute('''
+            INSERT INTO monthlyrollups (user_id, acc_id, month, trans_type, total_amt, trans_count)
+            SELECT UA.user_id, S.acc_id, date_trunc('month', S.trans_date)::date, S.trans_type,
+                SUM(S.trans_amt), COUNT(*)
+            FROM import_staging S JOIN useraccounts UA ON UA.acc_id = S.acc_id
+            GROUP BY 1, 2, 3, 4
+            ON CONFLICT (user_id, acc_id, month, trans_type) DO UPDATE
+            SET total_amt = monthlyrollups.total_amt + EXCLUDED.total_amt,
+                trans_count = monthlyrollups.trans_count + EXCLUDED.trans_count
+        ''')
+
+        # month-end balances (apps/balances.py): months new to an account start from the
+        # snapshot before them (the opening one, '-infinity', at the latest; an account
+        # without one, which apps.reconcile reports, starts from its balance before the
+        # import), then every month from the first imported one moves by the running total
+        # of the imported amounts
+        cursor.execute('''
+            CREATE TEMPORARY TABLE import_months ON COMMIT DROP AS
+            SELECT acc_id, month, SUM(net) OVER (PARTITION BY acc_id ORDER BY month) AS delta
+            FROM (
+                SELECT acc_id, date_trunc('month', trans_date)::date AS month,
+                    SUM(CASE WHEN trans_type = 'Income' THEN trans_amt ELSE -trans_amt END) AS net
+                FROM import_staging
+                GROUP BY 1, 2
+            ) M
+        ''')
+        cursor.execute('''
+            INSERT INTO balancesnapshots (acc_id, month, balance)
+            SELECT M.acc_id, M.month, COALESCE((
+                SELECT S.balance FROM balancesnapshots S
+                WHERE S.acc_id = M.acc_id AND S.month < M.month
+                ORDER BY S.month DESC LIMIT 1
+            ), A.acc_bal - (
+                SELECT L.delta FROM import_months L
+                WHERE L.acc_id = M.acc_id
+                ORDER BY L.month DESC LIMIT 1
+            ))
+            FROM import_months M JOIN accounts A ON A.acc_id = M.acc_id
+            ON CONFLICT (acc_id, month) DO NOTHING
+        ''')
+        cursor.execute('''
+            UPDATE balancesnapshots S
+            SET balance = S.balance + (
+                SELECT M.delta FROM import_months M
+                WHERE M.acc_id = S.acc_id AND M.month <= S.month
+                ORDER BY M.month DESC LIMIT 1
+            )
+            WHERE S.acc_id IN (SELECT acc_id FROM import_months)
+                AND S.month >= (SELECT MIN(month) FROM import_months M WHERE M.acc_id = S.acc_id)
+        ''')
+
+        cursor.execute("SELECT COUNT(*) FROM import_staging")
+        return cursor.fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import transactions from a CSV file.")
+    parser.add_argument('file', help="CSV in the layout of sql/transactions.csv")
+    parser.add_argument('--user-id', type=int, help="only accept rows for accounts of this user")
+    args = parser.parse_args()
+
+    try:
+        with open(args.file, 'rb') as f:
+            imported = import_csv(f, args.user_id)
+    except ImportRejected as e:
+        print(f"Nothing imported. {e}")
+        sys.exit(1)
+    print(f"Imported {imported} transactions.")
+
+
+if __name__ == '__main__':
+    main()
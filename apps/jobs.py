@@ -0,0 +1,108 @@
+# Background execution of the heavy callbacks
+#
+# jobs.callback() registers a callback like app.callback. When the optional diskcache
+# package is installed (pip install "dash[diskcache]"), the callback runs as a Dash
+# background callback: each call is a job in its own process, so a slow ledger load or
+# import does not hold a Flask worker, and the browser polls for the result. Results and
+# progress go through a diskcache directory shared by all worker processes (JOB_CACHE_DIR).
+#
+# At most JOB_WORKERS jobs run at a time across the whole app; the others wait for a free
+# slot. A job is cancelled (its process killed) when one of its `cancel` inputs changes,
+# or when the same callback fires again before it finished, e.g. after a filter change.
+# Inside a job, jobs.report() updates its `progress` outputs.
+#
+# Without diskcache, or with BACKGROUND_CALLBACKS=0, the callbacks run in the request
+# like any other and jobs.report() does nothing.
+
+import contextvars
+import functools
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from app import app
+from apps import config
+
+JOB_WORKERS = config.getint('JOB_WORKERS', 2)  # jobs running at once, app-wide
+JOB_CACHE_DIR = config.get('JOB_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'spendsense-jobs'))
+JOB_RESULT_TTL = 600        # seconds an unread result is kept
+JOB_POLL_INTERVAL = 500     # milliseconds between the browser's polls for a result
+JOB_SLOT_WAIT = 0.05        # seconds between tries for a free slot
+
+try:
+    import diskcache
+    import psutil
+    from dash import DiskcacheManager
+except ImportError:  # background callbacks are optional
+    diskcache = None
+
+if diskcache is not None and config.get('BACKGROUND_CALLBACKS', '1') != '0':
+    cache = diskcache.Cache(JOB_CACHE_DIR)
+    manager = DiskcacheManager(cache, expire=JOB_RESULT_TTL)
+else:
+    cache = manager = None
+
+_set_progress = contextvars.ContextVar('set_progress', default=None)
+
+
+def _take_slot(pid):
+    # A slot is a cache key holding the pid of the job using it. Slots of processes that
+    # are gone (cancelled jobs are killed before they can give theirs back) are free.
+    with cache.transact():
+        for slot in range(JOB_WORKERS):
+            key = f'job-slot-{slot}'
+            holder = cache.get(key)
+            if holder is None or holder == pid or not psutil.pid_exists(holder):
+                cache.set(key, pid)
+                return key
+    return None
+
+
+@contextmanager
+def job_slot():
+    pid = os.getpid()
+    key = _take_slot(pid)
+    if key is None:
+        report("Waiting for a free worker...")
+        while key is None:
+            time.sleep(JOB_SLOT_WAIT)
+            key = _take_slot(pid)
+    try:
+        yield
+    finally:
+        with cache.transact():
+            if cache.get(key) == pid:
+                cache.delete(key)
+
+
+def report(value):
+    # Sets the progress outputs of the running job
+    set_progress = _set_progress.get()
+    if set_progress is not None:
+        set_progress(value)
+
+
+def callback(*dependencies, progress=None, progress_default=None, cancel=None, running=None, **kwargs):
+    # Same as app.callback, plus the background options above. The decorated function
+    # keeps its signature: progress goes through jobs.report(), not a set_progress argument.
+    def register(func):
+        if manager is None:
+            app.callback(*dependencies, running=running, **kwargs)(func)
+            return func
+
+        @functools.wraps(func)
+        def job(*args):
+            token = _set_progress.set(args[0] if progress else None)
+            try:
+                with job_slot():
+                    return func(*(args[1:] if progress else args))
+            finally:
+                _set_progress.reset(token)
+
+        app.callback(*dependencies, background=True, manager=manager, interval=JOB_POLL_INTERVAL,
+                     progress=progress, progress_default=progress_default, cancel=cancel, running=running,
+                     **kwargs)(job)
+        return func
+
+    return register
@@ -0,0 +1,75 @@
+# Deferred imports
+#
+# pandas and numpy take about half the time a server process needs to import the app
+# (python -m benchmarks.bench_startup), and neither the page shell nor the login page
+# uses them. A module bound with
+#     pd = lazy.module('pandas')
+# is imported the first time one of its attributes is used, i.e. by the first callback
+# that needs it, usually on the first navigation to a data page. on_load functions run
+# once, with the imported module, right after it is imported (or right away if it already
+# was); use them for settings that used to sit next to the import.
+#
+# Only use it for modules whose attributes are not needed at import time.
+
+import importlib
+import threading
+import types
+
+_modules = {}  # name -> LazyModule
+_lock = threading.RLock()
+
+
+class LazyModule(types.ModuleType):
+
+    def __init__(self, name):
+        super().__init__(name)
+        self._module = None
+        self._on_load = []
+
+    def _load(self):
+        module = self._module
+        if module is None:
+            with _lock:
+                if self._module is None:
+                    module = importlib.import_module(self.__name__)
+                    for func in self._on_load:
+                        func(module)
+                    self._module = module
+                module = self._module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+# The lazy module for name, one per name; on_load(module) is called once it is imported
+def module(name, on_load=None):
+    with _lock:
+        lazy = _modules.get(name)
+        if lazy is None:
+            lazy = _modules[name] = LazyModule(name)
+        if on_load is not None:
+            if lazy._module is None:
+                lazy._on_load.append(on_load)
+            else:
+                on_load(lazy._module)
+    return lazy
+
+
+# Names of the lazy modules not imported yet
+def pending():
+    with _lock:
+        return sorted(name for name, lazy in _modules.items() if lazy._module is None)
+
+
+# Imports every lazy module now, e.g. to measure what the first navigation costs
+def load_all():
+    for name in pending():
+        _modules[name]._load()
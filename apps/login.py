@@ -6,122 +6,127 @@ import dash
 from dash.dependencies import Input, Output, State
 from dash.exceptions import PreventUpdate
 
-import hashlib
+import flask
 
 from app import app
 from apps import dbconnect as db
-
-
-layout = html.Div(
-    style={
-        'background': '#f2f2f2',
-        'display': 'flex',
-        'justify-content': 'center',
-        'align-items': 'center',
-        'height': '100vh',
-        "margin-top": "-1em",
-        "margin-left": "-1em",
-        "margin-right": "-1em",
-        "padding": "-1em -1em",
-    },
-    children = [
-        dcc.Location(id='login-url', refresh=True),
-        html.Div(
-            [
-                html.H1("SpendSense", className="app-title", style={'color': '#333', 'font-size': '3rem', 'font-weight': 'bold', 'margin-right': '3rem'}),
-                html.H5("The expense tracker that just makes sense!", className="app-slogan", style={'color': '#666', 'font-size': '1.5rem', 'margin-right': '3rem'}),
-            ],
-            className="app-header",
-            style={'text-align': 'center', 'margin-bottom': '2rem', 'margin-top': '-50px'}
-        ),
-        dbc.Card(
-            [
-                dbc.CardHeader(
-                    [
-                        html.H3("Log In", className="card-title", style={'font-weight': 'bold'}),
-                        html.P("Don't have an account yet? Enter your desired username and password then click Sign Up below.")
-                    ],
-                    className="card-header"
-                ),
-
-                dbc.CardBody(
-                    [
-                        dbc.Row( #Username Field
-                            [
-                                dbc.Col(
-                                    dbc.FormFloating(
-                                        [
-                                            dbc.Input(id='username_input', type='text', placeholder='myuseracc', maxLength=30),
-                                            dbc.Label("Username"),
-                                            dbc.FormFeedback("Invalid input.", type="invalid")
-                                        ],
-                                        style={'color': 'black'}
-                                    ),
-                                    width=10,
-                                )
-                            ],
-                            className='mb-3'
-                        ),
-
-                        dbc.Row( #Password Field
-                            [
-                                dbc.Col(
-                                    dbc.FormFloating(
-                                        [
-                                            dbc.Input(id='pwd_input', type='password', placeholder='mypassword', maxLength=30),
-                                            dbc.Label("Password"),
-                                            dbc.FormFeedback("Invalid input.", type="invalid"),
-                                        ],
-                                        style={'color': 'black'}
-                                    ),
-                                    width=10,
-                                )
-
-                            ],
-                            className='mb-3'
-                        ),
-
-                        html.Div(   #Log-in and Sign-up buttons
-                            [
-                                dbc.Button("Log In", id="login_button", color='primary', className='me-1', n_clicks=0),
-                                dbc.Button("Sign Up", id="signup_button", color='secondary', className='me-1', n_clicks=0)
-                            ],
-                            style={'margin-top': '1rem'}
-                        ),
-
-                    ],
-                    className='card-body',
-                    style={'padding': '2rem'}
-                )
-            ],
-            className='card mb-3',
-            style={'width': '400px', 'max-width': '90%', 'margin-top': '-50px'}
-        ),
-
-        dbc.Modal(  #Pop-up message for incorrect inputs and success notifications
-            [
-                dbc.ModalHeader(dbc.ModalTitle(id="login_modal_header")),
-                dbc.ModalBody(id="login_modal_content"),
-                dbc.ModalFooter(
-                    dbc.Button(
-                        "Close", id="login_modal_close", className="ms-auto", n_clicks=0
+from apps import passwords
+from apps import queries
+from apps import session
+
+
+# Page layout, built on each navigation to the page
+def layout():
+    return html.Div(
+        style={
+            'background': '#f2f2f2',
+            'display': 'flex',
+            'justify-content': 'center',
+            'align-items': 'center',
+            'height': '100vh',
+            "margin-top": "-1em",
+            "margin-left": "-1em",
+            "margin-right": "-1em",
+            "padding": "-1em -1em",
+        },
+        children = [
+            dcc.Location(id='login-url', refresh=True),
+            html.Div(
+                [
+                    html.H1("SpendSense", className="app-title", style={'color': '#333', 'font-size': '3rem', 'font-weight': 'bold', 'margin-right': '3rem'}),
+                    html.H5("The expense tracker that just makes sense!", className="app-slogan", style={'color': '#666', 'font-size': '1.5rem', 'margin-right': '3rem'}),
+                ],
+                className="app-header",
+                style={'text-align': 'center', 'margin-bottom': '2rem', 'margin-top': '-50px'}
+            ),
+            dbc.Card(
+                [
+                    dbc.CardHeader(
+                        [
+                            html.H3("Log In", className="card-title", style={'font-weight': 'bold'}),
+                            html.P("Don't have an account yet? Enter your desired username and password then click Sign Up below.")
+                        ],
+                        className="card-header"
+                    ),
+
+                    dbc.CardBody(
+                        [
+                            dbc.Row( #Username Field
+                                [
+                                    dbc.Col(
+                                        dbc.FormFloating(
+                                            [
+                                                dbc.Input(id='username_input', type='text', placeholder='myuseracc', maxLength=30),
+                                                dbc.Label("Username"),
+                                                dbc.FormFeedback("Invalid input.", type="invalid")
+                                            ],
+                                            style={'color': 'black'}
+                                        ),
+                                        width=10,
+                                    )
+                                ],
+                                className='mb-3'
+                            ),
+
+                            dbc.Row( #Password Field
+                                [
+                                    dbc.Col(
+                                        dbc.FormFloating(
+                                            [
+                                                dbc.Input(id='pwd_input', type='password', placeholder='mypassword', maxLength=30),
+                                                dbc.Label("Password"),
+                                                dbc.FormFeedback("Invalid input.", type="invalid"),
+                                            ],
+                                            style={'color': 'black'}
+                                        ),
+                                        width=10,
+                                    )
+
+                                ],
+                                className='mb-3'
+                            ),
+
+                            html.Div(   #Log-in and Sign-up buttons
+                                [
+                                    dbc.Button("Log In", id="login_button", color='primary', className='me-1', n_clicks=0),
+                                    dbc.Button("Sign Up", id="signup_button", color='secondary', className='me-1', n_clicks=0)
+                                ],
+                                style={'margin-top': '1rem'}
+                            ),
+
+                        ],
+                        className='card-body',
+                        style={'padding': '2rem'}
                     )
-                ),
-            ],
-            id="login_modal",
-            is_open=False,
-        ),
-    ],
-    className="login-page",
-)
+                ],
+                className='card mb-3',
+                style={'width': '400px', 'max-width': '90%', 'margin-top': '-50px'}
+            ),
+
+            dbc.Modal(  #Pop-up message for incorrect inputs and success notifications
+                [
+                    dbc.ModalHeader(dbc.ModalTitle(id="login_modal_header")),
+                    dbc.ModalBody(id="login_modal_content"),
+                    dbc.ModalFooter(
+                        dbc.Button(
+                            "Close", id="login_modal_close", className="ms-auto", n_clicks=0
+                        )
+                    ),
+                ],
+                id="login_modal",
+                is_open=False,
+            ),
+        ],
+        className="login-page",
+    )
 
 
 
 @app.callback(
 #Callback: when log in is clicked,
 #   Verify input:
-#       If username exists:
-#           If password matches:
+#       If username exists (one query for the user ID and password hash):
+#           If password matches (apps/passwords.py, which also upgrades old hashes):
 #               Log in success. Store user ID in "currentuserid" DCC store, and redirect to /home
 #           Else: prompt incorrect password
 #       Else: prompt user does not exist
@@ -182,64 +187,39 @@ def verify_login_signup(login_btn, signup_btn, sessionlogout_time, modalclose_bt
             return [False, None, None, currentuserid, url_redirect, False, False]
 
         elif eventid == 'login_button' and login_btn: # when the login button is clicked
-            sql = '''
-                SELECT username FROM users
-                WHERE username = %s AND user_delete_ind = False
-            '''
+            # one query: no row means no such user
+            user = queries.credentials(username)
 
-            values = [username]
-            col = ['username']
-            df = db.querydatafromdatabase(sql, values, col)
-
-            if df.empty: # username does not exist
+            if user is None: # username does not exist
                 modal_open = True
                 modal_header = "Log In Error"
                 modal_content = "User does not exist."
                 return [modal_open, modal_header, modal_content, -1, None, False, False]
 
             # Username exists, check password
-            sql = '''
-                SELECT user_id, password FROM users
-                WHERE username = %s AND user_delete_ind = False
-            '''
-            values = [username]
-            col = ['user_id','password']
-            df = db.querydatafromdatabase(sql, values, col)
-
-            if df.empty: # something went wrong with the database query
-                modal_open = True
-                modal_header = "Log In Error"
-                modal_content = "An error occurred while retrieving user data."
-                currentuserid = -1
-                return [modal_open, modal_header, modal_content, -1, None, False, False]
-
-            stored_password = df['password'][0]
-            encrypt_string = lambda string: hashlib.sha256(string.encode('utf-8')).hexdigest()
+            matches, needs_upgrade = passwords.verify(pwd, user.password)
 
-            if encrypt_string(pwd) != stored_password: # incorrect password
+            if not matches: # incorrect password
                 modal_open = True
                 modal_header = "Log In Error"
                 modal_content = "Incorrect password."
                 currentuserid = -1
                 return [modal_open, modal_header, modal_content, -1, None, False, False]
 
+            if needs_upgrade: # old or cheaper hash: store one with the current settings
+                sql = "UPDATE users SET password = %s WHERE user_id = %s AND password = %s"
+                db.modifydatabase(sql, [passwords.hash_password(pwd), user.user_id, user.password])
+
             # Password matches. Log In successful!
-            currentuserid = df['user_id'][0]  # store user ID in DCC store
+            currentuserid = user.user_id  # store user ID in DCC store
+            flask.session['user_id'] = int(currentuserid)  # and in the session cookie for /export
+            session.start(int(currentuserid))  # profile and accounts for the pages (apps/session.py)
             redirect_path = "/home" # redirect to "/home"
 
             return [False, None, None, currentuserid, redirect_path, False, False]
 
         elif eventid == 'signup_button' and signup_btn: # when the signup button is clicked
-            sql = '''
-                SELECT username FROM users
-                WHERE username = %s AND user_delete_ind = False
-            '''
-
-            values = [username]
-            col = ['username']
-            df = db.querydatafromdatabase(sql, values, col)
-
-            if not df.empty: # username already exists
+            if queries.username_taken(username): # username already exists
                 modal_open = True
                 modal_header = "Sign Up Error"
                 modal_content = "Username is already taken. Please enter a new one."
@@ -249,8 +229,7 @@ def verify_login_signup(login_btn, signup_btn, sessionlogout_time, modalclose_bt
                         VALUES (%s, %s)
                     '''
                 
-                encrypt_string = lambda string: hashlib.sha256(string.encode('utf-8')).hexdigest() 
-                values = [username, encrypt_string(pwd)]
+                values = [username, passwords.hash_password(pwd)]
 
                 db.modifydatabase(sql, values)
 
@@ -266,6 +245,8 @@ def verify_login_signup(login_btn, signup_btn, sessionlogout_time, modalclose_bt
         
         elif eventid == 'sessionlogout' and pathname == '/logout': # reset the userid if logged out
             currentuserid = -1
+            flask.session.pop('user_id', None)
+            session.end()
             return [False, None, None, currentuserid, None, False, False]
             
         else:
@@ -0,0 +1,257 @@
+# Versioned schema migrations
+#
+# Migrations are the SQL files in sql/migrations, named <version>_<name>.sql and applied
+# in version order. Each file runs in its own transaction together with its row in
+# schema_migrations, so a failed migration leaves nothing half-applied.
+#
+# Usage:
+#   python -m apps.migrate status             list applied and pending migrations
+#   python -m apps.migrate up [--to VERSION]  apply pending migrations
+#   python -m apps.migrate check              EXPLAIN the app's queries on a synthetic
+#                                             dataset and fail on sequential scans
+#
+# `check` loads its dataset inside a transaction that is rolled back at the end; run it
+# against a development or CI database.
+
+import argparse
+import json
+import os
+import sys
+
+from apps import dbconnect as db
+from apps import queries
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sql', 'migrations')
+
+# Tables that grow with the number of users; a sequential scan on any of them fails `check`
+LARGE_TABLES = {'users', 'accounts', 'useraccounts', 'transactions', 'usertransactions', 'monthlyrollups',
+                'balancesnapshots'}
+
+
+def list_migrations():
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        if filename.endswith('.sql'):
+            version, _, name = filename[:-4].partition('_')
+            migrations.append((version, name, os.path.join(MIGRATIONS_DIR, filename)))
+    return migrations
+
+
+def applied_versions(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations(
+            version varchar(16) primary key not null,
+            name varchar(128) not null,
+            applied_at timestamp without time zone default now() not null
+        )
+    ''')
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def status():
+    with db.dbtransaction() as cursor:
+        applied = applied_versions(cursor)
+    return [(version, name, version in applied) for version, name, _ in list_migrations()]
+
+
+def migrate(target=None):
+    done = []
+    for version, name, path in list_migrations():
+        if target is not None and version > target:
+            break
+        with db.dbtransaction() as cursor:
+            # serialize concurrent runners (e.g. several workers starting at once)
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext('schema_migrations'))")
+            if version in applied_versions(cursor):
+                continue
+            with open(path) as f:
+                cursor.execute(f.read())
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                [version, name]
+            )
+        done.append((version, name))
+    return done
+
+
+# Synthetic dataset for `check`: n_users users with 5 accounts each and
+# per_account transactions per account spread over ten years
+SYNTHETIC_DATA_SQL = '''
+    INSERT INTO users (username, password)
+    SELECT 'xc_' || g, 'x' FROM generate_series(1, %(n_users)s) g;
+
+    INSERT INTO accounts (acc_name, acc_type, acc_bal)
+    SELECT 'xc_' || U.user_id || '_' || k, 'Cash', 0
+    FROM users U, generate_series(1, 5) k
+    WHERE U.username LIKE 'xc\\_%%';
+
+    INSERT INTO useraccounts (user_id, acc_id)
+    SELECT split_part(A.acc_name, '_', 2)::int, A.acc_id
+    FROM accounts A
+    WHERE A.acc_name LIKE 'xc\\_%%';
+
+    INSERT INTO transactions (acc_id, trans_type, trans_date, trans_amt, trans_delete_ind)
+    SELECT A.acc_id,
+        CASE WHEN random() < 0.2 THEN 'Income' ELSE 'Expense' END,
+        timestamp '2014-01-01' + random() * interval '3650 days',
+        round((random() * 5000)::numeric, 2),
+        random() < 0.02
+    FROM accounts A, generate_series(1, %(per_account)s)
+    WHERE A.acc_name LIKE 'xc\\_%%';
+
+    INSERT INTO usertransactions (user_id, trans_id)
+    SELECT UA.user_id, T.trans_id
+    FROM transactions T JOIN useraccounts UA ON T.acc_id = UA.acc_id
+    JOIN accounts A ON A.acc_id = T.acc_id
+    WHERE A.acc_name LIKE 'xc\\_%%';
+
+    INSERT INTO monthlyrollups (user_id, acc_id, month, trans_type, total_amt, trans_count)
+    SELECT UT.user_id, T.acc_id, date_trunc('month', T.trans_date)::date, T.trans_type, SUM(T.trans_amt), COUNT(*)
+    FROM usertransactions UT JOIN transactions T ON UT.trans_id = T.trans_id
+    JOIN users U ON U.user_id = UT.user_id
+    WHERE T.trans_delete_ind = False AND U.username LIKE 'xc\\_%%'
+    GROUP BY 1, 2, 3, 4;
+
+    INSERT INTO balancesnapshots (acc_id, month, balance)
+    SELECT A.acc_id, '-infinity', 0
+    FROM accounts A
+    WHERE A.acc_name LIKE 'xc\\_%%'
+    UNION ALL
+    SELECT M.acc_id, M.month, SUM(M.net) OVER (PARTITION BY M.acc_id ORDER BY M.month)
+    FROM (
+        SELECT T.acc_id, date_trunc('month', T.trans_date)::date AS month,
+            SUM(CASE WHEN T.trans_type = 'Income' THEN T.trans_amt ELSE -T.trans_amt END) AS net
+        FROM transactions T JOIN accounts A ON A.acc_id = T.acc_id
+        WHERE T.trans_delete_ind = False AND A.acc_name LIKE 'xc\\_%%'
+        GROUP BY 1, 2
+    ) M;
+
+    ANALYZE;
+'''
+
+
+class _Captured(Exception):
+    pass
+
+
+# Runs func until its first database query and returns that query instead of running it,
+# so `check` explains exactly the SQL the callbacks and helpers build
+def capture_query(func, *args):
+    captured = []
+
+    def capture(sql, values, *rest, **kwargs):
+        captured.append((sql, values))
+        raise _Captured()
+
+    readers = ['querydatafromdatabase', 'querysnapshot', 'querydatachunks', 'queryrowchunks']
+    originals = {name: getattr(db, name) for name in readers}
+    for name in readers:
+        setattr(db, name, capture)
+    try:
+        func(*args)
+    except _Captured:
+        pass
+    finally:
+        for name, original in originals.items():
+            setattr(db, name, original)
+    return captured[0]
+
+
+def app_queries(user_id, acc_ids, acc_id):
+    # Imported here: the page modules pull in the Dash app
+    from apps import home, transactions, export, balances, session
+
+    start, end = '2019-03-15', '2021-08-20'
+    yield 'home.query_snapshot', capture_query(home.query_snapshot, user_id)
+    yield 'home.create_trans_dict (full)', capture_query(home.create_trans_dict, 'full', None, user_id)
+    yield 'home.create_trans_dict (range)', capture_query(
+        home.create_trans_dict, 'range', {'start_date': start, 'end_date': end, 'acc_id_list': acc_ids}, user_id)
+    yield 'home.query_summary', capture_query(home.query_summary, user_id, start, end, acc_ids)
+    yield 'home.query_summary (bounds)', capture_query(home.query_summary, user_id)
+    yield 'home.update_balance_chart', capture_query(home.update_balance_chart, start, end, acc_ids, user_id)
+    yield 'balances.balances_as_of', capture_query(balances.balances_as_of, acc_ids, end)
+    yield 'transactions.query_trans_page', capture_query(
+        transactions.query_trans_page, user_id, {}, 'date_desc', None, 51)
+    yield 'transactions.query_trans_page (deep page)', capture_query(
+        transactions.query_trans_page, user_id, {}, 'date_desc', ['2015-06-01 00:00:00', 1], 51)
+    yield 'transactions.query_trans_page (filtered)', capture_query(
+        transactions.query_trans_page, user_id,
+        {'acc_ids': [acc_id], 'trans_type': 'Expense', 'start_date': start, 'end_date': end,
+         'min_amt': 100, 'max_amt': 1000},
+        'amt_desc', None, 51)
+    yield 'export.ledger_chunks', capture_query(export.ledger_chunks, user_id, start, end, acc_ids)
+    yield 'session.context', (session.CONTEXT_SQL, [user_id])
+    yield 'session.context (version)', (session.VERSION_SQL, [user_id])
+    yield 'queries.username_taken', (queries.USERNAME_TAKEN_SQL, ['xc_1'])
+    yield 'queries.credentials', (queries.CREDENTIALS_SQL, ['xc_1'])
+    yield 'queries.account', (queries.ACCOUNT_SQL, [acc_id])
+    yield 'queries.transaction', (queries.TRANSACTION_SQL, [1])
+
+
+def seq_scans(plan):
+    scans = []
+    if plan.get('Node Type') == 'Seq Scan' and plan.get('Relation Name') in LARGE_TABLES:
+        scans.append(plan['Relation Name'])
+    for child in plan.get('Plans', []):
+        scans += seq_scans(child)
+    return scans
+
+
+def check(n_users=2000, per_account=40, verbose=False):
+    failures = []
+    with db.dbtransaction() as cursor:
+        cursor.execute(SYNTHETIC_DATA_SQL, {'n_users': n_users, 'per_account': per_account})
+        cursor.execute('''
+            SELECT UA.user_id, array_agg(UA.acc_id ORDER BY UA.acc_id)
+            FROM useraccounts UA JOIN users U ON U.user_id = UA.user_id
+            WHERE U.username = 'xc_1'
+            GROUP BY UA.user_id
+        ''')
+        user_id, acc_ids = cursor.fetchone()
+
+        for name, (sql, values) in app_queries(user_id, acc_ids, acc_ids[0]):
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql, values)
+            plan = cursor.fetchone()[0][0]['Plan']
+            scans = seq_scans(plan)
+            print(f"{'FAIL' if scans else 'ok':>4}  {name}" + (f"  (seq scan on {', '.join(scans)})" if scans else ""))
+            if verbose:
+                print(json.dumps(plan, indent=2))
+            if scans:
+                failures.append(name)
+
+        # never keep the synthetic dataset
+        cursor.connection.rollback()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply and check SpendSense schema migrations.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help="list applied and pending migrations")
+    up_parser = subparsers.add_parser('up', help="apply pending migrations")
+    up_parser.add_argument('--to', dest='target', help="stop after this version")
+    check_parser = subparsers.add_parser('check', help="fail if an app query plans a sequential scan")
+    check_parser.add_argument('--users', type=int, default=2000)
+    check_parser.add_argument('--transactions-per-account', type=int, default=40)
+    check_parser.add_argument('--verbose', action='store_true', help="print every plan")
+    args = parser.parse_args()
+
+    if args.command == 'status':
+        for version, name, applied in status():
+            print(f"{version}  {'applied' if applied else 'pending':<8} {name}")
+    elif args.command == 'up':
+        done = migrate(args.target)
+        for version, name in done:
+            print(f"Applied {version} {name}")
+        if not done:
+            print("Nothing to apply.")
+    elif args.command == 'check':
+        failures = check(args.users, args.transactions_per_account, args.verbose)
+        if failures:
+            print(f"{len(failures)} queries fall back to sequential scans.")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+# Password hashing
+#
+# Passwords are stored as salted PBKDF2-HMAC-SHA256 hashes:
+#   pbkdf2_sha256$<iterations>$<salt>$<hash>      (salt and hash in unpadded base64)
+# PASSWORD_ITERATIONS sets the cost of new hashes. Hashes from before (unsalted SHA-256
+# hex digests) and hashes with fewer iterations still verify, and verify() says when a
+# hash should be replaced: the login page then stores a new one (upgrade on login).
+#
+# The hashing runs on the request's own thread. Under gunicorn each sync worker serves
+# one request at a time, so a burst of logins hashes on at most WEB_CONCURRENCY cores;
+# size the worker count, not a per-process limit, for PASSWORD_ITERATIONS.
+
+import base64
+import hashlib
+import hmac
+import os
+
+from apps import config
+
+PASSWORD_ITERATIONS = config.getint('PASSWORD_ITERATIONS', 600000)
+SALT_BYTES = 16
+ALGORITHM = 'pbkdf2_sha256'
+
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+
+def _pbkdf2(password, salt, iterations):
+    return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+
+
+def _hash(password, iterations):
+    salt = os.urandom(SALT_BYTES)
+    return f'{ALGORITHM}${iterations}${_b64(salt)}${_b64(_pbkdf2(password, salt, iterations))}'
+
+
+def _verify(password, stored):
+    if not stored.startswith(ALGORITHM + '$'):
+        # unsalted SHA-256 from before
+        legacy = hashlib.sha256(password.encode('utf-8')).hexdigest()
+        return hmac.compare_digest(legacy, stored), True
+
+    _, iterations, salt, expected = stored.split('$')
+    salt = base64.b64decode(salt + '=' * (-len(salt) % 4))
+    computed = _b64(_pbkdf2(password, salt, int(iterations)))
+    return hmac.compare_digest(computed, expected), int(iterations) < PASSWORD_ITERATIONS
+
+
+# New hash of password to store in users.password
+def hash_password(password, iterations=None):
+    return _hash(password, iterations or PASSWORD_ITERATIONS)
+
+
+# Checks password against a stored hash. Returns (matches, needs_upgrade).
+def verify(password, stored):
+    return _verify(password, stored)
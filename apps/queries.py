@@ -0,0 +1,87 @@
+# Single-row lookups shared by the pages
+#
+# Each lookup is one fixed query, run as a server-side prepared statement
+# (dbconnect.executeprepared), that returns a scalar or a small row object with
+# __slots__ rather than a one-row DataFrame. None means no such row.
+# The SQL lives in the *_SQL constants below (also used by `python -m apps.migrate check`).
+
+from apps import dbconnect as db
+
+
+class Row:
+    # Base of the row types: fields are the __slots__ of the subclass, in query column order
+
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def __iter__(self):
+        return (getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and tuple(self) == tuple(other)
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)
+        return f'{type(self).__name__}({fields})'
+
+
+class Credentials(Row):
+    __slots__ = ('user_id', 'password')
+
+
+class Account(Row):
+    __slots__ = ('acc_name', 'acc_type', 'acc_bal')
+
+
+class Transaction(Row):
+    __slots__ = ('acc_id', 'trans_type', 'trans_date', 'trans_amt', 'trans_notes')
+
+
+USERNAME_TAKEN_SQL = "SELECT EXISTS (SELECT 1 FROM users WHERE username = %s AND user_delete_ind = False)"
+
+CREDENTIALS_SQL = "SELECT user_id, password FROM users WHERE username = %s AND user_delete_ind = False"
+
+ACCOUNT_SQL = "SELECT acc_name, acc_type, acc_bal FROM accounts WHERE acc_id = %s"
+
+TRANSACTION_SQL = '''
+    SELECT acc_id, trans_type, trans_date, trans_amt, trans_notes
+    FROM transactions
+    WHERE trans_id = %s
+'''
+
+
+def _fetchone(name, sql, values):
+    with db.dbconnection() as conn:
+        cursor = conn.cursor()
+        db.executeprepared(cursor, name, sql, values)
+        return cursor.fetchone()
+
+
+def _scalar(name, sql, values):
+    row = _fetchone(name, sql, values)
+    return row[0] if row else None
+
+
+def _row(row_type, name, sql, values):
+    row = _fetchone(name, sql, values)
+    return row_type(*row) if row else None
+
+
+def username_taken(username):
+    return _scalar('lookup_username_taken', USERNAME_TAKEN_SQL, [username])
+
+
+# Credentials of the live user with this username
+def credentials(username):
+    return _row(Credentials, 'lookup_credentials', CREDENTIALS_SQL, [username])
+
+
+def account(acc_id):
+    return _row(Account, 'lookup_account', ACCOUNT_SQL, [acc_id])
+
+
+def transaction(trans_id):
+    return _row(Transaction, 'lookup_transaction', TRANSACTION_SQL, [trans_id])
@@ -0,0 +1,127 @@
+# Reconciliation of account balances against the ledger
+#
+# An account's expected balance is its opening balance (the '-infinity' snapshot of
+# apps/balances.py, recorded when the account was created, or by migration 0004 for
+# older accounts) plus its live transactions. drift() computes it for every account of
+# every user in one set-based query (a single pass over transactions) and returns the
+# accounts whose current balance (accounts.acc_bal) or latest month-end snapshot differs,
+# and the accounts without an opening snapshot (expected is then NULL).
+#
+# repair() sets those balances to the expected ones under the account row locks the
+# write paths take, so a write in progress is never overwritten, then rebuilds drifted
+# snapshots from the repaired balances. Accounts without an opening snapshot get theirs
+# rebuilt from their current balance, the only record of it left.
+#
+# Usage: python -m apps.reconcile [--repair] [--acc-id ACC_ID ...]
+#   exits with status 1 when drift is found and not repaired
+
+import argparse
+import sys
+
+from apps import balances
+from apps import dbconnect as db
+
+DRIFT_COLS = ['acc_id', 'acc_name', 'acc_bal', 'expected', 'snapshot']
+
+
+# Helper function to build the drift query, over all accounts or only acc_id_list
+def drift_sql(acc_id_list=None):
+    if acc_id_list is None:
+        acc_filter, trans_filter, values = "true", "", []
+    else:
+        acc_filter = "A.acc_id = ANY(%s::int[])"
+        trans_filter = "AND acc_id = ANY(%s::int[])"
+        values = [list(acc_id_list)] * 2
+
+    sql = f'''
+        WITH ledger AS (
+            SELECT acc_id, SUM({balances.SIGNED_AMT}) AS net
+            FROM transactions
+            WHERE trans_delete_ind = False {trans_filter}
+            GROUP BY acc_id
+        ),
+        expected AS (
+            SELECT A.acc_id, A.acc_name, A.acc_bal, O.balance + COALESCE(L.net, 0) AS expected,
+                (SELECT S.balance FROM balancesnapshots S
+                 WHERE S.acc_id = A.acc_id
+                 ORDER BY S.month DESC
+                 LIMIT 1) AS snapshot
+            FROM accounts A
+                LEFT JOIN balancesnapshots O ON O.acc_id = A.acc_id AND O.month = '-infinity'
+                LEFT JOIN ledger L ON L.acc_id = A.acc_id
+            WHERE {acc_filter}
+        )
+        SELECT acc_id, acc_name, acc_bal, expected, snapshot
+        FROM expected
+        WHERE expected IS NULL OR acc_bal <> expected OR snapshot <> expected
+        ORDER BY acc_id
+    '''
+    return sql, values
+
+
+# Accounts whose balance or latest snapshot differs from their ledger, as a DataFrame
+def drift(acc_id_list=None):
+    sql, values = drift_sql(acc_id_list)
+    return db.querydatafromdatabase(sql, values, DRIFT_COLS)
+
+
+# Sets the drifted balances to the expected ones and rebuilds drifted snapshots.
+# Returns the repaired rows, recomputed under the locks.
+def repair(acc_id_list):
+    if not acc_id_list:
+        return []
+
+    with db.dbtransaction() as cursor:
+        # results cached from the drifted balances must not be served again; the users
+        # rows are locked before the accounts rows, in the order of the write paths
+        cursor.execute('''
+            UPDATE users SET data_version = data_version + 1
+            WHERE user_id IN (SELECT user_id FROM useraccounts WHERE acc_id = ANY(%s::int[]))
+        ''', [list(acc_id_list)])
+        balances.lock_accounts(cursor, acc_id_list)
+
+        sql, values = drift_sql(acc_id_list)
+        cursor.execute(sql, values)
+        rows = cursor.fetchall()
+        cursor.execute('''
+            UPDATE accounts A
+            SET acc_bal = R.expected, acc_last_updated = now()
+            FROM unnest(%s::int[], %s::decimal[]) R(acc_id, expected)
+            WHERE A.acc_id = R.acc_id AND A.acc_bal <> R.expected
+        ''', [[row[0] for row in rows if row[3] is not None], [row[3] for row in rows if row[3] is not None]])
+
+        # the snapshots follow from the repaired balances; rebuilt under the same locks,
+        # so no write in between is lost from them
+        for acc_id, acc_name, acc_bal, expected, snapshot in rows:
+            if expected is None or snapshot != expected:
+                balances.rebuild_snapshots(cursor, acc_id)
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check account balances against the ledger.")
+    parser.add_argument('--repair', action='store_true', help="set drifted balances to the ledger's")
+    parser.add_argument('--acc-id', type=int, nargs='+', help="only check these accounts")
+    args = parser.parse_args()
+
+    df = drift(args.acc_id)
+    for row in df.itertuples(index=False):
+        if row.expected is None:
+            print(f"{row.acc_id:>8}  {row.acc_name:<24} balance {row.acc_bal:>16,.2f}  no opening snapshot")
+            continue
+        print(f"{row.acc_id:>8}  {row.acc_name:<24} balance {row.acc_bal:>16,.2f}  "
+              f"ledger {row.expected:>16,.2f}  snapshot {row.snapshot:>16,.2f}")
+
+    if df.empty:
+        print("All balances match the ledger.")
+    elif args.repair:
+        rows = repair(df['acc_id'].tolist())
+        print(f"Repaired {len(rows)} accounts.")
+    else:
+        print(f"{len(df)} accounts drift from the ledger; run with --repair to fix them.")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
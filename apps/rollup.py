@@ -0,0 +1,69 @@
+# Per-user monthly income/expense rollups for the home dashboard
+#
+# monthlyrollups holds, for every (user_id, acc_id, month, trans_type), the sum and count
+# of that user's non-deleted transactions. Write paths keep it current with
+# apply_trans() inside their unit of work; rebuild() recomputes it from the ledger.
+#
+# Usage: python -m apps.rollup rebuild [--user-id USER_ID]
+
+import argparse
+
+from apps import dbconnect as db
+
+
+# Adds (sign=1) or removes (sign=-1) one transaction from its month's rollup row.
+# Must run on the dbtransaction() cursor of the ledger change it mirrors.
+def apply_trans(cursor, user_id, acc_id, trans_date, trans_type, trans_amt, sign=1):
+    sql = '''
+        INSERT INTO monthlyrollups (user_id, acc_id, month, trans_type, total_amt, trans_count)
+        VALUES (%s, %s, date_trunc('month', %s::date)::date, %s, %s * %s::decimal, %s)
+        ON CONFLICT (user_id, acc_id, month, trans_type) DO UPDATE
+        SET total_amt = monthlyrollups.total_amt + EXCLUDED.total_amt,
+            trans_count = monthlyrollups.trans_count + EXCLUDED.trans_count
+    '''
+    values = [user_id, acc_id, trans_date, trans_type, sign, trans_amt, sign]
+    cursor.execute(sql, values)
+
+
+# Recomputes the rollups of one user (or of everyone) from the ledger in one pass
+def rebuild(user_id=None):
+    if user_id is None:
+        delete_sql, user_filter, values = "DELETE FROM monthlyrollups", "", []
+    else:
+        delete_sql = "DELETE FROM monthlyrollups WHERE user_id = %s"
+        user_filter = "AND UT.user_id = %s"
+        values = [user_id]
+
+    with db.dbtransaction() as cursor:
+        # results cached from the old rollups must not be served again
+        if user_id is None:
+            cursor.execute("UPDATE users SET data_version = data_version + 1")
+        else:
+            db.bumpuserversion(cursor, user_id)
+        cursor.execute(delete_sql, values)
+        cursor.execute(f'''
+            INSERT INTO monthlyrollups (user_id, acc_id, month, trans_type, total_amt, trans_count)
+            SELECT UT.user_id, T.acc_id, date_trunc('month', T.trans_date)::date, T.trans_type,
+                SUM(T.trans_amt), COUNT(*)
+            FROM usertransactions UT JOIN transactions T
+                ON UT.trans_id = T.trans_id
+            WHERE T.trans_delete_ind = False {user_filter}
+            GROUP BY 1, 2, 3, 4
+        ''', values)
+        return cursor.rowcount
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the monthly dashboard rollups.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    rebuild_parser = subparsers.add_parser('rebuild', help="recompute rollups from the ledger")
+    rebuild_parser.add_argument('--user-id', type=int, help="only rebuild this user's rollups")
+    args = parser.parse_args()
+
+    if args.command == 'rebuild':
+        rows = rebuild(args.user_id)
+        print(f"Rebuilt {rows} rollup rows.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+# Server-side session context
+#
+# The pages read the logged-in user's profile and account directory from a context
+# object kept on the server per browser session, instead of querying the account list on
+# every navigation. The session is identified by a random token in the Flask session
+# cookie (flask.session['sid']); the context is filled at login (start()), refreshed after
+# account changes (refresh()) and dropped at logout (end()).
+#
+# Each read checks the context against users.data_version, one primary-key lookup; any
+# write to the user's data bumps it (dbconnect.bumpuserversion), so a context filled
+# before a change made in another tab, browser or worker process is refilled, in one query.
+# Contexts live in the memory of each server process: a process that has not seen the
+# session yet fills it on first read. Contexts unused for SESSION_TTL seconds are dropped,
+# and at most SESSION_MAX_CONTEXTS are kept per process.
+
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+import flask
+
+from apps import dbconnect as db
+from apps import queries
+
+SESSION_TTL = 3600
+SESSION_MAX_CONTEXTS = 10000
+
+
+class SessionContext(queries.Row):
+    # accounts: [acc_id, acc_name, acc_type, acc_bal] lists of the live accounts, by name
+    __slots__ = ('user_id', 'version', 'username', 'accounts')
+
+    def account_options(self):
+        return [{'label': acc_name, 'value': acc_id} for acc_id, acc_name, acc_type, acc_bal in self.accounts]
+
+
+VERSION_SQL = "SELECT data_version FROM users WHERE user_id = %s"
+
+CONTEXT_SQL = '''
+    SELECT U.user_id, U.data_version, U.username,
+        COALESCE((SELECT json_agg(json_build_array(A.acc_id, A.acc_name, A.acc_type, A.acc_bal) ORDER BY A.acc_name)
+                  FROM useraccounts UA JOIN accounts A
+                    ON UA.acc_id = A.acc_id
+                  WHERE UA.user_id = U.user_id AND A.acc_delete_ind = False), '[]')
+    FROM users U
+    WHERE U.user_id = %s
+'''
+
+_contexts = OrderedDict()  # token -> (last used, SessionContext)
+_lock = threading.Lock()
+
+
+def _get(token):
+    now = time.monotonic()
+    with _lock:
+        entry = _contexts.get(token)
+        if entry is None:
+            return None
+        if entry[0] + SESSION_TTL <= now:
+            del _contexts[token]
+            return None
+        _contexts[token] = (now, entry[1])
+        _contexts.move_to_end(token)
+        return entry[1]
+
+
+def _put(token, context):
+    with _lock:
+        _contexts[token] = (time.monotonic(), context)
+        _contexts.move_to_end(token)
+        while len(_contexts) > SESSION_MAX_CONTEXTS:
+            _contexts.popitem(last=False)
+
+
+def _load(cursor, user_id):
+    db.executeprepared(cursor, 'session_context', CONTEXT_SQL, [user_id])
+    return SessionContext(*cursor.fetchone())
+
+
+def _token():
+    token = flask.session.get('sid')
+    if token is None:
+        token = flask.session['sid'] = secrets.token_urlsafe(16)
+    return token
+
+
+# Fills the context of a new login
+def start(user_id):
+    flask.session['sid'] = secrets.token_urlsafe(16)
+    refresh(user_id)
+
+
+# Reloads the context, e.g. after the user's accounts changed
+def refresh(user_id):
+    with db.dbconnection() as conn:
+        context = _load(conn.cursor(), user_id)
+    _put(_token(), context)
+    return context
+
+
+# The context of the current session for user_id, refilled if the user's data changed
+def context(user_id):
+    token = _token()
+    cached = _get(token)
+    with db.dbconnection() as conn:
+        cursor = conn.cursor()
+        if cached is not None and cached.user_id == user_id:
+            db.executeprepared(cursor, 'session_version', VERSION_SQL, [user_id])
+            if cursor.fetchone()[0] == cached.version:
+                return cached
+        context = _load(cursor, user_id)
+    _put(token, context)
+    return context
+
+
+def end():
+    token = flask.session.pop('sid', None)
+    if token is not None:
+        with _lock:
+            _contexts.pop(token, None)
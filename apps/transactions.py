@@ -6,208 +6,304 @@ import dash
 from dash.dependencies import Input, Output, State
 from dash.exceptions import PreventUpdate
 
-import pandas as pd
 from datetime import date
+import base64
+import io
 
 from app import app
+from apps import balances
 from apps import commonmodules as cm
 from apps import dbconnect as db
+from apps import importer
+from apps import jobs
+from apps import queries
+from apps import rollup
+from apps import session
 
 from urllib.parse import urlparse, parse_qs
 
-# To solve psycopg having trouble adapting numpy.int64
-import numpy as np
-from psycopg2.extensions import register_adapter, AsIs
-register_adapter(np.int64, AsIs)
-
-# Helper function to find trans_id
-def find_trans_id(acc_id, trans_type, trans_date, trans_amt, trans_notes):
-    if not trans_notes: #trans_notes is empty
-        sql = """
-            SELECT trans_id FROM transactions
-            WHERE acc_id = %s AND trans_type = %s AND trans_date = %s AND trans_amt = %s AND trans_notes IS NULL
-                AND trans_delete_ind = False
-            ORDER BY trans_last_updated DESC
-        """
-        values = [acc_id, trans_type, trans_date, trans_amt]
-    else:
-        sql = """
-            SELECT trans_id FROM transactions
-            WHERE acc_id = %s AND trans_type = %s AND trans_date = %s AND trans_amt = %s AND trans_notes = %s
-                AND trans_delete_ind = False
-            ORDER BY trans_last_updated DESC
-        """
-        values = [acc_id, trans_type, trans_date, trans_amt, trans_notes]
-    col = ['trans_id']
-
-    df = db.querydatafromdatabase(sql, values, col)
-
-    return df['trans_id'][0]
-
-
 
-layout = html.Div(
-    [
-        html.Div(
-            [
-                dcc.Location(id='transactions-url', refresh=True),
-                dcc.Store(id='transactions_toedit', storage_type='memory', data=0),
-                dcc.Store(id='transaction-updated', storage_type='memory', data=0),
-                dcc.Store(id='old_trans_amt', storage_type='memory', data=None),
-                dcc.Store(id='old_trans_type', storage_type='memory', data=None)
-            ],
-        ),
-
-        dbc.Card(
-            [
-                dbc.CardHeader(
-                    html.H3('My Transactions')
-                ),
-                dbc.CardBody(
-                    [
-                        html.Div( # Add Transaction Btn
-                            [
-                                dbc.Button("Add Transaction", href='transactions?mode=add', id='add_trans_btn')
-                            ]
-                        ),
-                        html.Div(
-                            id = "trans_list",
-                            style = {'margin-top': '1em'}
-                        )
-                    ]
-                )
-            ]
-        ),
-
-        dbc.Modal( # Add/Edit Transaction Modal
-            [
-                dbc.ModalHeader(dbc.ModalTitle(id="trans_modal_title"), close_button=False),
-                dbc.ModalBody(
-                    [
-                        dbc.Row(
-                            [
-                                dbc.Label("Account"),
-                                dbc.Col(
+# Transactions page: rows per page and sort options (column, direction)
+PAGE_SIZES = [25, 50, 100, 250]
+SORT_OPTIONS = {
+    'date_desc': ('T.trans_date', 'DESC'),
+    'date_asc': ('T.trans_date', 'ASC'),
+    'amt_desc': ('T.trans_amt', 'DESC'),
+    'amt_asc': ('T.trans_amt', 'ASC'),
+}
+
+# Helper function to fetch one page of a user's transactions.
+# Filtering, sorting and paging all run in SQL. Pages are keyset-paginated on
+# (sort column, trans_id): `after` is the key of the last row of the previous page,
+# so a deep page costs the same index range scan as the first one.
+def query_trans_page(user_id, filters, sort, after, limit):
+    sort_col, direction = SORT_OPTIONS[sort]
+
+    conditions = ["UT.user_id = %s", "T.trans_delete_ind = False"]
+    values = [user_id]
+
+    if filters.get('acc_ids'):
+        conditions.append("T.acc_id = ANY(%s)")
+        values.append(list(filters['acc_ids']))
+    if filters.get('trans_type'):
+        conditions.append("T.trans_type = %s")
+        values.append(filters['trans_type'])
+    if filters.get('start_date'):
+        conditions.append("T.trans_date >= %s::date")
+        values.append(filters['start_date'])
+    if filters.get('end_date'):
+        conditions.append("T.trans_date < %s::date + 1")
+        values.append(filters['end_date'])
+    if filters.get('min_amt') is not None:
+        conditions.append("T.trans_amt >= %s")
+        values.append(filters['min_amt'])
+    if filters.get('max_amt') is not None:
+        conditions.append("T.trans_amt <= %s")
+        values.append(filters['max_amt'])
+    if after:
+        conditions.append(f"({sort_col}, T.trans_id) {'<' if direction == 'DESC' else '>'} (%s, %s)")
+        values += after
+
+    sql = f'''
+            SELECT T.trans_id, A.acc_name, trans_type, TO_CHAR(date(trans_date), 'Month dd, yyyy'), trans_amt, trans_notes,
+                {sort_col}::text
+            FROM usertransactions UT JOIN transactions T
+                ON UT.trans_id = T.trans_id
+                JOIN accounts A ON T.acc_id = A.acc_id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY {sort_col} {direction}, T.trans_id {direction}
+            LIMIT %s
+        '''
+    values.append(limit)
+    cols = ['ID', 'Account','Type','Date','Amount','Notes', 'SortKey']
+
+    return db.querydatafromdatabase(sql, values, cols, user_id=user_id)
+
+
+# Page layout, built on each navigation to the page
+def layout():
+    return html.Div(
+        [
+            html.Div(
+                [
+                    dcc.Location(id='transactions-url', refresh=True),
+                    dcc.Store(id='transactions_toedit', storage_type='memory', data=0),
+                    dcc.Store(id='transaction-updated', storage_type='memory', data=0),
+                    dcc.Store(id='trans_page', storage_type='memory', data=None), # keyset cursors of the current and previous pages
+                ],
+            ),
+
+            dbc.Card(
+                [
+                    dbc.CardHeader(
+                        html.H3('My Transactions')
+                    ),
+                    dbc.CardBody(
+                        [
+                            html.Div( # Add Transaction Btn and actions on the selected row
+                                [
+                                    dbc.Button("Add Transaction", href='transactions?mode=add', id='add_trans_btn', className='me-2'),
+                                    dbc.Button("Edit", id='trans_edit_btn', color='warning', className='me-2', disabled=True),
+                                    dbc.Button("Delete", id='trans_delete_btn', color='danger', className='me-2', disabled=True),
+                                    dcc.Upload( # bulk import, see apps/importer.py for the CSV layout
+                                        dbc.Button("Import CSV", color='secondary', className='me-2'),
+                                        id='trans_import_upload', accept='.csv', style={'display': 'inline-block'}
+                                    ),
+                                    html.Small(id='trans_import_progress', className='text-muted'),
+                                ]
+                            ),
+                            dbc.Row( # Filters and sorting
+                                [
+                                    dbc.Col(
+                                        dcc.Dropdown(id='trans_filter_acc', multi=True, placeholder='All accounts'),
+                                        width=3
+                                    ),
+                                    dbc.Col(
+                                        dcc.Dropdown(id='trans_filter_type', options=["Expense","Income"], placeholder='All types'),
+                                        width=2
+                                    ),
+                                    dbc.Col(
+                                        dcc.DatePickerRange(id='trans_filter_dates', max_date_allowed=date.today(), clearable=True),
+                                        width=3
+                                    ),
+                                    dbc.Col(
+                                        dbc.InputGroup(
+                                            [
+                                                dbc.Input(id='trans_filter_min_amt', type='number', min=0, placeholder='Min amount', debounce=True),
+                                                dbc.Input(id='trans_filter_max_amt', type='number', min=0, placeholder='Max amount', debounce=True),
+                                            ]
+                                        ),
+                                        width=2
+                                    ),
+                                    dbc.Col(
+                                        dcc.Dropdown(
+                                            id='trans_sort',
+                                            options=[
+                                                {'label': 'Newest first', 'value': 'date_desc'},
+                                                {'label': 'Oldest first', 'value': 'date_asc'},
+                                                {'label': 'Largest amount', 'value': 'amt_desc'},
+                                                {'label': 'Smallest amount', 'value': 'amt_asc'},
+                                            ],
+                                            value='date_desc', clearable=False
+                                        ),
+                                        width=2
+                                    ),
+                                ],
+                                style={'margin-top': '1em'}
+                            ),
+                            html.Div(
+                                id = "trans_list",
+                                style = {'margin-top': '1em'}
+                            ),
+                            html.Div( # Pagination
+                                [
+                                    dbc.Button("Previous", id='trans_page_prev', size='sm', color='secondary', className='me-2', n_clicks=0, disabled=True),
+                                    html.Span(id='trans_page_label', className='me-2'),
+                                    dbc.Button("Next", id='trans_page_next', size='sm', color='secondary', className='me-2', n_clicks=0, disabled=True),
                                     dcc.Dropdown(
-                                        id='trans_acc_name',
-                                        placeholder='Select Account'
+                                        id='trans_page_size',
+                                        options=[{'label': f'{n} per page', 'value': n} for n in PAGE_SIZES],
+                                        value=PAGE_SIZES[1], clearable=False,
+                                        style={'width': '10em', 'display': 'inline-block', 'vertical-align': 'middle'}
                                     ),
-                                    width=5
-                                )
-                            ],
-                            className='mb-3' # add 1em bottom margin
-                        ),
-
-                        dbc.Row(
-                            [
-                                dbc.Label("Transaction Type"),
-                                dcc.RadioItems(["Expense","Income"], "Expense", 
-                                               inline=True, id="trans_type_radio",
-                                               style={"display": "flex", "flex-direction": "row"},
-                                               labelStyle={"margin-right": "20px"},
-                                               inputStyle={"margin-right": "5px"})
-                            ],
-                            className="mb-3",
-                        ),
-
-
-                        #Input for Transaction Date
-                        dbc.Row(
-                            [
-                                dbc.Label("Transaction Date"),
-                                dcc.DatePickerSingle(
-                                    id = "trans_date",
-                                    max_date_allowed = date.today(),
-                                    date=date.today(),
-                                ),
-                            ],
-                            className="mb-3"
-                        ),
-
-
-                        dbc.Row(
-                            [
-                                dbc.Label("Transaction Amount"),
-                                dbc.Input(
-                                    id="trans_amt_input",
-                                    type="number", min = 0,
-                                    placeholder="Enter transaction amount",
-                                    step=0.01,
-                                ),
-                                dbc.FormFeedback("Invalid amount.", type = "invalid"),
-                            ],
-                            className="mb-3",
-                        ),
-
-                        dbc.Row(
-                            [
-                                dbc.Label("Transaction Notes"),
-                                dbc.Input(id="trans_notes", type="text", placeholder="Enter transaction details (optional)", maxlength=256),
-                                dbc.FormFeedback("Exceeded character limit.", type = "invalid"),
-                            ],
-                            className="mb-3",
-                        ),
-                    ]
-                ),
-                dbc.ModalFooter(
-                    [
-                        dbc.Button("Submit", id='trans_modal_submit', color='primary', className='me-1', n_clicks=0),
-                        dbc.Button("Close", id='trans_modal_close', href='transactions', color='secondary', className='me-1', n_clicks=0)
-                    ]
-                )
-            ],
-            id='trans_modal',
-            keyboard=False,
-            backdrop='static' 
-        ),
-
-        dbc.Modal(  #Notification Modal
-                            [
-                                dbc.ModalHeader(dbc.ModalTitle(id="trans_modal_notifs_header"), close_button=False),
-                                dbc.ModalBody(id="trans_modal_notifs_content"),
-                                dbc.ModalFooter(
-                                    [
-                                        dbc.Button(
-                                            "Close",
-                                            id="trans_modal_notifs_close", href='transactions', className="me-2", n_clicks=0
-                                        )
-                                    ]
-                                ),
-                            ],
-                            id="trans_modal_notifs",
-                            is_open=False,
-                            keyboard=False,
-                            backdrop='static'
-                        ),
-
-        dbc.Modal(  #Delete Modal
-                            [
-                                dbc.ModalHeader(dbc.ModalTitle("Are you sure?"), close_button=False),
-                                dbc.ModalBody("Please confirm deletion. This action cannot be undone."),
-                                dbc.ModalFooter(
-                                    [
-                                        dbc.Button(
-                                            "Delete",
-                                            id="trans_delete_modal_delete", color="danger", className="me-2", n_clicks=0
+                                ],
+                                style={'margin-top': '1em'}
+                            )
+                        ]
+                    )
+                ]
+            ),
+
+            dbc.Modal( # Add/Edit Transaction Modal
+                [
+                    dbc.ModalHeader(dbc.ModalTitle(id="trans_modal_title"), close_button=False),
+                    dbc.ModalBody(
+                        [
+                            dbc.Row(
+                                [
+                                    dbc.Label("Account"),
+                                    dbc.Col(
+                                        dcc.Dropdown(
+                                            id='trans_acc_name',
+                                            placeholder='Select Account'
                                         ),
-                                        dbc.Button(
-                                            "Close",
-                                            id="trans_delete_modal_close", href='transactions', className="me-2", n_clicks=0
-                                        )
-                                    ]
-                                ),
-                            ],
-                            id="trans_delete_modal",
-                            is_open=False,
-                            keyboard=False,
-                            backdrop='static'
-                        ),
-    ]
-)
+                                        width=5
+                                    )
+                                ],
+                                className='mb-3' # add 1em bottom margin
+                            ),
+
+                            dbc.Row(
+                                [
+                                    dbc.Label("Transaction Type"),
+                                    dcc.RadioItems(["Expense","Income"], "Expense", 
+                                                   inline=True, id="trans_type_radio",
+                                                   style={"display": "flex", "flex-direction": "row"},
+                                                   labelStyle={"margin-right": "20px"},
+                                                   inputStyle={"margin-right": "5px"})
+                                ],
+                                className="mb-3",
+                            ),
+
+
+                            #Input for Transaction Date
+                            dbc.Row(
+                                [
+                                    dbc.Label("Transaction Date"),
+                                    dcc.DatePickerSingle(
+                                        id = "trans_date",
+                                        max_date_allowed = date.today(),
+                                        date=date.today(),
+                                    ),
+                                ],
+                                className="mb-3"
+                            ),
+
+
+                            dbc.Row(
+                                [
+                                    dbc.Label("Transaction Amount"),
+                                    dbc.Input(
+                                        id="trans_amt_input",
+                                        type="number", min = 0,
+                                        placeholder="Enter transaction amount",
+                                        step=0.01,
+                                    ),
+                                    dbc.FormFeedback("Invalid amount.", type = "invalid"),
+                                ],
+                                className="mb-3",
+                            ),
+
+                            dbc.Row(
+                                [
+                                    dbc.Label("Transaction Notes"),
+                                    dbc.Input(id="trans_notes", type="text", placeholder="Enter transaction details (optional)", maxlength=256),
+                                    dbc.FormFeedback("Exceeded character limit.", type = "invalid"),
+                                ],
+                                className="mb-3",
+                            ),
+                        ]
+                    ),
+                    dbc.ModalFooter(
+                        [
+                            dbc.Button("Submit", id='trans_modal_submit', color='primary', className='me-1', n_clicks=0),
+                            dbc.Button("Close", id='trans_modal_close', href='transactions', color='secondary', className='me-1', n_clicks=0)
+                        ]
+                    )
+                ],
+                id='trans_modal',
+                keyboard=False,
+                backdrop='static' 
+            ),
+
+            dbc.Modal(  #Notification Modal
+                                [
+                                    dbc.ModalHeader(dbc.ModalTitle(id="trans_modal_notifs_header"), close_button=False),
+                                    dbc.ModalBody(id="trans_modal_notifs_content"),
+                                    dbc.ModalFooter(
+                                        [
+                                            dbc.Button(
+                                                "Close",
+                                                id="trans_modal_notifs_close", href='transactions', className="me-2", n_clicks=0
+                                            )
+                                        ]
+                                    ),
+                                ],
+                                id="trans_modal_notifs",
+                                is_open=False,
+                                keyboard=False,
+                                backdrop='static'
+                            ),
+
+            dbc.Modal(  #Delete Modal
+                                [
+                                    dbc.ModalHeader(dbc.ModalTitle("Are you sure?"), close_button=False),
+                                    dbc.ModalBody("Please confirm deletion. This action cannot be undone."),
+                                    dbc.ModalFooter(
+                                        [
+                                            dbc.Button(
+                                                "Delete",
+                                                id="trans_delete_modal_delete", color="danger", className="me-2", n_clicks=0
+                                            ),
+                                            dbc.Button(
+                                                "Close",
+                                                id="trans_delete_modal_close", href='transactions', className="me-2", n_clicks=0
+                                            )
+                                        ]
+                                    ),
+                                ],
+                                id="trans_delete_modal",
+                                is_open=False,
+                                keyboard=False,
+                                backdrop='static'
+                            ),
+        ]
+    )
 
 @app.callback(
     [
-        Output("trans_acc_name", 'options')
+        Output("trans_acc_name", 'options'),
+        Output("trans_filter_acc", 'options'),
     ],
     [
         Input("transactions-url", 'pathname')
@@ -218,23 +314,12 @@ layout = html.Div(
 )
 def populate_accounts(pathname, userid):
     if pathname == '/transactions':
-        sql = """
-        SELECT accounts.acc_name as label, accounts.acc_id as value
-        FROM accounts LEFT JOIN useraccounts
-            ON accounts.acc_id = useraccounts.acc_id
-        WHERE user_id = %s AND acc_delete_ind = False
-        ORDER BY accounts.acc_name
-        """
-        values = [userid]
-        cols = ['label', 'value']
-
-        df = db.querydatafromdatabase(sql, values, cols)
-
-        account_options = df.to_dict('records')
+        # from the session context (apps/session.py), not a query of its own
+        account_options = session.context(userid).account_options()
     else:
         raise PreventUpdate
 
-    return [account_options]
+    return [account_options, account_options]
 
 # app callback when search changes
 @app.callback(
@@ -291,8 +376,6 @@ def trans_edit_delete_indicator(search, delete_close_btn, notif_close_btn, trans
         Output("trans_date", 'date'),
         Output("trans_amt_input", 'value'),
         Output("trans_notes", 'value'),
-        Output("old_trans_amt", 'data'),
-        Output("old_trans_type", 'data')
     ],
     [
         Input("transactions_toedit", 'modified_timestamp'),
@@ -318,27 +401,13 @@ def load_transactions(timestamp, close_btn, close_notifs_btn, to_edit, search):
             parsed = urlparse(search)
             trans_id = parse_qs(parsed.query)['id'][0]
 
-            sql = """
-                SELECT acc_id, trans_type, trans_date, trans_amt, trans_notes
-                FROM transactions
-                WHERE trans_id = %s
-            """
-            values = [trans_id]
-            col = ['acc_id', 'trans_type', 'trans_date', 'trans_amt', 'trans_notes']
-
-            df = db.querydatafromdatabase(sql, values, col)
-
-            acc_id = df['acc_id'][0]
-            trans_type = df['trans_type'][0]
-            trans_date = df['trans_date'][0]
-            trans_amt = df['trans_amt'][0]
-            trans_notes = df['trans_notes'][0]
+            trans = queries.transaction(trans_id)
 
-            return [acc_id, trans_type, trans_date, trans_amt, trans_notes, trans_amt, trans_type]
+            return [trans.acc_id, trans.trans_type, trans.trans_date, trans.trans_amt, trans.trans_notes]
         
         elif (eventid == "trans_modal_close" and close_btn) or (eventid == "trans_modal_notifs_close" and close_notifs_btn):
             # restore transaction input values to default
-            return [None, "Expense", date.today(), None, None, None, None]
+            return [None, "Expense", date.today(), None, None]
         
         else:
             raise PreventUpdate
@@ -366,7 +435,7 @@ def load_transactions(timestamp, close_btn, close_notifs_btn, to_edit, search):
         Input("trans_modal_notifs_close",'n_clicks'),
         Input("trans_delete_modal_delete", "n_clicks"),
 
-        Input("transactions_toedit", 'modified_timestamp')
+        Input("transactions_toedit", 'modified_timestamp'),
     ],
     [
         State("trans_acc_name", 'value'),
@@ -378,12 +447,10 @@ def load_transactions(timestamp, close_btn, close_notifs_btn, to_edit, search):
         State("currentuserid",'data'),
         State('transactions-url', 'search'),
         State("transactions_toedit", 'data'),
-        State("old_trans_amt", 'data'),
-        State("old_trans_type", 'data')
     ]
 )
 def update_trans(addtrans_btn, formclose_btn,submit_btn,notif_close_btn, delete_btn, to_edit_time,
-               acc_id,trans_type,trans_date, trans_amt, trans_notes, user_id, search, to_edit, old_trans_amt, old_trans_type):
+               acc_id,trans_type,trans_date, trans_amt, trans_notes, user_id, search, to_edit):
 
     ctx = dash.callback_context
 
@@ -414,40 +481,23 @@ def update_trans(addtrans_btn, formclose_btn,submit_btn,notif_close_btn, delete_
             parsed = urlparse(search)
             trans_id = parse_qs(parsed.query)['id'][0]
 
-            sql = '''
-                UPDATE transactions
-                SET trans_delete_ind = %s, trans_last_updated = now()
-                WHERE trans_id = %s
-            '''
-
-            values = [True,trans_id]
-            db.modifydatabase(sql,values)
-
-            #query transaction details
-            sqlcode4 = """
-                SELECT acc_id, trans_type, trans_amt FROM transactions WHERE trans_id = %s
-            """
-            valuescode4 = [trans_id]
-            cols4 = ['acc_id', 'trans_type','trans_amt']
-
-            df = db.querydatafromdatabase(sqlcode4,valuescode4,cols4)
-            acc_id_deletedtrans = df['acc_id'][0]
-            trans_type_deletedtrans = df['trans_type'][0]
-            trans_amt_deletedtrans = df['trans_amt'][0]
-
-            #update account balance
-            if trans_type_deletedtrans == "Income":
-                trans_diff_deletedtrans = -trans_amt_deletedtrans
-            else:
-                trans_diff_deletedtrans = trans_amt_deletedtrans
-
-            sqlcode3 = """
-                            UPDATE accounts
-                            SET acc_bal = acc_bal + %s, acc_last_updated = now()
-                            WHERE acc_id = %s
-                        """
-            valuescode3 = [trans_diff_deletedtrans, acc_id_deletedtrans]
-            db.modifydatabase(sqlcode3,valuescode3)
+            with db.dbtransaction() as cursor:
+                db.bumpuserversion(cursor, user_id, trans_ids=[trans_id])
+                # only a live transaction is deleted, so a second delete (e.g. from another
+                # tab) cannot take its amount out of the balances twice
+                sql = '''
+                    UPDATE transactions
+                    SET trans_delete_ind = %s, trans_last_updated = now()
+                    WHERE trans_id = %s AND trans_delete_ind = False
+                    RETURNING acc_id, trans_date, trans_type, trans_amt
+                '''
+
+                values = [True,trans_id]
+                deleted_trans = db.executereturning(cursor, sql, values)
+                if deleted_trans:
+                    balances.lock_accounts(cursor, [deleted_trans[0]])
+                    rollup.apply_trans(cursor, user_id, *deleted_trans, sign=-1)
+                    balances.apply_trans(cursor, *deleted_trans, sign=-1)
 
             modal_open = True
             modal_header = "Deleted Successfully!"
@@ -459,7 +509,6 @@ def update_trans(addtrans_btn, formclose_btn,submit_btn,notif_close_btn, delete_
             #open transaction modal
             return [True, False, None, None, False, False, search]
 
-
         elif eventid == "trans_modal_submit" and submit_btn:
             # #print("Form Submit Button")
             
@@ -479,56 +528,42 @@ def update_trans(addtrans_btn, formclose_btn,submit_btn,notif_close_btn, delete_
                 # add trans to transactions table 
                 if create_mode == 'add':
 
-                    if not trans_notes: # if trans_notes is empty
-                        #print('empty trans_notes',trans_notes)
-                        sql1 = '''
-                                    INSERT INTO transactions (acc_id, trans_type, trans_date, trans_amt)
-                                    VALUES (%s, %s, %s, %s)
-                                '''
-                            
-                        values1 = [acc_id, trans_type,trans_date, trans_amt]
-                    else:
-                        sql1 = '''
-                                    INSERT INTO transactions (acc_id, trans_type, trans_date, trans_amt, trans_notes)
-                                    VALUES (%s, %s, %s, %s, %s)
+                    with db.dbtransaction() as cursor:
+                        db.bumpuserversion(cursor, user_id, acc_ids=[acc_id])
+                        if not trans_notes: # if trans_notes is empty
+                            #print('empty trans_notes',trans_notes)
+                            sql1 = '''
+                                        INSERT INTO transactions (acc_id, trans_type, trans_date, trans_amt)
+                                        VALUES (%s, %s, %s, %s)
+                                        RETURNING trans_id
+                                    '''
+                                
+                            values1 = [acc_id, trans_type,trans_date, trans_amt]
+                        else:
+                            sql1 = '''
+                                        INSERT INTO transactions (acc_id, trans_type, trans_date, trans_amt, trans_notes)
+                                        VALUES (%s, %s, %s, %s, %s)
+                                        RETURNING trans_id
+                                    '''
+                                
+                            values1 = [acc_id, trans_type,trans_date, trans_amt, trans_notes]
+                        trans_id = db.executereturning(cursor, sql1, values1)[0]
+
+
+                        # add trans to usertransactions table
+
+                        sql2 = '''
+                                    INSERT INTO usertransactions (user_id, trans_id)
+                                    VALUES (%s, %s)
                                 '''
                             
-                        values1 = [acc_id, trans_type,trans_date, trans_amt, trans_notes]
-                    db.modifydatabase(sql1, values1)
-
-
-                    # add trans to usertransactions table
-                    trans_id = find_trans_id(acc_id, trans_type, trans_date, trans_amt, trans_notes)
-
-                    sql2 = '''
-                                INSERT INTO usertransactions (user_id, trans_id)
-                                VALUES (%s, %s)
-                            '''
-                        
-                    values2 = [user_id, trans_id]
-                    db.modifydatabase(sql2, values2)
-
-
-                    # Update acc bal
-                    if trans_type == "Income":
-                        sqlcode = """
-                            UPDATE accounts
-                            SET acc_bal = acc_bal + %s, acc_last_updated = now()
-                            WHERE acc_id = %s
-                        """
-
-                        valuescode = [trans_amt, acc_id]
-                    
-                    else:
-                        sqlcode = """
-                            UPDATE accounts
-                            SET acc_bal = acc_bal - %s, acc_last_updated = now()
-                            WHERE acc_id = %s
-                        """
-
-                        valuescode = [trans_amt, acc_id]
+                        values2 = [user_id, trans_id]
+                        cursor.execute(sql2, values2)
 
-                    db.modifydatabase(sqlcode, valuescode)
+                        # update the rollups and acc bal
+                        balances.lock_accounts(cursor, [acc_id])
+                        rollup.apply_trans(cursor, user_id, acc_id, trans_date, trans_type, trans_amt)
+                        balances.apply_trans(cursor, acc_id, trans_date, trans_type, trans_amt)
 
 
 
@@ -542,68 +577,61 @@ def update_trans(addtrans_btn, formclose_btn,submit_btn,notif_close_btn, delete_
                     parsed = urlparse(search)
                     trans_id = parse_qs(parsed.query)['id'][0]
 
-                    if not trans_notes: #trans_notes is empty
-                        sql3 = """
-                            UPDATE transactions
-                            SET
-                                acc_id = %s,
-                                trans_type = %s,
-                                trans_date = %s,
-                                trans_amt = %s,
-                                trans_notes = NULL,
-                                trans_last_updated = now()
-                            WHERE
-                                trans_id = %s
+                    with db.dbtransaction() as cursor:
+                        # owners of the old account and of the new one
+                        db.bumpuserversion(cursor, user_id, acc_ids=[acc_id], trans_ids=[trans_id])
+                        # the old values come from the locked row, not from the form, so
+                        # an edit from another tab in between cannot skew the balances
+                        sqlold = """
+                            SELECT acc_id, trans_date, trans_type, trans_amt FROM transactions
+                            WHERE trans_id = %s AND trans_delete_ind = False
+                            FOR UPDATE
                         """
-
-                        values3 = [acc_id, trans_type, trans_date, trans_amt, trans_id]
-                    else:
-                        sql3 = """
-                            UPDATE transactions
-                            SET
-                                acc_id = %s,
-                                trans_type = %s,
-                                trans_date = %s,
-                                trans_amt = %s,
-                                trans_notes = %s,
-                                trans_last_updated = now()
-                            WHERE
-                                trans_id = %s
-                        """
-
-                        values3 = [acc_id, trans_type, trans_date, trans_amt, trans_notes, trans_id]
-                    db.modifydatabase(sql3, values3)
-
-
-
-                    if trans_amt != old_trans_amt or trans_type != old_trans_type: #Check if trans_amt or trans_type has been edited
-                        # reverse old transaction from acc_bal and add new transaction to acc_bal
-                        
-                        trans_diff = 0
-                        if trans_amt != old_trans_amt and trans_type != old_trans_type: #both have been edited
-                            if trans_type == "Income": #old trans type was an expense
-                                trans_diff = old_trans_amt + trans_amt
-                            else:
-                                trans_diff = -old_trans_amt - trans_amt
-                        elif trans_amt != old_trans_amt: #only trans_amt has been edited
-                            if trans_type == "Income":
-                                trans_diff = trans_amt - old_trans_amt
-                            else:
-                                trans_diff = old_trans_amt - trans_amt
-                        elif trans_type != old_trans_type: #only trans_type has been edited
-                            if trans_type == "Income":
-                                trans_diff = 2*trans_amt
+                        cursor.execute(sqlold, [trans_id])
+                        old_trans = cursor.fetchone()
+
+                        if old_trans:
+                            # move the transaction out of its old month/account rollup and balances
+                            balances.lock_accounts(cursor, [old_trans[0], acc_id])
+                            rollup.apply_trans(cursor, user_id, *old_trans, sign=-1)
+                            balances.apply_trans(cursor, *old_trans, sign=-1)
+
+                            if not trans_notes: #trans_notes is empty
+                                sql3 = """
+                                    UPDATE transactions
+                                    SET
+                                        acc_id = %s,
+                                        trans_type = %s,
+                                        trans_date = %s,
+                                        trans_amt = %s,
+                                        trans_notes = NULL,
+                                        trans_last_updated = now()
+                                    WHERE
+                                        trans_id = %s
+                                """
+
+                                values3 = [acc_id, trans_type, trans_date, trans_amt, trans_id]
                             else:
-                                trans_diff = -2*trans_amt
-
-                        sqlcode2 = """
-                            UPDATE accounts
-                            SET acc_bal = acc_bal + %s, acc_last_updated = now()
-                            WHERE acc_id = %s
-                        """
-                        valuescode2 = [trans_diff,acc_id]
-                        db.modifydatabase(sqlcode2,valuescode2)
-                        
+                                sql3 = """
+                                    UPDATE transactions
+                                    SET
+                                        acc_id = %s,
+                                        trans_type = %s,
+                                        trans_date = %s,
+                                        trans_amt = %s,
+                                        trans_notes = %s,
+                                        trans_last_updated = now()
+                                    WHERE
+                                        trans_id = %s
+                                """
+
+                                values3 = [acc_id, trans_type, trans_date, trans_amt, trans_notes, trans_id]
+                            cursor.execute(sql3, values3)
+                            rollup.apply_trans(cursor, user_id, acc_id, trans_date, trans_type, trans_amt)
+                            balances.apply_trans(cursor, acc_id, trans_date, trans_type, trans_amt)
+
+                    if not old_trans:
+                        return [False, True, "Not Saved", "This transaction has been deleted.", False, False, None]
 
                     modal_open = True
                     modal_header = "Edited Successfully!"
@@ -625,6 +653,46 @@ def update_trans(addtrans_btn, formclose_btn,submit_btn,notif_close_btn, delete_
         raise PreventUpdate
 
 
+#callback to import an uploaded CSV into the user's accounts and open trans notifs modal;
+#runs as a background job (apps/jobs.py), a large file does not hold a worker
+@jobs.callback(
+    [
+        Output("trans_modal_notifs", 'is_open', allow_duplicate=True),
+        Output("trans_modal_notifs_header", 'children', allow_duplicate=True),
+        Output("trans_modal_notifs_content", 'children', allow_duplicate=True),
+    ],
+    Input("trans_import_upload", 'contents'),
+    [
+        State("trans_import_upload", 'filename'),
+        State("currentuserid", 'data'),
+    ],
+    prevent_initial_call=True,
+    progress=[Output('trans_import_progress', 'children')],
+    progress_default=[None],
+    running=[(Output('trans_import_upload', 'disabled'), True, False)],
+    cancel=[Input('index-url', 'pathname')],
+)
+def import_trans(import_contents, import_filename, user_id):
+    if not import_contents:
+        raise PreventUpdate
+
+    content_string = import_contents.split(',', 1)[1]
+    try:
+        imported = importer.import_csv(io.BytesIO(base64.b64decode(content_string)), user_id, progress=jobs.report)
+
+        modal_header = "Imported Successfully!"
+        modal_content = f"{imported:,} transactions from {import_filename} have been added."
+    except importer.ImportRejected as e:
+        modal_header = "Nothing Imported"
+        modal_content = f"{import_filename} could not be imported. {e}"
+    except Exception as e:
+        print(e)
+        modal_header = "Error!"
+        modal_content = f"{import_filename} could not be imported because of an unexpected error. Nothing was added; please try again."
+
+    return [True, modal_header, modal_content]
+
+
 @app.callback(
     Output('transaction-updated', 'data'), 
     Input("trans_modal_notifs_close",'n_clicks')
@@ -641,60 +709,95 @@ def trans_update_indicator(close_btn):
 
 
 @app.callback(
-    Output('trans_list', 'children'),
-    [Input('transactions-url','pathname'), Input('transaction-updated', 'data')],
-    State('currentuserid','data')
+    [
+        Output('trans_list', 'children'),
+        Output('trans_page', 'data'),
+        Output('trans_page_prev', 'disabled'),
+        Output('trans_page_next', 'disabled'),
+        Output('trans_page_label', 'children'),
+    ],
+    [
+        Input('transactions-url','pathname'),
+        Input('transaction-updated', 'data'),
+        Input('trans_filter_acc', 'value'),
+        Input('trans_filter_type', 'value'),
+        Input('trans_filter_dates', 'start_date'),
+        Input('trans_filter_dates', 'end_date'),
+        Input('trans_filter_min_amt', 'value'),
+        Input('trans_filter_max_amt', 'value'),
+        Input('trans_sort', 'value'),
+        Input('trans_page_size', 'value'),
+        Input('trans_page_prev', 'n_clicks'),
+        Input('trans_page_next', 'n_clicks'),
+    ],
+    [
+        State('currentuserid','data'),
+        State('trans_page', 'data'),
+    ]
 )
-def display_trans(pathname, updated, user_id):
+def display_trans(pathname, updated, acc_ids, trans_type, start_date, end_date, min_amt, max_amt,
+                  sort, page_size, prev_btn, next_btn, user_id, page):
     if pathname == '/transactions':
         #print("Display transactions triggered.")
 
-        sql = ''' 
-                SELECT T.trans_id, A.acc_name, trans_type, TO_CHAR(date(trans_date), 'Month dd, yyyy'), trans_amt, trans_notes
-                FROM usertransactions UT LEFT JOIN transactions T
-                    ON UT.trans_id = T.trans_id
-                    LEFT JOIN accounts A ON T.acc_id = A.acc_id
-                WHERE user_id = %s AND trans_delete_ind = False
-                ORDER BY trans_date DESC, trans_last_updated DESC
-            '''
-        
-        values = [user_id]
-        cols = ['ID', 'Account','Type','Date','Amount','Notes']
-
-        df = db.querydatafromdatabase(sql, values, cols)
+        # page = {'after': key the current page starts after, 'next': key of its last row,
+        #         'stack': 'after' keys of the previous pages}
+        eventid = dash.callback_context.triggered[0]['prop_id'].split('.')[0]
+        if eventid == 'trans_page_next' and page and page['next']:
+            page = {'after': page['next'], 'stack': page['stack'] + [page['after']]}
+        elif eventid == 'trans_page_prev' and page and page['stack']:
+            page = {'after': page['stack'][-1], 'stack': page['stack'][:-1]}
+        else: # first load, data or filter change: back to the first page
+            page = {'after': None, 'stack': []}
+
+        filters = {
+            'acc_ids': acc_ids,
+            'trans_type': trans_type,
+            'start_date': start_date,
+            'end_date': end_date,
+            'min_amt': min_amt,
+            'max_amt': max_amt,
+        }
+
+        # fetch one extra row to know whether there is a next page
+        df = query_trans_page(user_id, filters, sort, page['after'], page_size + 1)
+        has_next = len(df) > page_size
+        df = df.head(page_size)
+        page['next'] = [df['SortKey'].iloc[-1], int(df['ID'].iloc[-1])] if has_next else None
+
+        pager = [not page['stack'], not has_next, f"Page {len(page['stack']) + 1}"]
 
         if not df.empty:
-            # Adding Edit button:
-
-            buttons = []
-            for trans_id in df['ID']:
-                buttons += [
-                html.Div(
-                    [
-                        dbc.Button('Edit', 
-                                href=f'transactions?mode=edit&id={trans_id}',
-                                size='sm', color='warning',
-                                className = "me-2"),
-                        dbc.Button('Delete', 
-                                href=f'transactions?mode=delete&id={trans_id}',
-                                size='sm', color='danger',
-                                className = "me-2"),
-                    ],
-                    style={'text-align': 'center'},
-                ) 
-                ]
-            df['Action'] = buttons
-
-            # remove the column ID before turning into a table 
-            df = df[['Account','Type','Date','Amount','Notes', 'Action']]
+            # Edit/Delete act on the selected row (see select_trans), so the grid
+            # only carries the ID instead of two buttons per row
+            df = df[['ID', 'Account','Type','Date','Amount','Notes']]
             df['Amount'] = ["{:,.2f}".format(x) for x in df['Amount'].tolist()]
 
-
-            table = dbc.Table.from_dataframe(df, striped=True, bordered=True, 
-                                            hover=True, size='sm')
-            return [table]
+            table = cm.make_grid(df, 'trans_grid', row_selectable=True, hidden=['ID'])
+            return [table, page] + pager
+        elif any(value not in (None, []) for value in filters.values()):
+            return ['No transactions match the selected filters.', page] + pager
         else:
-            return ['No transactions yet. Click "Add Transaction" to add your first one.']
+            return ['No transactions yet. Click "Add Transaction" to add your first one.', page] + pager
 
     else:
         raise PreventUpdate
+
+
+@app.callback(
+    [
+        Output('trans_edit_btn', 'href'),
+        Output('trans_edit_btn', 'disabled'),
+        Output('trans_delete_btn', 'href'),
+        Output('trans_delete_btn', 'disabled'),
+    ],
+    Input('trans_grid', 'selected_rows'),
+    State('trans_grid', 'data')
+)
+def select_trans(selected_rows, rows):
+    if selected_rows:
+        trans_id = rows[selected_rows[0]]['ID']
+        return [f'transactions?mode=edit&id={trans_id}', False,
+                f'transactions?mode=delete&id={trans_id}', False]
+    else:
+        return [None, True, None, True]
@@ -0,0 +1,182 @@
+// Clientside callbacks of the home dashboard (registered in apps/home.py)
+//
+// The trans_df and acc_df stores hold the columnar payloads written by apps/dfstore.py:
+//   {format, key, length, columns: {name: {kind, values} or {kind: 'dict', dict, codes}}}
+// with dates as days since 1970-01-01. Changing the period or the accounts re-filters
+// these stores here, so the server only hears about it for ledgers too large to send
+// whole ('range' mode, see CLIENTSIDE_LEDGER_LIMIT in apps/home.py).
+
+(function () {
+    var DAY_MS = 86400000;
+    var NO_TRANSACTIONS = 'No transactions. Click "Transactions" to add one.';
+
+    // Decoded columns of the last payload seen in each store, by payload key
+    var decoded = {};
+
+    function decode(storeId, store) {
+        var cached = decoded[storeId];
+        if (cached && cached.key === store.key) {
+            return cached.columns;
+        }
+        var columns = {};
+        Object.keys(store.columns).forEach(function (name) {
+            var column = store.columns[name];
+            if (column.kind === 'dict') {
+                columns[name] = column.codes.map(function (code) { return column.dict[code]; });
+            } else {
+                columns[name] = column.values;
+            }
+        });
+        decoded[storeId] = {key: store.key, columns: columns};
+        return columns;
+    }
+
+    // 'YYYY-MM-DD' (optionally followed by a time) to days since 1970-01-01
+    function toDay(value) {
+        return Math.floor(Date.parse(String(value).slice(0, 10)) / DAY_MS);
+    }
+
+    function dayToString(day) {
+        return new Date(day * DAY_MS).toISOString().slice(0, 10);
+    }
+
+    // Same as "{:,.2f}".format(x) in Python
+    function money(x) {
+        return x.toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2});
+    }
+
+    // Positions of the rows in the selected period and accounts; a missing filter selects everything
+    function selectRows(columns, length, start_date, end_date, acc_id_list) {
+        var start = start_date ? toDay(start_date) : -Infinity;
+        var end = end_date ? toDay(end_date) : Infinity;
+        var accounts = acc_id_list ? new Set(acc_id_list) : null;
+        var dates = columns['Date'];
+        var accIds = columns['AccountID'];
+
+        var rows = [];
+        for (var i = 0; i < length; i++) {
+            if (dates[i] >= start && dates[i] <= end && (accounts === null || accounts.has(accIds[i]))) {
+                rows.push(i);
+            }
+        }
+        return rows;
+    }
+
+    function cards(total_income, total_expenses) {
+        var net_gainloss = total_income - total_expenses;
+        var color = 'warning';
+        if (net_gainloss < 0) {
+            color = 'danger';
+        } else if (net_gainloss > 0) {
+            color = 'success';
+        }
+        return [money(total_income), money(total_expenses), money(net_gainloss), color];
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        home: {
+            // In 'range' mode every filter change becomes a new SQL query
+            route_filters: function (start_date, end_date, acc_id_list, ledger_mode) {
+                if (ledger_mode !== 'range' || !start_date) {
+                    return window.dash_clientside.no_update;
+                }
+                return {start_date: start_date, end_date: end_date, acc_id_list: acc_id_list};
+            },
+
+            // Totals cards, transactions table and top 5 expenses for the selected period and accounts
+            render_dashboard: function (trans_dict, summary, start_date, end_date, acc_id_list, ledger_mode) {
+                var columns = null;
+                var rows = [];
+                if (trans_dict) {
+                    columns = decode('trans_df', trans_dict);
+                    rows = selectRows(columns, trans_dict.length, start_date, end_date, acc_id_list);
+                }
+
+                var totals;
+                if (!start_date) {
+                    totals = [null, null, null, null];
+                } else if (ledger_mode === 'range') {
+                    // totalled in SQL by update_totalcards
+                    totals = summary ? cards(summary.total_income, summary.total_expenses)
+                                     : Array(4).fill(window.dash_clientside.no_update);
+                } else {
+                    var total_income = 0;
+                    var total_expenses = 0;
+                    rows.forEach(function (i) {
+                        if (columns['Type'][i] === 'Income') {
+                            total_income += columns['Amount'][i];
+                        } else if (columns['Type'][i] === 'Expense') {
+                            total_expenses += columns['Amount'][i];
+                        }
+                    });
+                    totals = cards(total_income, total_expenses);
+                }
+
+                var trans_data = rows.map(function (i) {
+                    return {
+                        'Account': columns['Account'][i],
+                        'Type': columns['Type'][i],
+                        'Date': dayToString(columns['Date'][i]),
+                        'Amount': money(columns['Amount'][i]),
+                        'Notes': columns['Notes'][i],
+                    };
+                });
+
+                // largest amounts first; ties keep ledger order like DataFrame.nlargest
+                var expenses = rows.filter(function (i) { return columns['Type'][i] === 'Expense'; });
+                expenses.sort(function (a, b) { return columns['Amount'][b] - columns['Amount'][a]; });
+                var top5_data = expenses.slice(0, 5).map(function (i) {
+                    return {
+                        'Account': columns['Account'][i],
+                        'Date': dayToString(columns['Date'][i]),
+                        'Amount': money(columns['Amount'][i]),
+                        'Notes': columns['Notes'][i],
+                    };
+                });
+
+                return totals.concat([trans_data, trans_dict ? null : NO_TRANSACTIONS, top5_data]);
+            },
+
+            // Download links of /export (apps/export.py) for the selected period and accounts
+            export_links: function (start_date, end_date, acc_id_list) {
+                var params = new URLSearchParams();
+                if (start_date) {
+                    params.append('start_date', String(start_date).slice(0, 10));
+                }
+                if (end_date) {
+                    params.append('end_date', String(end_date).slice(0, 10));
+                }
+                if (acc_id_list) {
+                    acc_id_list.forEach(function (acc_id) { params.append('acc_id', acc_id); });
+                    if (acc_id_list.length === 0) {
+                        // none selected: the dashboard is empty, and so is the export
+                        params.append('acc_id', '');
+                    }
+                }
+                var query = params.toString() ? '?' + params.toString() : '';
+                return ['/export/transactions.csv' + query, '/export/transactions.parquet' + query];
+            },
+
+            // Rows of the accounts table for the selected accounts
+            render_accounts: function (acc_dict, acc_id_list) {
+                if (!acc_dict) {
+                    return [];
+                }
+                var columns = decode('acc_df', acc_dict);
+                var accounts = acc_id_list ? new Set(acc_id_list) : null;
+
+                var data = [];
+                for (var i = 0; i < acc_dict.length; i++) {
+                    if (accounts === null || accounts.has(columns['ID'][i])) {
+                        data.push({
+                            'Account Name': columns['Account Name'][i],
+                            'Type': columns['Type'][i],
+                            'Current Balance': money(columns['Current Balance'][i]),
+                        });
+                    }
+                }
+                return data;
+            },
+        },
+    });
+})();
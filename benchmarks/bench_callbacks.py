@@ -0,0 +1,210 @@
+# Micro-benchmarks of the Python callbacks behind the home and transactions pages
+#
+# Calls the callbacks directly, with the apps.dbconnect query functions and the session
+# context (apps/session.py) replaced by a stub that answers every query from a synthetic ledger (benchmarks/fixtures.py) of 1k,
+# 100k and 1M transactions, so neither Postgres nor a browser is needed. Reports the best
+# wall time over --repeat calls and the peak memory traced by tracemalloc during one more
+# call. The SQL itself is not measured, only the Python work around it.
+#
+# Filtering by period and account, the totals cards and the top 5 expenses run in the
+# browser (assets/home.js); on the Python side the home page costs loading and encoding
+# the ledger store (create_trans_dict) plus the page snapshot (load_home) and the summary.
+#
+# Usage:
+#   python -m benchmarks.bench_callbacks [--rows 1000 100000 1000000] [--repeat 5]
+#   python -m benchmarks.bench_callbacks --save       record the results as the baseline
+#   python -m benchmarks.bench_callbacks --compare    exit 1 if a callback is slower or
+#                                                     uses more memory than baseline * --tolerance
+#
+# Baselines are machine specific; record them on the machine you compare on.
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from decimal import Decimal
+
+import pandas as pd
+import dash._callback_context as callback_context
+from dash._utils import AttributeDict
+
+from apps import dbconnect as db
+from apps import home
+from apps import session
+from apps import transactions
+from benchmarks.fixtures import synthetic_accounts, synthetic_ledger
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'callbacks.json')
+
+USER_ID = 1
+
+# Columns each stubbed query is recognized by
+LEDGER_COLS = ('TransID', 'AccountID', 'Account', 'Type', 'Date', 'Amount', 'Notes')
+PAGE_COLS = ('ID', 'Account', 'Type', 'Date', 'Amount', 'Notes', 'SortKey')
+SUMMARY_COLS = ('total_income', 'total_expenses', 'min_date', 'max_date')
+
+
+class StubDatabase:
+    # Stands in for querydatafromdatabase, querysnapshot, querydatachunks and
+    # session.context, answering from one synthetic ledger
+
+    def __init__(self, ledger):
+        self.ledger = ledger
+        self.accounts = synthetic_accounts(ledger)
+        totals = ledger['Amount'].groupby(ledger['Type']).sum()
+        self.summary = pd.DataFrame(
+            [[totals.get('Income', Decimal(0)), totals.get('Expense', Decimal(0)),
+              ledger['Date'].min(), ledger['Date'].max()]],
+            columns=list(SUMMARY_COLS))
+        self.pages = {}
+
+    def query(self, sql, values, dfcolumns, user_id=None):
+        cols = tuple(dfcolumns)
+        if cols == LEDGER_COLS:
+            return self.ledger
+        if cols == PAGE_COLS:
+            return self.page(values[-1])
+        if cols == SUMMARY_COLS:
+            return self.summary
+        raise KeyError(f"no stub for a query returning {cols}")
+
+    def snapshot(self, sql, values):
+        # the row of home.query_snapshot
+        return (len(self.ledger), self.summary['min_date'][0])
+
+    def context(self, user_id):
+        # accounts as the JSON arrays psycopg2 decodes
+        accounts = [[acc_id, name, acc_type, float(balance)] for acc_id, name, acc_type, balance
+                    in self.accounts.itertuples(index=False)]
+        return session.SessionContext(user_id, 1, 'bench', accounts)
+
+    def chunks(self, sql, values, dfcolumns, itersize=db.QUERY_ITERSIZE):
+        df = self.query(sql, values, dfcolumns)
+        for start in range(0, len(df), itersize):
+            yield df.iloc[start:start + itersize].reset_index(drop=True)
+
+    def page(self, limit):
+        # first page of the transactions list: the newest `limit` rows
+        if limit not in self.pages:
+            rows = self.ledger.head(limit)
+            self.pages[limit] = pd.DataFrame({
+                'ID': rows['TransID'],
+                'Account': rows['Account'],
+                'Type': rows['Type'],
+                'Date': [d.strftime('%B %d, %Y') for d in rows['Date']],
+                'Amount': rows['Amount'],
+                'Notes': rows['Notes'],
+                'SortKey': [str(d) for d in rows['Date']],
+            })
+        return self.pages[limit]
+
+
+@contextmanager
+def stubbed_database(stub):
+    original = db.querydatafromdatabase, db.querysnapshot, db.querydatachunks, session.context
+    db.querydatafromdatabase, db.querysnapshot, db.querydatachunks, session.context = \
+        stub.query, stub.snapshot, stub.chunks, stub.context
+    try:
+        yield
+    finally:
+        db.querydatafromdatabase, db.querysnapshot, db.querydatachunks, session.context = original
+
+
+def set_triggered(prop_id):
+    # what dash.callback_context.triggered reports inside the callback
+    callback_context.context_value.set(AttributeDict(triggered_inputs=[{'prop_id': prop_id, 'value': None}]))
+
+
+# (name, callback, arguments, triggering input) for a ledger of n transactions
+def callback_cases(n):
+    ledger_mode = 'full' if n <= home.CLIENTSIDE_LEDGER_LIMIT else 'range'
+    server_filters = {'start_date': '2014-01-01', 'end_date': '2023-12-31', 'acc_id_list': [1, 2, 3, 4, 5]}
+    return [
+        ('home.load_home', home.load_home, ('/home', USER_ID), 'home-url.pathname'),
+        ('home.update_totalcards', home.update_totalcards, (server_filters, USER_ID), 'home-server_filters.data'),
+        ('home.create_trans_dict', home.create_trans_dict, (ledger_mode, server_filters, USER_ID), 'home-ledger_mode.data'),
+        ('transactions.display_trans', transactions.display_trans,
+         ('/transactions', None, None, None, None, None, None, None, 'date_desc', 100, None, None, USER_ID, None),
+         'transactions-url.pathname'),
+    ]
+
+
+def measure(func, args, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return min(timings), peak
+
+
+def run(rows, repeat):
+    for n in rows:
+        stub = StubDatabase(synthetic_ledger(n))
+        with stubbed_database(stub):
+            for name, func, args, prop_id in callback_cases(n):
+                set_triggered(prop_id)
+                seconds, peak = measure(func, args, repeat)
+                yield {'rows': n, 'callback': name, 'seconds': seconds, 'peak_bytes': peak}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Python callbacks with a stubbed database")
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save', action='store_true', help="record the results as the baseline")
+    parser.add_argument('--compare', action='store_true', help="fail on regressions against the baseline")
+    parser.add_argument('--tolerance', type=float, default=1.5, help="allowed ratio to the baseline")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {}
+    regressions = []
+    print(f"{'rows':>9} {'callback':<28} {'time (ms)':>10} {'peak (MiB)':>11} {'vs baseline':>14}")
+    for result in run(args.rows, args.repeat):
+        key = f"{result['callback']}@{result['rows']}"
+        results[key] = result
+
+        versus = ''
+        base = baseline.get(key)
+        if base:
+            time_ratio = result['seconds'] / base['seconds']
+            memory_ratio = result['peak_bytes'] / max(base['peak_bytes'], 1)
+            versus = f"{time_ratio:.2f}x {memory_ratio:.2f}x"
+            # sub-millisecond / sub-64 KiB differences are noise, not regressions
+            slower = time_ratio > args.tolerance and result['seconds'] - base['seconds'] > 0.001
+            bigger = memory_ratio > args.tolerance and result['peak_bytes'] - base['peak_bytes'] > 64 * 1024
+            if slower or bigger:
+                regressions.append(key)
+                versus += ' !'
+        print(f"{result['rows']:>9} {result['callback']:<28} {result['seconds'] * 1000:>10.2f} "
+              f"{result['peak_bytes'] / 2**20:>11.2f} {versus:>14}")
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+
+    if regressions:
+        print(f"{len(regressions)} callbacks regressed beyond {args.tolerance}x: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+# Logins per second at different password hashing costs (apps/passwords.py)
+#
+# --clients threads log in at once, --logins times in total, each verifying a password
+# on its own thread, as the login page does (hashlib releases the GIL while it hashes,
+# so the clients hash on up to --clients cores, like as many gunicorn workers). Reports
+# the throughput and the mean time a login waits for its check, for the unsalted SHA-256
+# hashes of before and for PBKDF2 at each of --iterations.
+#
+# Usage: python -m benchmarks.bench_login [--iterations 100000 600000]
+#            [--logins 64] [--clients 8]
+
+import argparse
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from apps import passwords
+
+PASSWORD = 'correct horse battery staple'
+
+
+def login_storm(stored, logins, clients):
+    def login(_):
+        start = time.perf_counter()
+        matches, _ = passwords.verify(PASSWORD, stored)
+        assert matches
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as callers:
+        waits = list(callers.map(login, range(logins)))
+    elapsed = time.perf_counter() - start
+    return logins / elapsed, sum(waits) / len(waits)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark login password checks")
+    parser.add_argument('--iterations', type=int, nargs='+', default=[100000, 310000, 600000])
+    parser.add_argument('--logins', type=int, default=64)
+    parser.add_argument('--clients', type=int, default=8)
+    args = parser.parse_args()
+
+    cases = [('sha256 (legacy)', hashlib.sha256(PASSWORD.encode('utf-8')).hexdigest())]
+    cases += [(f'pbkdf2 {iterations:,}', passwords.hash_password(PASSWORD, iterations))
+              for iterations in args.iterations]
+
+    print(f"{args.clients} clients, {args.logins} logins")
+    print(f"{'hash':<18} {'logins/s':>10} {'mean wait (ms)':>15}")
+    for name, stored in cases:
+        rate, wait = login_storm(stored, args.logins, args.clients)
+        print(f"{name:<18} {rate:>10.1f} {wait * 1000:>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
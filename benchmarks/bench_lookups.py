@@ -0,0 +1,92 @@
+# Per-call cost of the single-row lookups: apps/queries.py against the one-row
+# DataFrame path (dbconnect.querydatafromdatabase, then df[column][0]) it replaced
+#
+#   python   turning one fetched row into the values the callback reads, no database
+#   database the whole lookup, on the database of dbconnect.getdblocation (skip with --no-db):
+#            an unprepared query read into a DataFrame vs the prepared statement into a row
+#
+# Reports the best mean time per call over --repeat runs of --calls calls.
+#
+# Usage: python -m benchmarks.bench_lookups [--calls 2000] [--repeat 5] [--no-db]
+
+import argparse
+import datetime as dt
+import time
+from decimal import Decimal
+
+import pandas as pd
+
+from apps import dbconnect as db
+from apps import queries
+
+TRANSACTION_COLS = ['acc_id', 'trans_type', 'trans_date', 'trans_amt', 'trans_notes']
+
+
+def per_call(func, calls, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        best = min(best, (time.perf_counter() - start) / calls)
+    return best
+
+
+def python_cases():
+    row = (3, 'Expense', dt.datetime(2021, 7, 1), Decimal('12000.00'), 'Groceries')
+
+    def dataframe():
+        df = pd.DataFrame([row], columns=TRANSACTION_COLS)
+        return [df[name][0] for name in TRANSACTION_COLS]
+
+    def slots_row():
+        return list(queries.Transaction(*row))
+
+    return 'transaction row', dataframe, slots_row
+
+
+def database_cases():
+    with db.dbconnection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT username FROM users WHERE user_delete_ind = False ORDER BY user_id LIMIT 1")
+        username, = cursor.fetchone()
+        cursor.execute("SELECT trans_id, acc_id FROM transactions ORDER BY trans_id LIMIT 1")
+        trans_id, acc_id = cursor.fetchone()
+
+    def dataframe(sql, values, cols):
+        return lambda: db.querydatafromdatabase(sql, values, cols)[cols[0]][0]
+
+    return [
+        ('username_taken', dataframe(queries.USERNAME_TAKEN_SQL, [username], ['taken']),
+         lambda: queries.username_taken(username)),
+        ('credentials', dataframe(queries.CREDENTIALS_SQL, [username], ['user_id', 'password']),
+         lambda: queries.credentials(username)),
+        ('account', dataframe(queries.ACCOUNT_SQL, [acc_id], ['acc_name', 'acc_type', 'acc_bal']),
+         lambda: queries.account(acc_id)),
+        ('transaction', dataframe(queries.TRANSACTION_SQL, [trans_id], TRANSACTION_COLS),
+         lambda: queries.transaction(trans_id)),
+    ]
+
+
+def report(section, cases, calls, repeat):
+    for name, before, after in cases:
+        before_s = per_call(before, calls, repeat)
+        after_s = per_call(after, calls, repeat)
+        print(f"{section:<9} {name:<16} {before_s * 1e6:>14.1f} {after_s * 1e6:>14.1f} {before_s / after_s:>8.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the single-row lookups of apps/queries.py")
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--no-db', action='store_true', help="only time the Python side")
+    args = parser.parse_args()
+
+    print(f"{'section':<9} {'lookup':<16} {'DataFrame (us)':>14} {'queries (us)':>14} {'speedup':>9}")
+    report('python', [python_cases()], args.calls, args.repeat)
+    if not args.no_db:
+        report('database', database_cases(), args.calls, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
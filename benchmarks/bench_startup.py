@@ -0,0 +1,176 @@
+# Cold start of a server process: time to import the app and answer its first request
+#
+# Each run starts a fresh interpreter under python -X importtime that imports wsgi (the
+# production entry point, see gunicorn.conf.py) and then makes the requests a browser
+# makes to open the login page, through Flask's test client: GET /, /_dash-layout and
+# /_dash-dependencies, and the page callback that returns the login layout. The login
+# page does not query the database, so none is needed. Then it imports the modules left
+# for the first navigation to a data page (apps/lazy.py). Reports, for the fastest of
+# --repeat runs:
+#   - import time, and time from process start to the first response (login page shown)
+#   - import time by top-level package (self times, our own modules by name), largest first
+#   - the deferred modules and how long the first data page will spend importing them
+# Self times include the garbage collections that happen to run during a module's import.
+#
+# Dash imports IPython when it is installed (for notebook support); --block IPython
+# treats it as not installed, as on a server installed from reqs.txt.
+#
+# Usage:
+#   python -m benchmarks.bench_startup [--repeat 5] [--top 15] [--block IPython]
+#   python -m benchmarks.bench_startup --save       record the results as the baseline
+#   python -m benchmarks.bench_startup --compare    exit 1 if a step is slower than
+#                                                   baseline * --tolerance
+#
+# Baselines are machine specific; record them on the machine you compare on.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT_DIR, 'benchmarks', 'baselines', 'startup.json')
+
+STEPS = ('import', 'first_response', 'deferred')
+DEFERRED_MARKER = '-- deferred --'
+
+CHILD = r'''
+import json
+import sys
+import time
+
+for name in sys.argv[1:]:
+    sys.modules[name] = None  # ImportError, as if not installed
+
+start = time.perf_counter()
+import wsgi
+imported = time.perf_counter()
+
+client = wsgi.server.test_client()
+assert client.get('/').status_code == 200
+assert client.get('/_dash-layout').status_code == 200
+dependencies = client.get('/_dash-dependencies').get_json()
+page = next(d for d in dependencies
+            if 'page-content' in d['output'] and any(i['id'] == 'index-url' for i in d['inputs']))
+outputs = [dict(zip(('id', 'property'), output.split('.'))) for output in page['output'].strip('.').split('...')]
+response = client.post('/_dash-update-component', json={
+    'output': page['output'],
+    'outputs': outputs,
+    'inputs': [{'id': 'index-url', 'property': 'pathname', 'value': '/'}],
+    'state': [{'id': 'sessionlogout', 'property': 'data', 'value': True},
+              {'id': 'currentuserid', 'property': 'data', 'value': -1}],
+    'changedPropIds': ['index-url.pathname'],
+})
+assert response.status_code == 200, response.data[:200]
+responded = time.time()
+
+from apps import lazy
+sys.stderr.write('-- deferred --\n')
+sys.stderr.flush()
+start_deferred = time.perf_counter()
+lazy.load_all()
+
+print(json.dumps({'import': imported - start, 'responded_at': responded,
+                  'deferred': time.perf_counter() - start_deferred}))
+'''
+
+
+def package_of(module):
+    # our own modules by name, everything else by top-level package
+    parts = module.split('.')
+    return '.'.join(parts[:2]) if parts[0] == 'apps' else parts[0]
+
+
+def import_breakdown(importtime):
+    # seconds of self import time by package, from the -X importtime report
+    totals = defaultdict(float)
+    for line in importtime.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        totals[package_of(name.strip())] += int(self_us) / 1e6
+    return totals
+
+
+def run_once(block):
+    started = time.time()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD, *block],
+                          cwd=ROOT_DIR, capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.exit(f"Startup run failed:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    startup, _, deferred = proc.stderr.partition(DEFERRED_MARKER)
+    return {
+        'import': result['import'],
+        'first_response': result['responded_at'] - started,
+        'deferred': result['deferred'],
+        'packages': import_breakdown(startup),
+        'deferred_packages': import_breakdown(deferred),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the cold start of a server process")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help="packages listed in the import breakdown")
+    parser.add_argument('--block', nargs='+', default=[], help="modules to treat as not installed")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save', action='store_true', help="record the results as the baseline")
+    parser.add_argument('--compare', action='store_true', help="fail on regressions against the baseline")
+    parser.add_argument('--tolerance', type=float, default=1.5, help="allowed ratio to the baseline")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    runs = [run_once(args.block) for _ in range(args.repeat)]
+    best = min(runs, key=lambda run: run['first_response'])
+
+    print(f"{'step':<16} {'time (ms)':>10} {'vs baseline':>12}")
+    results = {}
+    regressions = []
+    for step in STEPS:
+        seconds = min(run[step] for run in runs)
+        results[step] = seconds
+
+        versus = ''
+        if step in baseline:
+            ratio = seconds / baseline[step]
+            versus = f"{ratio:.2f}x"
+            # differences under 10 ms are noise, not regressions
+            if ratio > args.tolerance and seconds - baseline[step] > 0.010:
+                regressions.append(step)
+                versus += ' !'
+        print(f"{step:<16} {seconds * 1000:>10.1f} {versus:>12}")
+
+    print()
+    print(f"{'package':<32} {'self (ms)':>10}   import time of the fastest run")
+    packages = sorted(best['packages'].items(), key=lambda item: item[1], reverse=True)
+    for name, seconds in packages[:args.top]:
+        print(f"{name:<32} {seconds * 1000:>10.1f}")
+    rest = sum(seconds for name, seconds in packages[args.top:])
+    print(f"{f'{len(packages) - args.top} others':<32} {rest * 1000:>10.1f}")
+
+    print()
+    deferred = sorted(best['deferred_packages'].items(), key=lambda item: item[1], reverse=True)
+    print("Deferred to the first data page: " +
+          (', '.join(f"{name} ({seconds * 1000:.0f} ms)" for name, seconds in deferred) or 'nothing'))
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+
+    if regressions:
+        print(f"{len(regressions)} steps regressed beyond {args.tolerance}x: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
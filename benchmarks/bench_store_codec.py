@@ -0,0 +1,71 @@
+# Size and decode cost of the trans_df store encodings
+#
+# Compares the records payload apps/home used to store ({"data-frame": records})
+# with the columnar encoding from apps/dfstore.py: JSON size as sent to the browser and
+# decode time back into a DataFrame. The app decodes the columnar payload in the browser
+# (assets/home.js); decode_df() is its pandas equivalent.
+#
+# Usage: python -m benchmarks.bench_store_codec [--rows 10000 100000 1000000]
+
+import argparse
+import json
+import time
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import plotly
+
+from apps import dfstore
+from apps import home
+from benchmarks.fixtures import synthetic_frame
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+# The DataFrame held in a store written by dfstore.encode_df()
+def decode_df(store):
+    data = {}
+    for name, column in store['columns'].items():
+        kind = column['kind']
+        if kind == 'dict':
+            data[name] = pd.Series(column['dict']).take(column['codes']).to_numpy()
+        elif kind == 'date':
+            data[name] = pd.to_datetime(np.asarray(column['values'], dtype='int64'), unit='D')
+        elif kind == 'number':
+            data[name] = np.asarray(column['values'], dtype='float64')
+        elif kind == 'int':
+            data[name] = np.asarray(column['values'], dtype='int64')
+        else:
+            data[name] = column['values']
+    return pd.DataFrame(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the trans_df store encodings")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'encoding':>9} {'size (KiB)':>11} {'decode (s)':>11}")
+    for n in args.rows:
+        df = synthetic_frame(n)
+        # as fetched from Postgres: dates and Decimal amounts
+        df['Date'] = pd.to_datetime(df['Date']).dt.date
+        df['Amount'] = [Decimal(f"{x:.2f}") for x in df['Amount']]
+
+        records = json.dumps({"data-frame": df.to_dict("records")}, cls=plotly.utils.PlotlyJSONEncoder)
+        records_decode, _ = timed(lambda payload: pd.DataFrame(json.loads(payload)["data-frame"]), records)
+
+        columnar = json.dumps(dfstore.encode_df(df, **home.TRANS_STORE_COLS), cls=plotly.utils.PlotlyJSONEncoder)
+        columnar_decode, _ = timed(lambda payload: decode_df(json.loads(payload)), columnar)
+
+        print(f"{n:>9} {'records':>9} {len(records) / 1024:>11,.0f} {records_decode:>11.3f}")
+        print(f"{n:>9} {'columnar':>9} {len(columnar) / 1024:>11,.0f} {columnar_decode:>11.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# Payload size and build time of the transaction table renderers
+#
+# Compares the old dbc.Table.from_dataframe rendering (one component per cell plus
+# two Edit/Delete buttons per row) against the virtualized grid from
+# commonmodules.make_grid, at 1k, 10k and 100k rows.
+#
+# Usage: python -m benchmarks.bench_table_payload [--rows 1000 10000 100000]
+
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+import plotly
+from dash import html
+import dash_bootstrap_components as dbc
+
+from apps import commonmodules as cm
+
+
+def synthetic_transactions(n, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp('2014-01-01') + pd.to_timedelta(rng.integers(0, 3650, n), unit='D')
+    return pd.DataFrame({
+        'ID': np.arange(1, n + 1),
+        'Account': rng.choice(['Cash', 'BPI Savings', 'Metrobank Checking', 'GCash'], n),
+        'Type': rng.choice(['Expense', 'Income'], n, p=[0.8, 0.2]),
+        'Date': dates.strftime('%B %d, %Y'),
+        'Amount': ["{:,.2f}".format(x) for x in rng.uniform(10, 50000, n)],
+        'Notes': rng.choice(['Groceries', 'Salary', 'Rent', 'Transport', None], n),
+    })
+
+
+def render_table(df):
+    # The renderer display_trans used before the virtualized grid
+    df = df.copy()
+    df['Action'] = [
+        html.Div(
+            [
+                dbc.Button('Edit', href=f'transactions?mode=edit&id={trans_id}',
+                           size='sm', color='warning', className="me-2"),
+                dbc.Button('Delete', href=f'transactions?mode=delete&id={trans_id}',
+                           size='sm', color='danger', className="me-2"),
+            ],
+            style={'text-align': 'center'},
+        )
+        for trans_id in df['ID']
+    ]
+    df = df[['Account', 'Type', 'Date', 'Amount', 'Notes', 'Action']]
+    return dbc.Table.from_dataframe(df, striped=True, bordered=True, hover=True, size='sm')
+
+
+def render_grid(df):
+    return cm.make_grid(df, 'trans_grid', row_selectable=True, hidden=['ID'])
+
+
+def measure(render, df):
+    start = time.perf_counter()
+    payload = json.dumps(render(df), cls=plotly.utils.PlotlyJSONEncoder)
+    return len(payload), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'renderer':>8} {'payload (KiB)':>14} {'build+encode (s)':>17}")
+    for n in args.rows:
+        df = synthetic_transactions(n)
+        results = {name: measure(render, df)
+                   for name, render in [('table', render_table), ('grid', render_grid)]}
+        for name, (size, seconds) in results.items():
+            print(f"{n:>8} {name:>8} {size / 1024:>14,.1f} {seconds:>17.3f}")
+        ratio = results['table'][0] / results['grid'][0]
+        print(f"{n:>8} {'ratio':>8} {ratio:>14.1f}x")
+
+
+if __name__ == '__main__':
+    main()
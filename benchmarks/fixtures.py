@@ -0,0 +1,48 @@
+# Synthetic data shared by the benchmarks
+
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+ACCOUNT_NAMES = ['Cash', 'Savings', 'Checking', 'GCash', 'Card']
+ACCOUNT_TYPES = ['Cash', 'Savings', 'Savings', 'E-Wallet', 'Credit']
+
+
+# Ledger shaped like the trans_df store of apps/home: n transactions over ten
+# years in 5 accounts, dates as 'YYYY-MM-DD' strings and float amounts
+def synthetic_frame(n, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp('2014-01-01') + pd.to_timedelta(rng.integers(0, 3650, n), unit='D')
+    acc_ids = rng.integers(1, 6, n)
+    df = pd.DataFrame({
+        'TransID': np.arange(1, n + 1),
+        'AccountID': acc_ids,
+        'Account': np.asarray(ACCOUNT_NAMES)[acc_ids - 1],
+        'Type': rng.choice(['Expense', 'Income'], n, p=[0.8, 0.2]),
+        'Date': dates.strftime('%Y-%m-%d'),
+        'Amount': np.round(rng.uniform(10, 50000, n), 2),
+        'Notes': rng.choice(['Groceries', 'Salary', 'Rent', None], n),
+    })
+    return df
+
+
+# The same ledger as psycopg2 returns it: newest first, datetime.date dates and
+# Decimal amounts
+def synthetic_ledger(n, seed=0):
+    df = synthetic_frame(n, seed).sort_values(['Date', 'TransID'], ascending=False, ignore_index=True)
+    df['Date'] = pd.to_datetime(df['Date']).dt.date
+    df['Amount'] = [Decimal(f"{x:.2f}") for x in df['Amount']]
+    return df
+
+
+# The 5 accounts of the synthetic ledger, with their balances
+def synthetic_accounts(ledger):
+    signed = ledger['Amount'].astype('float64').where(ledger['Type'] == 'Income', -ledger['Amount'].astype('float64'))
+    balances = signed.groupby(ledger['AccountID']).sum().reindex(range(1, 6), fill_value=0.0)
+    return pd.DataFrame({
+        'ID': list(range(1, 6)),
+        'Account Name': ACCOUNT_NAMES,
+        'Type': ACCOUNT_TYPES,
+        'Current Balance': [Decimal(f"{x:.2f}") for x in balances],
+    })
@@ -0,0 +1,74 @@
+# gunicorn settings for the production entry point (wsgi.py):
+#
+#   gunicorn -c gunicorn.conf.py wsgi:server
+#
+# Every setting can be overridden from the environment or .env (apps/config.py):
+#   BIND                address to listen on (default 0.0.0.0:8050)
+#   WEB_CONCURRENCY     worker processes (default: 2 per CPU core + 1, as callbacks
+#                       spend much of their time waiting on Postgres)
+#   MAX_REQUESTS        requests after which a worker is replaced (default 1000, 0 = never),
+#                       plus up to MAX_REQUESTS_JITTER more so the workers do not all
+#                       restart at once
+#   TIMEOUT             seconds a worker may go without a heartbeat before it is killed:
+#                       the length of one request, except /export downloads, which
+#                       beat after every chunk (apps/export.py)
+#   POOL_MAXCONN        database connections per worker (default 2: a sync worker serves
+#                       one request at a time). Postgres max_connections must cover
+#                       WEB_CONCURRENCY * POOL_MAXCONN, plus POOL_MAXCONN for each of the
+#                       JOB_WORKERS background jobs, plus any other clients
+#
+# The app is imported once in the master and the workers are forked from it, so they
+# share the imported code and one SECRET_KEY. Each worker opens its own database
+# connections after the fork (post_fork): connections are never shared between processes.
+# pandas, numpy and pyarrow are not part of the preloaded app (apps/lazy.py): each worker
+# imports them when it first serves a data page.
+
+import multiprocessing
+import os
+
+from apps import config as appconfig  # "config" is a gunicorn setting name
+
+# one connection per worker for its request, one spare; set here, before the preloaded
+# app reads them, unless the environment or .env sets them
+for name, value in (('POOL_MINCONN', '1'), ('POOL_MAXCONN', '2')):
+    if appconfig.get(name) is None:
+        os.environ[name] = value
+
+bind = appconfig.get('BIND', '0.0.0.0:8050')
+workers = appconfig.getint('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1)
+# one request at a time per worker: threaded workers drop the connections they have
+# accepted but not started when they are recycled
+worker_class = 'sync'
+
+preload_app = True
+
+# graceful recycling: a worker past max_requests exits after the request it is serving
+# and the master forks a replacement; on reload or shutdown (HUP/TERM) workers get
+# graceful_timeout seconds to finish
+max_requests = appconfig.getint('MAX_REQUESTS', 1000)
+max_requests_jitter = appconfig.getint('MAX_REQUESTS_JITTER', 100)
+graceful_timeout = 30
+timeout = appconfig.getint('TIMEOUT', 120)
+
+accesslog = '-'
+
+
+def post_fork(server, worker):
+    from apps import dbconnect as db
+    from apps import export
+    from apps import jobs
+
+    # long downloads keep the worker alive between chunks
+    export.heartbeat = worker.notify
+
+    # the job cache's SQLite connection was opened in the master; reopen it per worker
+    if jobs.cache is not None:
+        jobs.cache.close()
+    # dbconnect.getpool() gives each process its own pool; open this worker's now,
+    # before the first request. An exception here would stop the whole server, so when
+    # the database is unreachable the worker starts anyway: the pool connects on first
+    # use and /readyz answers 503 until it can.
+    try:
+        db.warmpool()
+    except Exception as e:
+        worker.log.warning("Database connections not opened at worker start: %s", e)
@@ -1,19 +1,20 @@
 # Dash related dependencies
 from dash import dcc
 from dash import html
-import dash_bootstrap_components as dbc
 import dash
 from dash.dependencies import Input, Output, State
 from dash.exceptions import PreventUpdate
 
-# To open browser upon running your app
-import webbrowser
+import flask
 
 from app import app
 from apps import login, commonmodules as cm
 from apps import accounts
 from apps import transactions
 from apps import home
+from apps import export  # noqa: F401 -- registers the /export route
+from apps import session
+from apps import dbconnect as db
 
 
 CONTENT_STYLE = {
@@ -62,20 +63,22 @@ def displaypage (pathname, sessionlogout, userid):
             if userid < 0:
                 if pathname == '/':
                     #print("load login layout")
-                    returnlayout = login.layout
+                    returnlayout = login.layout()
                 else:
                     returnlayout = '404: request not found'
             else:
                 if pathname == '/logout':
-                    returnlayout = login.layout
+                    returnlayout = login.layout()
                     userid = -1
+                    flask.session.pop('user_id', None)
+                    session.end()
                     sessionlogout = True
                 elif pathname == '/' or pathname == '/home':
-                    returnlayout = home.layout
+                    returnlayout = home.layout()
                 elif pathname == '/accounts':
-                    returnlayout = accounts.layout
+                    returnlayout = accounts.layout()
                 elif pathname == '/transactions':
-                    returnlayout = transactions.layout
+                    returnlayout = transactions.layout()
                 else:
                     returnlayout = 'error404'
 
@@ -97,5 +100,10 @@ def displaypage (pathname, sessionlogout, userid):
 
     
 if __name__ == '__main__':
+    # To open browser upon running your app
+    import webbrowser
+
+    # Open the pooled DB connections before the first page load
+    db.warmpool()
     webbrowser.open('http://127.0.0.1:8050', new=0, autoraise=True)
     app.run_server(debug=False)
\ No newline at end of file
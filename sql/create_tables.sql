@@ -2,7 +2,8 @@ CREATE TABLE Users(
 	user_id serial primary key not null,
 	username varchar(30) unique not null,
 	password varchar(128) not null,
-	user_delete_ind bool default false not null
+	user_delete_ind bool default false not null,
+	data_version bigint default 0 not null
 );
 
 CREATE TABLE Accounts(
@@ -36,4 +37,21 @@ CREATE TABLE UserTransactions(
 	user_id int references Users(user_id) not null,
 	trans_id int references Transactions(trans_id) not null,
 	PRIMARY KEY (user_id, trans_id)
-);
\ No newline at end of file
+);
+
+CREATE TABLE MonthlyRollups(
+	user_id int references Users(user_id) not null,
+	acc_id int references Accounts(acc_id) not null,
+	month date not null,
+	trans_type varchar(8) not null,
+	total_amt decimal default 0 not null,
+	trans_count int default 0 not null,
+	PRIMARY KEY (user_id, acc_id, month, trans_type)
+);
+
+CREATE TABLE BalanceSnapshots(
+	acc_id int references Accounts(acc_id) not null,
+	month date not null,
+	balance decimal not null,
+	PRIMARY KEY (acc_id, month)
+);
@@ -2139,3 +2139,29 @@ INSERT INTO usertransactions(user_id,trans_id) VALUES
 ,(2,1055)
 ,(2,1056);
 
+
+
+-- Monthly rollups of the sample ledger (same as: python -m apps.rollup rebuild)
+INSERT INTO monthlyrollups(user_id,acc_id,month,trans_type,total_amt,trans_count)
+SELECT UT.user_id, T.acc_id, date_trunc('month', T.trans_date)::date, T.trans_type, SUM(T.trans_amt), COUNT(*)
+FROM usertransactions UT JOIN transactions T ON UT.trans_id = T.trans_id
+WHERE T.trans_delete_ind = False
+GROUP BY 1, 2, 3, 4;
+
+-- Month-end balance snapshots of the sample accounts (same as: python -m apps.balances rebuild)
+WITH monthly AS (
+	SELECT T.acc_id, date_trunc('month', T.trans_date)::date AS month,
+		SUM(CASE WHEN trans_type = 'Income' THEN trans_amt ELSE -trans_amt END) AS net
+	FROM transactions T
+	WHERE T.trans_delete_ind = False
+	GROUP BY 1, 2
+),
+opening AS (
+	SELECT A.acc_id, A.acc_bal - COALESCE((SELECT SUM(net) FROM monthly M WHERE M.acc_id = A.acc_id), 0) AS balance
+	FROM accounts A
+)
+INSERT INTO balancesnapshots(acc_id, month, balance)
+SELECT acc_id, '-infinity', balance FROM opening
+UNION ALL
+SELECT M.acc_id, M.month, O.balance + SUM(M.net) OVER (PARTITION BY M.acc_id ORDER BY M.month)
+FROM monthly M JOIN opening O ON O.acc_id = M.acc_id;
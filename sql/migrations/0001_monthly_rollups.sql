@@ -0,0 +1,19 @@
+-- Monthly income/expense rollups for the home dashboard (see apps/rollup.py).
+-- Databases created from an older create_tables.sql get the table and a backfill.
+
+CREATE TABLE IF NOT EXISTS MonthlyRollups(
+	user_id int references Users(user_id) not null,
+	acc_id int references Accounts(acc_id) not null,
+	month date not null,
+	trans_type varchar(8) not null,
+	total_amt decimal default 0 not null,
+	trans_count int default 0 not null,
+	PRIMARY KEY (user_id, acc_id, month, trans_type)
+);
+
+INSERT INTO monthlyrollups(user_id,acc_id,month,trans_type,total_amt,trans_count)
+SELECT UT.user_id, T.acc_id, date_trunc('month', T.trans_date)::date, T.trans_type, SUM(T.trans_amt), COUNT(*)
+FROM usertransactions UT JOIN transactions T ON UT.trans_id = T.trans_id
+WHERE T.trans_delete_ind = False
+GROUP BY 1, 2, 3, 4
+ON CONFLICT DO NOTHING;
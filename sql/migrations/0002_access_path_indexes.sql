@@ -0,0 +1,24 @@
+-- Indexes for the access paths of the queries in apps/*.
+-- Ledger indexes are partial on live rows since every read filters trans_delete_ind = False.
+
+-- Transactions list and home ledger: ORDER BY trans_date DESC with trans_id /
+-- trans_last_updated tie-breakers, and keyset pages on (trans_date, trans_id)
+CREATE INDEX IF NOT EXISTS transactions_live_date_idx
+	ON transactions (trans_date DESC, trans_id DESC) WHERE trans_delete_ind = False;
+
+-- Period and account filters (home ledger, dashboard partial months, transactions filters)
+CREATE INDEX IF NOT EXISTS transactions_live_acc_date_idx
+	ON transactions (acc_id, trans_date, trans_id) WHERE trans_delete_ind = False;
+
+-- Transactions list sorted or filtered by amount, keyset pages on (trans_amt, trans_id)
+CREATE INDEX IF NOT EXISTS transactions_live_amt_idx
+	ON transactions (trans_amt, trans_id) WHERE trans_delete_ind = False;
+
+-- Joins that reach the link tables from the account/transaction side;
+-- the primary keys only cover lookups by user_id
+CREATE INDEX IF NOT EXISTS useraccounts_acc_id_idx ON useraccounts (acc_id);
+CREATE INDEX IF NOT EXISTS usertransactions_trans_id_idx ON usertransactions (trans_id);
+
+-- Login: username lookups of live users (the unique constraint also covers deleted ones)
+CREATE INDEX IF NOT EXISTS users_live_username_idx
+	ON users (username) WHERE user_delete_ind = False;
@@ -0,0 +1,4 @@
+-- Per-user version of the data behind cached query results (see QueryCache in
+-- apps/dbconnect.py). Write paths bump it in the same transaction as their changes.
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS data_version bigint default 0 not null;
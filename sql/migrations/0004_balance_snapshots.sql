@@ -0,0 +1,28 @@
+-- Month-end account balances for as-of-date lookups and the balance chart (see apps/balances.py).
+-- month '-infinity' holds the opening balance, before any transaction.
+
+CREATE TABLE IF NOT EXISTS BalanceSnapshots(
+	acc_id int references Accounts(acc_id) not null,
+	month date not null,
+	balance decimal not null,
+	PRIMARY KEY (acc_id, month)
+);
+
+-- Backfill: the opening balance is the current balance minus every live transaction
+WITH monthly AS (
+	SELECT T.acc_id, date_trunc('month', T.trans_date)::date AS month,
+		SUM(CASE WHEN trans_type = 'Income' THEN trans_amt ELSE -trans_amt END) AS net
+	FROM transactions T
+	WHERE T.trans_delete_ind = False
+	GROUP BY 1, 2
+),
+opening AS (
+	SELECT A.acc_id, A.acc_bal - COALESCE((SELECT SUM(net) FROM monthly M WHERE M.acc_id = A.acc_id), 0) AS balance
+	FROM accounts A
+)
+INSERT INTO balancesnapshots(acc_id, month, balance)
+SELECT acc_id, '-infinity', balance FROM opening
+UNION ALL
+SELECT M.acc_id, M.month, O.balance + SUM(M.net) OVER (PARTITION BY M.acc_id ORDER BY M.month)
+FROM monthly M JOIN opening O ON O.acc_id = M.acc_id
+ON CONFLICT DO NOTHING;
@@ -0,0 +1,39 @@
+# Production entry point: the Flask server of the Dash app, for a WSGI server such as
+# gunicorn (settings in gunicorn.conf.py):
+#
+#   gunicorn -c gunicorn.conf.py wsgi:server
+#
+# Importing index registers the layout, the page callbacks and the /export routes.
+#
+#   GET /readyz   200 when this worker can reach the database and every schema migration
+#                 in sql/migrations is applied, 503 otherwise; for load balancer and
+#                 orchestrator readiness checks. The 200 body also reports the worker's
+#                 connection pool and query cache counters (dbconnect.poolstats/cachestats).
+
+import flask
+import psycopg2
+
+from index import app
+from apps import dbconnect as db
+from apps import migrate
+
+server = app.server
+
+
+@server.route('/readyz')
+def readyz():
+    try:
+        with db.dbconnection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT version FROM schema_migrations")
+            applied = {row[0] for row in cursor.fetchall()}
+    except psycopg2.Error as e:  # includes an exhausted pool (psycopg2.pool.PoolError)
+        return flask.Response(f"database unavailable: {e}", status=503, mimetype='text/plain')
+
+    pending = [version for version, name, path in migrate.list_migrations() if version not in applied]
+    if pending:
+        return flask.Response(f"pending migrations: {', '.join(pending)}", status=503, mimetype='text/plain')
+    lines = ["ready"]
+    for name, stats in (('pool', db.poolstats()), ('cache', db.cachestats())):
+        lines.append(f"{name}: " + ' '.join(f"{key}={value}" for key, value in sorted(stats.items())))
+    return flask.Response('\n'.join(lines) + '\n', mimetype='text/plain')